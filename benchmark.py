@@ -0,0 +1,988 @@
+"""
+Script Name: benchmark.py
+Description:
+    Benchmarks the installer without the network and without building HEASoft.
+    A synthetic heasoft-x.yy tarball of configurable size is served from a
+    local HTTP server, and its configure script and Makefiles run a fake
+    compiler that writes build logs at a fixed rate. Installer runs happen in
+    a throwaway home directory with fake package manager, sudo and pip
+    commands, so nothing on the system is changed.
+
+Usage:
+    python3 benchmark.py [--files N] [--file-size KIB] [--rate LINES] [-j JOBS] [--repeat N]
+    python3 benchmark.py --only extract trackers --output FILE --compare OLD_FILE
+
+Dependencies:
+    - Python >= 3.8
+    - Required libraries: tqdm
+    - GNU make and bash
+
+Notes:
+    Results are written as JSON, named after the current commit by default,
+    so runs of different commits can be compared with --compare
+
+"""
+
+import os
+import sys
+import io
+import json
+import time
+import shutil
+import random
+import platform
+import argparse
+import tarfile
+import tempfile
+import threading
+import statistics
+import subprocess
+import http.server
+
+import heainstaller
+from heainstaller import Heainstall, MakeProgress, ResourceMeter, cpu_count
+from tqdm import tqdm
+
+BENCHMARKS = ("extract", "trackers", "pipeline", "download", "run")
+
+# Writes build output at HEABENCH_RATE lines per second, as fast as possible if 0
+EMIT = '''#!{python}
+import os
+import re
+import sys
+import time
+import platform
+import subprocess
+
+rate = float(os.environ.get("HEABENCH_RATE", 0))
+noise = int(os.environ.get("HEABENCH_NOISE", 3))
+start = time.monotonic()
+count = 0
+
+
+def emit(line, paced=True):
+    global count
+    sys.stdout.write(line + "\\n")
+    if rate and paced:
+        count += 1
+        sys.stdout.flush()
+        delay = count / rate - (time.monotonic() - start)
+        if delay > 0:
+            time.sleep(delay)
+
+
+def sources(directory):
+    found = []
+    for path, _, files in os.walk(directory):
+        found += [os.path.join(path, name) for name in files if name.endswith((".c", ".f"))]
+    return sorted(found)
+
+
+def prefix(root):
+    return os.path.join(root, f"{{platform.machine()}}-pc-linux-gnu-bench")
+
+
+mode = sys.argv[1]
+if mode == "lines":
+    for number in range(int(sys.argv[2])):
+        emit(f"benchmark output line {{number}}: the quick brown fox jumps over the lazy dog")
+elif mode == "configure":
+    # Answers checks from the cache the installer's site file selects without
+    # waiting. Only the cache file is emulated: autoconf's checks of precious
+    # variables against the cached environment are not.
+    cache = None
+    if os.path.isfile(os.environ.get("CONFIG_SITE", "")):
+        cache = subprocess.run(
+            [
+                "sh",
+                "-c",
+                'prefix=NONE ac_default_prefix=/usr/local cache_file=/dev/null srcdir=.; '
+                '. "$CONFIG_SITE" >&2; echo "$cache_file"',
+            ],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+        cache = None if cache == "/dev/null" else cache
+    cached = set()
+    if cache and os.path.exists(cache):
+        with open(cache) as fl:
+            cached = set(re.findall(r"^(\\w+)=", fl.read(), re.M))
+    lines = int(os.environ.get("HEABENCH_CONFIGURE_LINES", 3146))
+    for number in range(lines):
+        if f"ac_cv_feature_{{number}}" in cached:
+            emit(f"checking for feature_{{number}} in -lheabench... (cached) yes", paced=False)
+        else:
+            emit(f"checking for feature_{{number}} in -lheabench... yes")
+    if cache:
+        with open(cache, "w") as fl:
+            fl.writelines(f"ac_cv_feature_{{n}}=${{{{ac_cv_feature_{{n}}=yes}}}}\\n" for n in range(lines))
+elif mode == "compile":
+    directory = sys.argv[2]
+    for source in sources(directory):
+        name = os.path.relpath(source, directory)
+        emit(f"gcc -c -O2 -fPIC -Wall -I../include -o {{name[:-2]}}.o {{name}}")
+        for number in range(noise):
+            emit(f"{{name}}:{{number + 10}}:5: warning: unused variable 'tmp{{number}}' [-Wunused-variable]")
+        open(source[:-2] + ".o", "w").close()
+elif mode == "install":
+    directory = sys.argv[2]
+    lib = os.path.join(prefix(os.path.dirname(directory)), "lib")
+    os.makedirs(lib, exist_ok=True)
+    size = 0
+    for source in sources(directory):
+        emit(f"/usr/bin/install -c -m 644 {{os.path.relpath(source, directory)[:-2]}}.o {{lib}}")
+        size += os.path.getsize(source)
+    with open(os.path.join(lib, f"lib{{os.path.basename(directory)}}.so"), "wb") as fl:
+        fl.write(b"\\0" * (size // 4))
+elif mode == "finish":
+    root = os.path.abspath(sys.argv[2])
+    bindir = os.path.join(prefix(root), "bin")
+    os.makedirs(bindir, exist_ok=True)
+    with open(os.path.join(prefix(root), "headas-init.sh"), "w") as fl:
+        fl.write('export PATH="$HEADAS/bin:$PATH"\\n')
+    with open(os.path.join(prefix(root), "headas-init.csh"), "w") as fl:
+        fl.write('setenv PATH "$HEADAS/bin:$PATH"\\n')
+    with open(os.path.join(bindir, "fversion"), "w") as fl:
+        fl.write(f"#!/bin/sh\\necho {{os.path.basename(root)}}\\n")
+    os.chmod(os.path.join(bindir, "fversion"), 0o755)
+    emit(f"Finished installing {{os.path.basename(root)}}")
+'''
+
+# Logs checks and writes a Makefile per component, core components build first
+CONFIGURE = '''#!{python}
+import os
+import sys
+import subprocess
+
+build = os.path.dirname(os.path.abspath(__file__))
+root = os.path.dirname(build)
+emit = os.path.join(build, "hd_emit")
+subprocess.run([sys.executable, emit, "configure"], check=True)
+
+components = sorted(
+    name for name in os.listdir(root)
+    if os.path.isdir(os.path.join(root, name)) and name != "BUILD_DIR" and "-" not in name
+)
+core = [name for name in ("heacore", "tcltk") if name in components]
+others = [name for name in components if name not in core]
+with open(os.path.join(build, "Makefile"), "w") as fl:
+    fl.write(f"""PYTHON = {{sys.executable}}
+EMIT = {{emit}}
+COMPONENTS = {{' '.join(components)}}
+
+all: $(COMPONENTS)
+
+$(COMPONENTS):
+\\t$(MAKE) -C ../$@
+
+install: $(COMPONENTS:%=install-%)
+\\t$(PYTHON) $(EMIT) finish ..
+
+install-%:
+\\t$(MAKE) -C ../$* install
+
+.PHONY: all install $(COMPONENTS)
+""")
+    if core and others:
+        fl.write(f"\\n{{' '.join(others)}}: {{' '.join(core)}}\\n")
+for name in components:
+    with open(os.path.join(root, name, "Makefile"), "w") as fl:
+        fl.write(f"""all:
+\\t{{sys.executable}} {{emit}} compile $(CURDIR)
+
+install:
+\\t{{sys.executable}} {{emit}} install $(CURDIR)
+""")
+print("config.status: creating Makefile")
+'''
+
+# Package manager, query, sudo and pip stand-ins
+FAKE_TOOL = """#!/bin/sh
+i=0
+while [ $i -lt ${HEABENCH_PM_LINES:-200} ]; do
+    echo "Get:$i http://localhost/benchmark stable/main heabench-$i [1 kB]"
+    i=$((i + 1))
+done
+"""
+FAKE_SUDO = """#!/bin/sh
+exec "$@"
+"""
+FAKE_QUERY = """#!/bin/sh
+exit 0
+"""
+FAKE_COMPILER = """#!/bin/sh
+echo "$(basename "$0") (benchmark) 0.0"
+"""
+
+
+def load_config() -> dict:
+    """Reads the installer's config.json
+
+    Returns:
+        dict: Installer configuration
+    """
+
+    path = os.path.join(os.path.dirname(os.path.realpath(__file__)), "config.json")
+    with open(path, "r", encoding="utf-8") as fl:
+        return json.load(fl)
+
+
+def make_tarball(
+    directory: str, version: str, files: int, file_size: int, seed: int = 0
+) -> dict:
+    """Writes a synthetic heasoft source tarball
+
+    Source files are spread evenly over the core and every component of
+    config.json and filled with C-like text that compresses about as well as
+    real sources. BUILD_DIR holds the fake configure script and the output
+    writer it uses.
+
+    Args:
+        directory (str): Directory receiving the tarball
+        version (str): HEASoft version in the top-level directory name
+        files (int): Number of source files
+        file_size (int): Size of each source file in bytes
+        seed (int, optional): Seed of the file contents. Defaults to 0.
+
+    Returns:
+        dict: Tarball path, member count and compressed and uncompressed sizes
+    """
+
+    config = load_config()
+    components = ["heacore", "tcltk"] + [
+        component
+        for param in ("mission", "general", "xanadu", "xstar")
+        for component in config[param].values()
+    ]
+
+    # Draws every file from a shared pool of lines, like code sharing idioms
+    rng = random.Random(seed)
+    words = ["status", "fitsfile", "nrows", "buffer", "keyword", "double", "int", "long",
+             "char", "return", "if", "for", "ffgcvd", "ffpky", "hdu", "colnum", "naxis"]
+    pool = [
+        " " * rng.choice((0, 4, 8)) + " ".join(rng.choice(words) for _ in range(rng.randint(2, 9)))
+        + rng.choice((";", " {", ")", ";", "}")) + "\n"
+        for _ in range(4_096)
+    ]
+
+    top = f"heasoft-{version}"
+    path = os.path.join(directory, f"{top}src.tar.gz")
+    python = sys.executable
+    members = 0
+    size = 0
+    now = time.time()
+
+    def add(name: str, data: bytes = None, mode: int = 0o644) -> None:
+        nonlocal members, size
+        info = tarfile.TarInfo(f"{top}/{name}" if name else top)
+        info.mtime = now
+        if data is None:
+            info.type = tarfile.DIRTYPE
+            info.mode = 0o755
+            tar.addfile(info)
+        else:
+            info.size = len(data)
+            info.mode = mode
+            tar.addfile(info, io.BytesIO(data))
+            size += len(data)
+        members += 1
+
+    with tarfile.open(path, "w:gz", compresslevel=6) as tar:
+        add("")
+        add("BUILD_DIR")
+        add("BUILD_DIR/configure", CONFIGURE.format(python=python).encode(), 0o755)
+        add("BUILD_DIR/hd_emit", EMIT.format(python=python).encode(), 0o755)
+        for component in components:
+            add(component)
+            add(f"{component}/src")
+        for number in range(files):
+            component = components[number % len(components)]
+            text = []
+            length = 0
+            while length < file_size:
+                line = rng.choice(pool)
+                text.append(line)
+                length += len(line)
+            suffix = ".f" if number % 7 == 0 else ".c"
+            add(f"{component}/src/{component}_{number:06d}{suffix}", "".join(text).encode()[:file_size])
+
+    return {
+        "path": path,
+        "members": members,
+        "components": len(components),
+        "size": size,
+        "compressed": os.path.getsize(path),
+    }
+
+
+def write_tools(directory: str) -> str:
+    """Writes the fake package manager, sudo, pip and missing compiler commands
+
+    Args:
+        directory (str): Directory receiving the bin directory
+
+    Returns:
+        str: The bin directory, to be put first on PATH
+    """
+
+    config = load_config()
+    ops = config[platform.system().lower()]
+    manager = next(iter(ops["package_manager"]))
+    query = ops["package_manager"][manager].get("query")
+
+    bindir = os.path.join(directory, "bin")
+    os.makedirs(bindir, exist_ok=True)
+    tools = {manager: FAKE_TOOL, "sudo": FAKE_SUDO, "pip": FAKE_TOOL}
+    if query:
+        tools[query["cmd"].split()[0]] = FAKE_QUERY
+    for compiler in ops["compilers"]:
+        if not shutil.which(compiler):
+            tools[compiler] = FAKE_COMPILER
+    with open(os.path.join(bindir, "hd_emit"), "w", encoding="utf-8") as fl:
+        fl.write(EMIT.format(python=sys.executable))
+    os.chmod(os.path.join(bindir, "hd_emit"), 0o755)
+    for name, script in tools.items():
+        with open(os.path.join(bindir, name), "w", encoding="utf-8") as fl:
+            fl.write(script)
+        os.chmod(os.path.join(bindir, name), 0o755)
+
+    return bindir
+
+
+class TarballServer:
+    """Serves one file over HTTP/1.1 with keep-alive and range requests.
+
+    Every connection can be limited to a bandwidth so segmented and streamed
+    downloads see a network-like transfer rate.
+    """
+
+    def __init__(self, path: str, bandwidth: float = 0):
+        """Initializes a TarballServer object
+
+        Args:
+            path (str): File to serve
+            bandwidth (float, optional): Bytes per second per connection, 0 for no limit. Defaults to 0.
+        """
+
+        self.path = path
+        self.bandwidth = bandwidth
+        self.server = None
+        self.__thread = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_port}/{os.path.basename(self.path)}"
+
+    def __enter__(self):
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self) -> None:
+                size = os.path.getsize(server.path)
+                start, end = 0, size - 1
+                ranged = self.headers.get("Range", "").startswith("bytes=")
+                if ranged:
+                    first, _, last = self.headers["Range"][6:].partition("-")
+                    start = int(first or 0)
+                    end = min(int(last), size - 1) if last else size - 1
+                    self.send_response(206)
+                    self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+                else:
+                    self.send_response(200)
+                self.send_header("Content-Length", str(end - start + 1))
+                self.send_header("Content-Type", "application/gzip")
+                self.end_headers()
+
+                # Sends in blocks, sleeping to hold the connection to its bandwidth
+                begin = time.monotonic()
+                sent = 0
+                with open(server.path, "rb") as fl:
+                    fl.seek(start)
+                    remaining = end - start + 1
+                    while remaining > 0:
+                        data = fl.read(min(remaining, 2**16))
+                        self.wfile.write(data)
+                        remaining -= len(data)
+                        sent += len(data)
+                        if server.bandwidth:
+                            delay = sent / server.bandwidth - (time.monotonic() - begin)
+                            if delay > 0:
+                                time.sleep(delay)
+
+            def log_message(self, *args) -> None:
+                pass
+
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.__thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.__thread.start()
+
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        self.__thread.join()
+
+
+class Sandbox:
+    """Throwaway home directory the installer runs in.
+
+    HOME and XDG_CACHE_HOME point into the sandbox, the fake commands come
+    first on PATH, the download question is answered no and the installer's
+    output goes to installer-output.log. The environment, working directory
+    and standard streams are restored on exit. A sandbox left by a failure is
+    kept for inspection.
+    """
+
+    def __init__(self, directory: str, bindir: str, env: dict, keep: bool = False):
+        """Initializes a Sandbox object
+
+        Args:
+            directory (str): Directory the sandbox is created in
+            bindir (str): Directory of the fake commands
+            env (dict): Extra environment variables for the fake build tools
+            keep (bool, optional): Keeps the sandbox after a successful run. Defaults to False.
+        """
+
+        self.directory = directory
+        self.bindir = bindir
+        self.env = env
+        self.keep = keep
+        self.home = None
+        self.log = None
+        self.__saved = None
+
+    def __enter__(self):
+        self.home = tempfile.mkdtemp(prefix="sandbox-", dir=self.directory)
+        self.__saved = (dict(os.environ), os.getcwd(), sys.stdin, sys.stdout, sys.stderr)
+        os.environ.update(
+            HOME=self.home,
+            XDG_CACHE_HOME=os.path.join(self.home, ".cache"),
+            SHELL=shutil.which("bash"),
+            PATH=f"{self.bindir}:{os.environ.get('PATH', '')}",
+            PIP_CMD=f"{os.path.join(self.bindir, 'pip')} install",
+            **self.env,
+        )
+        self.log = open(os.path.join(self.home, "installer-output.log"), "a", encoding="utf-8")
+        sys.stdin = io.StringIO("n\n" * 16)
+        sys.stdout = sys.stderr = self.log
+
+        return self
+
+    def __exit__(self, exc_type, *exc) -> None:
+        environ, cwd, sys.stdin, sys.stdout, sys.stderr = self.__saved
+        os.environ.clear()
+        os.environ.update(environ)
+        os.chdir(cwd)
+        self.log.close()
+        if not (exc_type or self.keep):
+            shutil.rmtree(self.home, ignore_errors=True)
+
+
+def private(hea: Heainstall, name: str):
+    """Gets a name mangled method of an installer
+
+    Args:
+        hea (Heainstall): Installer
+        name (str): Method name without leading underscores
+
+    Returns:
+        callable: Bound method
+    """
+
+    return getattr(hea, f"_Heainstall__{name}")
+
+
+def measure(action, repeat: int, setup=None) -> dict:
+    """Runs an action several times and keeps the fastest and median run
+
+    Args:
+        action (callable): Benchmarked action
+        repeat (int): Number of runs
+        setup (callable, optional): Untimed preparation before every run. Defaults to None.
+
+    Returns:
+        dict: Fastest and median wall seconds, CPU seconds of the fastest run and peak RSS
+    """
+
+    runs = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        meter = ResourceMeter(sample=False).start()
+        action()
+        runs.append(meter.stop())
+    fastest = min(runs, key=lambda run: run["wall"])
+
+    return {
+        "wall": fastest["wall"],
+        "median": round(statistics.median(run["wall"] for run in runs), 3),
+        "user_cpu": fastest["user_cpu"],
+        "system_cpu": fastest["system_cpu"],
+        "peak_rss": max(run["peak_rss"] for run in runs),
+    }
+
+
+def per_call(action, calls: int) -> float:
+    """Times a cheap action by calling it many times
+
+    Args:
+        action (callable): Receives the call number
+        calls (int): Number of calls
+
+    Returns:
+        float: Microseconds per call
+    """
+
+    start = time.perf_counter()
+    for number in range(calls):
+        action(number)
+
+    return round((time.perf_counter() - start) / calls * 1e6, 3)
+
+
+def make_output(root: str, components: list, lines: int) -> bytes:
+    """Generates recursive make output like the fake build writes
+
+    Args:
+        root (str): Source tree path
+        components (list): Component names
+        lines (int): Approximate number of lines
+
+    Returns:
+        bytes: make output
+    """
+
+    out = []
+    per = max(1, lines // len(components))
+    for component in components:
+        out.append(f"make[1]: Entering directory '{root}/{component}'")
+        for number in range(0, per, 4):
+            name = f"src/{component}_{number:06d}.c"
+            out.append(f"gcc -c -O2 -fPIC -Wall -I../include -o {name[:-2]}.o {name}")
+            out += [f"{name}:{n + 10}:5: warning: unused variable 'tmp{n}'" for n in range(3)]
+        out.append(f"make[1]: Leaving directory '{root}/{component}'")
+
+    return ("\n".join(out) + "\n").encode()
+
+
+class Benchmark:
+    """Runs the selected benchmarks against one synthetic tarball"""
+
+    def __init__(self, args: argparse.Namespace, directory: str):
+        """Initializes a Benchmark object
+
+        Args:
+            args (argparse.Namespace): Benchmark options
+            directory (str): Working directory for the tarball, tools and sandboxes
+        """
+
+        self.args = args
+        self.directory = directory
+        self.tarball = make_tarball(directory, args.version, args.files, args.file_size * 1024)
+        self.bindir = write_tools(directory)
+        self.env = {
+            "HEABENCH_RATE": str(args.rate),
+            "HEABENCH_NOISE": str(args.noise),
+            "HEABENCH_CONFIGURE_LINES": str(args.configure_lines),
+            "HEABENCH_PM_LINES": str(args.pm_lines),
+        }
+        self.results = {}
+        self.failed = False
+        self.current = None
+
+    def sandbox(self) -> Sandbox:
+        self.current = Sandbox(self.directory, self.bindir, self.env, self.args.keep)
+
+        return self.current
+
+    def run(self) -> dict:
+        """Runs the selected benchmarks
+
+        Returns:
+            dict: Results by benchmark
+        """
+
+        for name in self.args.only or BENCHMARKS:
+            print(f"Running {name} benchmark", flush=True)
+            try:
+                self.results[name] = getattr(self, f"bench_{name}")()
+            except SystemExit:
+                self.failed = True
+                self.results[name] = {"error": f"installer exited, see {self.current.home}"}
+            print(f"  {json.dumps(self.results[name])}", flush=True)
+
+        return self.results
+
+    def bench_extract(self) -> dict:
+        """Extracts the tarball into an emptied source tree"""
+
+        with self.sandbox():
+            hea = self.sandbox_installer()
+            source = os.path.join(hea.work_dir, f"heasoft-{self.args.version}")
+            result = measure(
+                lambda: hea.extract_targz(self.tarball["path"]),
+                self.args.repeat,
+                lambda: shutil.rmtree(source, ignore_errors=True),
+            )
+        result["compressed_bytes_per_second"] = round(self.tarball["compressed"] / result["wall"])
+        result["bytes_per_second"] = round(self.tarball["size"] / result["wall"])
+        result["files_per_second"] = round(self.tarball["members"] / result["wall"])
+
+        return result
+
+    def bench_trackers(self) -> dict:
+        """Times the progress trackers called on every supervisor wake-up"""
+
+        calls = self.args.calls
+        with self.sandbox():
+            hea = self.sandbox_installer()
+            track_lines = private(hea, "track_lines")
+            track_download = private(hea, "track_download")
+            track_make = private(hea, "track_make")
+            devnull = open(os.devnull, "w", encoding="utf-8")
+            files = []
+            for size in (1, 2):
+                files.append(os.path.join(hea.hea_dir, f"download-{size}"))
+                with open(files[-1], "wb") as fl:
+                    fl.write(b"\0" * size)
+
+            pbar = tqdm(total=calls, file=devnull)
+            result = {
+                "track_lines_changed_us": per_call(
+                    lambda n: track_lines(None, pbar, lines=n + 1), calls
+                ),
+                "track_lines_unchanged_us": per_call(
+                    lambda n: track_lines(None, pbar, lines=pbar.n), calls
+                ),
+                "track_download_changed_us": per_call(
+                    lambda n: track_download(files[n % 2], pbar), calls
+                ),
+                "track_download_unchanged_us": per_call(
+                    lambda n: track_download(files[1], pbar), calls
+                ),
+            }
+
+            # Feeds one line between calls so every call has something to redraw
+            root = os.path.join(hea.work_dir, f"heasoft-{self.args.version}")
+            components = [f"component{number:02d}" for number in range(40)]
+            output = make_output(root, components, calls * 4)
+            lines = output.splitlines(keepends=True)
+            progress = MakeProgress(root, {name: len(lines) // 40 for name in components})
+            status = tqdm(bar_format="{desc}", file=devnull)
+
+            def make_call(number: int, feed: bool) -> None:
+                if feed:
+                    progress.feed(lines[number % len(lines)])
+                track_make(None, pbar, lines=number, progress=progress, status=status)
+
+            result["track_make_changed_us"] = per_call(lambda n: make_call(n, True), calls)
+            result["track_make_unchanged_us"] = per_call(lambda n: make_call(n, False), calls)
+
+            # Parses the whole output in the blocks make would write it
+            progress = MakeProgress(root, {name: len(lines) // 40 for name in components})
+            start = time.perf_counter()
+            for offset in range(0, len(output), 2**16):
+                progress.feed(output[offset : offset + 2**16])
+            result["make_progress_lines_per_second"] = round(
+                len(lines) / (time.perf_counter() - start)
+            )
+            pbar.close()
+            status.close()
+            devnull.close()
+
+        return result
+
+    def bench_pipeline(self) -> dict:
+        """Compares running a command directly and through the installer's runners"""
+
+        lines = str(self.args.lines)
+        command = [sys.executable, os.path.join(self.bindir, "hd_emit"), "lines", lines]
+        repeat = self.args.repeat
+        result = {}
+        with self.sandbox():
+            os.environ["HEABENCH_RATE"] = "0"
+            hea = self.sandbox_installer()
+            run_pipeline = private(hea, "run_pipeline")
+            run_pipeloader = private(hea, "run_pipeloader")
+            with open(os.devnull, "wb") as devnull:
+                result["direct"] = measure(
+                    lambda: subprocess.run(command, stdout=devnull, check=True), repeat
+                )
+            for name, log in (("pipeline", "bench.log"), ("pipeline_gzip", "bench.log.gz")):
+                result[name] = measure(
+                    lambda: run_pipeline(
+                        self.args.lines, log, log, "Benchmark", 0.1, "Benchmark",
+                        "line_number", " ln", *command,
+                    ),
+                    repeat,
+                )
+            result["pipeloader"] = measure(
+                lambda: run_pipeloader("installer.log", "Benchmark", *command), repeat
+            )
+        for name in ("pipeline", "pipeline_gzip", "pipeloader"):
+            result[name]["overhead"] = round(result[name]["wall"] - result["direct"]["wall"], 3)
+            result[name]["lines_per_second"] = round(self.args.lines / result[name]["wall"])
+
+        return result
+
+    def bench_download(self) -> dict:
+        """Downloads from the local server, then downloads and extracts in one pass"""
+
+        result = {}
+        bandwidth = self.args.bandwidth * 2**20
+        with TarballServer(self.tarball["path"], bandwidth) as server, self.sandbox():
+            hea = self.sandbox_installer("--downloader", "native")
+            hea.url = server.url
+            source = os.path.join(hea.work_dir, f"heasoft-{self.args.version}")
+
+            def reset() -> None:
+                for path in (hea.tarball, f"{hea.tarball}.json", f"{hea.tarball}.part"):
+                    if os.path.exists(path):
+                        os.remove(path)
+                shutil.rmtree(source, ignore_errors=True)
+
+            result["native"] = measure(hea.download_heasoft, self.args.repeat, reset)
+            result["pipelined"] = measure(hea.stream_heasoft, self.args.repeat, reset)
+        for name in ("native", "pipelined"):
+            result[name]["bytes_per_second"] = round(
+                self.tarball["compressed"] / result[name]["wall"]
+            )
+
+        return result
+
+    def bench_run(self) -> dict:
+        """Runs the whole installation, then again to time resuming and a restart with warm caches"""
+
+        runs = []
+        with TarballServer(self.tarball["path"], self.args.bandwidth * 2**20) as server:
+            for _ in range(self.args.repeat):
+                with self.sandbox():
+                    environ = dict(os.environ)
+                    hea = self.sandbox_installer("--downloader", "native", "--configure-cache")
+                    hea.url = server.url
+                    first = measure(hea.run, 1)
+                    with open(os.path.join(hea.hea_dir, "performance.json"), encoding="utf-8") as fl:
+                        phases = {
+                            phase["phase"]: phase.get("wall")
+                            for phase in json.load(fl)["phases"]
+                        }
+
+                    # Resumes like a new process would, without the environment phase's changes
+                    os.environ.clear()
+                    os.environ.update(environ)
+                    hea = self.sandbox_installer("--downloader", "native", "--configure-cache")
+                    hea.url = server.url
+                    resume = measure(hea.run, 1)
+
+                    # Redoes every phase, configure now finds the results it cached
+                    os.environ.clear()
+                    os.environ.update(environ)
+                    hea = self.sandbox_installer(
+                        "--downloader", "native", "--configure-cache", "--restart"
+                    )
+                    hea.url = server.url
+                    restart = measure(hea.run, 1)
+                    with open(os.path.join(hea.hea_dir, "performance.json"), encoding="utf-8") as fl:
+                        warm = {
+                            phase["phase"]: phase.get("wall")
+                            for phase in json.load(fl)["phases"]
+                        }.get("configure")
+                runs.append((first, phases, resume, restart, warm))
+        first, phases, resume, restart, warm = min(runs, key=lambda run: run[0]["wall"])
+
+        return {
+            **first,
+            "median": round(statistics.median(run[0]["wall"] for run in runs), 3),
+            "phases": phases,
+            "resume": resume["wall"],
+            "restart": restart["wall"],
+            "configure_warm": warm,
+        }
+
+    def sandbox_installer(self, *argv) -> Heainstall:
+        return Heainstall(
+            heainstaller.parse_args(
+                [
+                    "--no-ccache",
+                    "--no-preflight",
+                    "--scratch",
+                    "no",
+                    "--freshness",
+                    "0",
+                    "-j",
+                    str(self.args.jobs),
+                    *argv,
+                ]
+            )
+        )
+
+
+def flatten(results: dict, prefix: str = "") -> dict:
+    """Flattens nested results into dotted metric names
+
+    Args:
+        results (dict): Results
+        prefix (str, optional): Name prefix. Defaults to "".
+
+    Returns:
+        dict: Numeric results by metric name
+    """
+
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[f"{prefix}{key}"] = value
+
+    return flat
+
+
+def compare(old: dict, new: dict) -> None:
+    """Prints the metrics of two result files side by side
+
+    Args:
+        old (dict): Earlier results
+        new (dict): Current results
+    """
+
+    before = flatten(old["results"])
+    after = flatten(new["results"])
+    print(f"\n{'Metric':<48}{old['commit']:>14}{new['commit']:>14}{'Change':>10}")
+    for name in sorted(set(before) & set(after)):
+        change = (after[name] - before[name]) / before[name] * 100 if before[name] else 0
+        print(f"{name:<48}{before[name]:>14g}{after[name]:>14g}{change:>+9.1f}%")
+
+
+def git_commit() -> str:
+    """Gets the commit the benchmark runs against
+
+    Returns:
+        str: Abbreviated commit hash, with -dirty for local changes
+    """
+
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"],
+            cwd=os.path.dirname(os.path.realpath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def parse_args(argv: list = None) -> argparse.Namespace:
+    """Parses command line options
+
+    Args:
+        argv (list, optional): Arguments to parse. Defaults to sys.argv[1:].
+
+    Returns:
+        argparse.Namespace: Parsed options
+    """
+
+    parser = argparse.ArgumentParser(
+        description="Benchmarks the installer against a synthetic HEASoft tarball"
+    )
+    parser.add_argument(
+        "--only", nargs="+", choices=BENCHMARKS, help="benchmarks to run (default: all)"
+    )
+    parser.add_argument("--files", type=int, default=2_000, help="source files in the tarball")
+    parser.add_argument(
+        "--file-size", type=int, default=16, help="size of each source file in KiB"
+    )
+    parser.add_argument("--version", default="6.35", help="HEASoft version of the tarball")
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=5_000,
+        help="lines per second written by each fake build job, 0 for no limit",
+    )
+    parser.add_argument(
+        "--noise", type=int, default=3, help="warning lines written per compiled file"
+    )
+    parser.add_argument(
+        "--configure-lines", type=int, default=3_146, help="lines written by configure"
+    )
+    parser.add_argument(
+        "--pm-lines", type=int, default=200, help="lines written by each package manager call"
+    )
+    parser.add_argument(
+        "--lines", type=int, default=200_000, help="lines written in the pipeline benchmark"
+    )
+    parser.add_argument(
+        "--calls", type=int, default=20_000, help="calls per tracker in the tracker benchmark"
+    )
+    parser.add_argument(
+        "--bandwidth",
+        type=float,
+        default=0,
+        help="MiB per second per download connection, 0 for no limit",
+    )
+    parser.add_argument("-j", "--jobs", type=int, default=4, help="parallel make jobs")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per benchmark")
+    parser.add_argument("--dir", help="working directory (default: a temporary directory)")
+    parser.add_argument(
+        "--keep", action="store_true", help="keep the working directory and sandboxes"
+    )
+    parser.add_argument("--output", help="results file (default: benchmark-COMMIT.json)")
+    parser.add_argument("--compare", metavar="FILE", help="results file to compare against")
+
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    for tool in ("make", "bash"):
+        if not shutil.which(tool):
+            print(f"{tool} not found. It is needed to run the benchmarks\nExiting")
+            sys.exit()
+    commit = git_commit()
+    output = os.path.abspath(args.output or f"benchmark-{commit}.json")
+
+    directory = args.dir or tempfile.mkdtemp(prefix="heabench-")
+    os.makedirs(directory, exist_ok=True)
+    benchmark = None
+    try:
+        benchmark = Benchmark(args, os.path.abspath(directory))
+        print(
+            f"Tarball: {benchmark.tarball['members']} members, "
+            f"{tqdm.format_sizeof(benchmark.tarball['size'], 'B', 1024)} "
+            f"({tqdm.format_sizeof(benchmark.tarball['compressed'], 'B', 1024)} compressed)"
+        )
+        results = {
+            "commit": commit,
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "host": {
+                "platform": platform.system().lower(),
+                "architecture": platform.machine(),
+                "python": platform.python_version(),
+                "cpus": cpu_count(),
+            },
+            "parameters": {
+                key: value
+                for key, value in vars(args).items()
+                if key not in ("only", "dir", "keep", "output", "compare")
+            },
+            "tarball": {key: value for key, value in benchmark.tarball.items() if key != "path"},
+            "results": benchmark.run(),
+        }
+    finally:
+        # Keeps the sandboxes of failed benchmarks for inspection
+        if not (args.keep or args.dir or (benchmark and benchmark.failed)):
+            shutil.rmtree(directory, ignore_errors=True)
+
+    with open(output, "w", encoding="utf-8") as fl:
+        json.dump(results, fl, indent=2)
+    print(f"Results: {output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as fl:
+            compare(json.load(fl), results)
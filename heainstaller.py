@@ -6,7 +6,8 @@ Description:
     It is recommended to have an active virtual or conda environment
 
 Usage: 
-    python3 heainstaller.py
+    python3 heainstaller.py [-j JOBS] [--max-load LOAD] [--memory-per-job MIB] [--pipeline]
+    python3 heainstaller.py --export FILE | --import FILE
 
 Dependencies:
     - Python >= 3.8
@@ -24,16 +25,36 @@ Notes:
 """
 
 import os
+import re
 import sys
 import shutil
 import platform
 import subprocess
 import tarfile
+import tempfile
 import glob
 import stat
 import time
 import json
+import io
+import gzip
+import collections
+import queue
+import contextvars
+import argparse
+import itertools
+import select
+import selectors
+import signal
+import threading
+import resource
+import hashlib
+import statistics
+import http.client
+import urllib.parse
+import urllib.request
 import readline
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, ThreadPoolExecutor, wait
 try:
     from tqdm import tqdm
 except ImportError:
@@ -41,562 +62,5066 @@ except ImportError:
     sys.exit()
 
 
+def available_memory() -> int:
+    """Gets the memory available to new processes without swapping
+
+    Returns:
+        int: Available memory in bytes, 0 if it cannot be determined
+    """
+
+    # Reads kernel estimate on Linux
+    try:
+        with open("/proc/meminfo", "r", encoding="utf-8") as meminfo:
+            for line in meminfo:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+
+    # Sums free and inactive pages on Darwin
+    try:
+        result = subprocess.run(
+            ["vm_stat"], capture_output=True, text=True, check=True
+        )
+        page = int(re.search(r"page size of (\d+)", result.stdout).group(1))
+        pages = sum(
+            int(value)
+            for key, value in re.findall(r"Pages (\w+):\s+(\d+)", result.stdout)
+            if key in ("free", "inactive", "speculative", "purgeable")
+        )
+        return pages * page
+    except (OSError, subprocess.CalledProcessError, AttributeError, ValueError):
+        pass
+
+    # Falls back to POSIX free pages
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (ValueError, OSError, AttributeError):
+        return 0
+
+
+def cpu_count() -> int:
+    """Gets the number of CPUs usable by the current process
+
+    Returns:
+        int: Number of usable CPUs
+    """
+
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def cpu_model() -> str:
+    """Gets the CPU model name, which decides where natively tuned binaries can run
+
+    Returns:
+        str: CPU model name, the machine architecture if it cannot be determined
+    """
+
+    # Reads the first processor entry on Linux
+    try:
+        with open("/proc/cpuinfo", "r", encoding="utf-8") as cpuinfo:
+            for line in cpuinfo:
+                key, _, value = line.partition(":")
+                if key.strip() in ("model name", "Model", "CPU part"):
+                    return value.strip()
+    except OSError:
+        pass
+
+    # Asks the kernel on Darwin
+    try:
+        result = subprocess.run(
+            ["sysctl", "-n", "machdep.cpu.brand_string"],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        if result.stdout.strip():
+            return result.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        pass
+
+    return platform.machine()
+
+
+class JobServer:
+    """GNU make jobserver whose token pool follows memory and load headroom.
+
+    make is started with a jobserver pipe owned by the installer instead of a
+    fixed -jN. A monitor thread withholds tokens from make while available
+    memory or load average is short and hands them back once it recovers, so
+    the effective job count adapts during the build.
+    """
+
+    def __init__(
+        self,
+        jobs: int,
+        memory_per_job: int,
+        max_load: float,
+        adaptive: bool = True,
+        interval: float = 5.0,
+        log=None,
+    ):
+        """Initializes a JobServer object
+
+        Args:
+            jobs (int): Maximum number of parallel jobs
+            memory_per_job (int): Memory required per job in bytes
+            max_load (float): Load average above which jobs are withheld
+            adaptive (bool, optional): Adapts job count during the build. Defaults to True.
+            interval (float, optional): Seconds between headroom checks. Defaults to 5.0.
+            log (callable, optional): Receives job count change messages. Defaults to None.
+        """
+
+        self.jobs = jobs
+        self.memory_per_job = memory_per_job
+        self.max_load = max_load
+        self.adaptive = adaptive and jobs > 1
+        self.interval = interval
+        self.log = log or (lambda msg: None)
+        self.reserved = 0
+        self.fds = ()
+        self.__stop = threading.Event()
+        self.__thread = None
+
+    @property
+    def effective(self) -> int:
+        """int: Number of jobs make can currently run"""
+
+        return self.jobs - self.reserved
+
+    def make_args(self, env: dict) -> list:
+        """Prepares make arguments and environment for the configured job count
+
+        Args:
+            env (dict): Environment passed to make, updated in place
+
+        Returns:
+            list: Extra make command line arguments
+        """
+
+        args = [f"-l{self.max_load:g}"] if self.max_load else []
+        version = self.__make_version()
+
+        # Keeps each target's output together with its directory messages
+        if version and version >= (4, 0) and self.jobs > 1:
+            args.append("--output-sync=target")
+        if not self.adaptive or version is None:
+            self.adaptive = False
+            return [f"-j{self.jobs}", *args]
+
+        # Fills jobserver pipe with one token per job beyond the implicit one
+        read_fd, write_fd = os.pipe()
+        os.write(write_fd, b"+" * (self.jobs - 1))
+        self.fds = (read_fd, write_fd)
+        option = "jobserver-auth" if version >= (4, 2) else "jobserver-fds"
+        env["MAKEFLAGS"] = (
+            f"{env.get('MAKEFLAGS', '')} -j --{option}={read_fd},{write_fd}".strip()
+        )
+        return args
+
+    def start(self) -> None:
+        """Starts the headroom monitor"""
+
+        if self.adaptive:
+            self.__thread = threading.Thread(target=self.__monitor, daemon=True)
+            self.__thread.start()
+
+        return
+
+    def stop(self) -> None:
+        """Stops the headroom monitor and releases the jobserver pipe"""
+
+        self.__stop.set()
+        if self.__thread:
+            self.__thread.join()
+        for fd in self.fds:
+            os.close(fd)
+        self.fds = ()
+
+        return
+
+    def __monitor(self) -> None:
+        """Withholds or returns one token per interval based on headroom"""
+
+        while not self.__stop.wait(self.interval):
+            memory = available_memory()
+            load = os.getloadavg()[0]
+            short = (memory and memory < self.memory_per_job) or (
+                self.max_load and load > self.max_load
+            )
+            spare = (not memory or memory > 2 * self.memory_per_job) and (
+                not self.max_load or load < 0.8 * self.max_load
+            )
+
+            # Takes a token out of circulation, waiting for a running job to end
+            if short and self.effective > 1:
+                if not self.__take_token():
+                    break
+                self.reserved += 1
+            elif spare and self.reserved:
+                os.write(self.fds[1], b"+")
+                self.reserved -= 1
+            else:
+                continue
+            self.log(
+                f"Parallel jobs: {self.effective} "
+                f"(available memory {memory // 2**20} MiB, load {load:.2f})"
+            )
+
+        return
+
+    def __take_token(self) -> bool:
+        """Reads one token from the jobserver pipe
+
+        make may switch the shared pipe to non-blocking mode, so readiness is
+        awaited with select and lost races with make's own reads are retried.
+
+        Returns:
+            bool: True if a token was taken, False if stopped while waiting
+        """
+
+        while not self.__stop.is_set():
+            ready, _, _ = select.select([self.fds[0]], [], [], self.interval)
+            if not ready:
+                continue
+            try:
+                if os.read(self.fds[0], 1):
+                    return True
+            except BlockingIOError:
+                continue
+
+        return False
+
+    @staticmethod
+    def __make_version():
+        """Gets the GNU make version
+
+        Returns:
+            tuple: (major, minor) version, None if make is not GNU make
+        """
+
+        try:
+            result = subprocess.run(
+                ["make", "--version"], capture_output=True, text=True, check=True
+            )
+            match = re.match(r"GNU Make (\d+)\.(\d+)", result.stdout)
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+        return (int(match.group(1)), int(match.group(2))) if match else None
+
+
+class MakeProgress:
+    """Follows a recursive make build component by component from its output.
+
+    Every output line is counted against a component, the top-level source
+    directory make is working in. make's Entering and Leaving directory
+    messages are followed per make level, so with parallel jobs and output
+    synchronised per target each block of output is counted against the
+    directory it came from. Lines naming a path inside a component count
+    against that component directly. Components are weighted by the number of
+    lines they are expected to write, and a finished component counts in
+    full whatever it actually wrote.
+    """
+
+    directory = re.compile(rb"^\S*make(?:\[(\d+)\])?: (Entering|Leaving) directory [`'](.*)'")
+    compiler = re.compile(
+        rb"^\s*(?:\S*ccache\s+)?\S*\b(?:cc|gcc|g\+\+|c\+\+|clang|clang\+\+|gfortran|f77|f95)(?=\s).*\s-c\s"
+    )
+    sources = (".c", ".cc", ".cxx", ".cpp", ".C", ".f", ".f90", ".F", ".for")
+
+    def __init__(self, root: str, expected: dict):
+        """Initializes a MakeProgress object
+
+        Args:
+            root (str): Source tree whose top-level directories are the components
+            expected (dict): Expected output lines by component
+        """
+
+        self.root = os.path.realpath(root)
+        self.expected = dict(expected)
+        self.lines = collections.Counter()
+        self.compiled = collections.Counter()
+        self.elapsed = collections.Counter()
+        self.finished = set()
+        self.__depth = collections.Counter()
+        self.__since = {}
+        self.__levels = {}
+        self.__partial = b""
+        self.__hint = re.compile(re.escape(os.path.basename(self.root)).encode() + rb"/([^/\s'\"]+)/")
+
+    def feed(self, data: bytes) -> None:
+        """Parses output as it arrives
+
+        Args:
+            data (bytes): Output of make, possibly ending in a partial line
+        """
+
+        lines = (self.__partial + data).split(b"\n")
+        self.__partial = lines.pop()
+        now = time.monotonic()
+        for line in lines:
+            self.__parse(line, now)
+
+        return
+
+    def overall(self) -> tuple:
+        """Gets the weighted progress of the whole build
+
+        Returns:
+            tuple: Lines done and expected, counting finished components in full
+        """
+
+        done = sum(
+            weight if component in self.finished else min(self.lines[component], weight)
+            for component, weight in self.expected.items()
+        )
+
+        return done, sum(self.expected.values())
+
+    def percent(self, component: str) -> int:
+        """Gets the progress of a component
+
+        Args:
+            component (str): Component name
+
+        Returns:
+            int: Percentage done, held below 100 until make leaves the component
+        """
+
+        if component in self.finished:
+            return 100
+        expected = self.expected.get(component)
+
+        return min(99, 100 * self.lines[component] // expected) if expected else 0
+
+    def running(self) -> list:
+        """Gets the components make is working in, in the order they started
+
+        Returns:
+            list: Component names
+        """
+
+        return [component for component in self.__since if self.__depth[component] > 0]
+
+    def slowest(self, count: int = 3) -> list:
+        """Gets the components that have taken longest so far
+
+        Args:
+            count (int, optional): Number of components. Defaults to 3.
+
+        Returns:
+            list: (component, seconds) pairs, longest first
+        """
+
+        now = time.monotonic()
+        times = collections.Counter(self.elapsed)
+        for component in self.running():
+            times[component] += now - self.__since[component]
+
+        return times.most_common(count)
+
+    def status(self) -> str:
+        """Describes running components and the slowest ones
+
+        Returns:
+            str: One line status
+        """
+
+        running = ", ".join(
+            f"{component} {self.percent(component)}%" for component in self.running()[:4]
+        )
+        slowest = ", ".join(
+            f"{component} {tqdm.format_interval(seconds)}" for component, seconds in self.slowest()
+        )
+
+        return f"Building: {running or '-'} | Slowest: {slowest or '-'}"
+
+    @classmethod
+    def count_sources(cls, root: str) -> dict:
+        """Counts compilable source files per component
+
+        Args:
+            root (str): Source tree
+
+        Returns:
+            dict: Number of source files by component
+        """
+
+        counts = collections.Counter()
+        for entry in os.scandir(root):
+            if not entry.is_dir(follow_symlinks=False):
+                continue
+            for _, _, files in os.walk(entry.path):
+                counts[entry.name] += sum(name.endswith(cls.sources) for name in files)
+
+        return dict(counts)
+
+    def __parse(self, line: bytes, now: float) -> None:
+        """Counts one line against its component
+
+        Args:
+            line (bytes): Output line
+            now (float): Monotonic time the line arrived
+        """
+
+        match = self.directory.match(line)
+        if match:
+            stack = self.__levels.setdefault(int(match.group(1) or 0), [])
+            path = os.path.relpath(match.group(3).decode(errors="replace"), self.root)
+            component = None if path.startswith("..") or path == "." else path.split(os.sep)[0]
+            if match.group(2) == b"Entering":
+                stack.append(component)
+                if component:
+                    self.__enter(component, now)
+            else:
+                if stack:
+                    stack.pop()
+                if component:
+                    self.__leave(component, now)
+        else:
+            hint = self.__hint.search(line)
+            component = hint.group(1).decode(errors="replace") if hint else None
+            if component not in self.expected and component not in self.__since:
+                component = next(
+                    (
+                        self.__levels[level][-1]
+                        for level in sorted(self.__levels, reverse=True)
+                        if self.__levels[level]
+                    ),
+                    None,
+                )
+        if component:
+            self.lines[component] += 1
+            if not match and self.compiler.match(line):
+                self.compiled[component] += 1
+
+        return
+
+    def __enter(self, component: str, now: float) -> None:
+        """Records make entering a directory of a component
+
+        Args:
+            component (str): Component name
+            now (float): Monotonic time
+        """
+
+        if self.__depth[component] == 0:
+            self.__since[component] = now
+            self.finished.discard(component)
+        self.__depth[component] += 1
+
+        return
+
+    def __leave(self, component: str, now: float) -> None:
+        """Records make leaving a directory of a component
+
+        Args:
+            component (str): Component name
+            now (float): Monotonic time
+        """
+
+        if self.__depth[component] == 0:
+            return
+        self.__depth[component] -= 1
+        if self.__depth[component] == 0:
+            self.elapsed[component] += now - self.__since[component]
+            self.finished.add(component)
+
+        return
+
+
+class StreamExtractor:
+    """Extracts a compressed tar stream using all available cores.
+
+    Gzip streams are inflated by an external multi-threaded decompressor
+    (pigz or igzip) when one is installed, falling back to in-process zlib.
+    Regular file payloads are handed to a thread pool that creates, writes and
+    sets modes on files while the next members are being decoded. Members
+    rejected by an optional selector are passed over without being written,
+    selected hard links to them are kept in missing_links.
+    """
+
+    decompressors = (["pigz", "-dc"], ["igzip", "-dc"])
+
+    def __init__(
+        self,
+        path: str = ".",
+        workers: int = 0,
+        budget: int = 64 * 2**20,
+        select=None,
+    ):
+        """Initializes a StreamExtractor object
+
+        Args:
+            path (str, optional): Extraction directory. Defaults to ".".
+            workers (int, optional): File writer threads, 0 picks from CPU count. Defaults to 0.
+            budget (int, optional): Maximum bytes of file data queued for writing. Defaults to 64 MiB.
+            select (callable, optional): Receives a member name, returns False to skip it. Defaults to None.
+        """
+
+        self.path = path
+        self.workers = workers or min(16, cpu_count() + 4)
+        self.budget = budget
+        self.select = select
+        self.consumed = 0
+        self.written = 0
+        self.skipped_files = 0
+        self.skipped_bytes = 0
+        self.missing_links = {}
+        self.decompressor = None
+
+    def extract(self, fileobj, callback=None) -> None:
+        """Extracts all members of a compressed tar stream
+
+        Args:
+            fileobj (file): Compressed tarball opened for binary reading
+            callback (callable, optional): Receives compressed bytes consumed after each member. Defaults to None.
+        """
+
+        callback = callback or (lambda consumed: None)
+        head = self.__read(fileobj, 2)
+        command = self.__find_decompressor() if head == b"\x1f\x8b" else None
+
+        # Falls back to in-process decompression
+        if not command:
+            stream = _ChainReader(head, fileobj, self)
+            with tarfile.open(fileobj=stream, mode="r|*") as tar:
+                self.__extract_members(tar, callback)
+            return
+
+        # Feeds compressed bytes to the external decompressor from a thread
+        self.decompressor = os.path.basename(command[0])
+        process = subprocess.Popen(
+            command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            bufsize=2**20,
+        )
+        errors = []
+        feeder = threading.Thread(
+            target=self.__feed, args=(head, fileobj, process.stdin, errors), daemon=True
+        )
+        feeder.start()
+        try:
+            with tarfile.open(fileobj=process.stdout, mode="r|") as tar:
+                self.__extract_members(tar, callback)
+        finally:
+            process.stdout.close()
+            feeder.join()
+            process.wait()
+        if errors:
+            raise errors[0]
+        if process.returncode:
+            raise tarfile.ReadError(
+                f"{self.decompressor} failed with return code {process.returncode}"
+            )
+
+        return
+
+    def __extract_members(self, tar, callback) -> None:
+        """Extracts members, writing regular files through the worker pool
+
+        Args:
+            tar (tarfile.TarFile): Tar stream opened in stream mode
+            callback (callable): Receives compressed bytes consumed after each member
+        """
+
+        directories = []
+        pending = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for member in tar:
+                path = os.path.join(self.path, member.name)
+                if self.select and not (
+                    self.select(member.name)
+                    and (not member.islnk() or self.select(member.linkname))
+                ):
+                    # Leaves the payload unread, the stream skips over it
+                    if not member.isdir():
+                        self.skipped_files += 1
+                        self.skipped_bytes += member.size
+
+                    # Its target was passed over earlier in the stream
+                    if member.islnk() and self.select(member.name):
+                        self.missing_links[member.name] = member.linkname
+                elif member.isdir():
+                    os.makedirs(path, exist_ok=True)
+                    directories.append((path, member.mode, member.mtime))
+                elif member.isreg() and not member.issparse() and member.size <= self.budget:
+                    data = tar.extractfile(member).read()
+
+                    # Bounds data queued in memory
+                    while pending and sum(pending.values()) + member.size > self.budget:
+                        self.__wait(pending, FIRST_COMPLETED)
+                    future = pool.submit(
+                        self.__write, path, data, member.mode, member.mtime
+                    )
+                    pending[future] = member.size
+                    self.written += member.size
+                else:
+                    # Hard links need their target written first
+                    if member.islnk():
+                        self.__wait(pending, ALL_COMPLETED)
+                    self.__extract_one(tar, member)
+                    if member.isreg():
+                        self.written += member.size
+
+                # Drops extracted members so memory stays flat
+                tar.members.clear()
+                callback(self.consumed)
+            self.__wait(pending, ALL_COMPLETED)
+
+        # Sets directory modes last so read-only directories can be populated
+        for path, mode, mtime in reversed(directories):
+            os.chmod(path, mode)
+            os.utime(path, (mtime, mtime))
+
+        return
+
+    def __extract_one(self, tar, member) -> None:
+        """Extracts a single member with tarfile
+
+        Args:
+            tar (tarfile.TarFile): Tar stream
+            member (tarfile.TarInfo): Member to extract
+        """
+
+        try:
+            tar.extract(member, self.path, filter="fully_trusted")
+        except TypeError:
+            tar.extract(member, self.path)
+
+        return
+
+    def __read(self, fileobj, size: int) -> bytes:
+        """Reads from the compressed stream and counts consumed bytes
+
+        Args:
+            fileobj (file): Compressed stream
+            size (int): Number of bytes to read
+
+        Returns:
+            bytes: Data read
+        """
+
+        data = fileobj.read(size)
+        self.consumed += len(data)
+
+        return data
+
+    def __feed(self, head: bytes, fileobj, stdin, errors: list) -> None:
+        """Copies the compressed stream into the decompressor
+
+        Args:
+            head (bytes): Bytes already read from the stream
+            fileobj (file): Compressed stream
+            stdin (file): Decompressor standard input
+            errors (list): Receives exceptions raised while reading
+        """
+
+        try:
+            stdin.write(head)
+            while True:
+                chunk = self.__read(fileobj, 2**20)
+                if not chunk:
+                    break
+                stdin.write(chunk)
+        except BrokenPipeError:
+            pass
+        except Exception as e:
+            errors.append(e)
+        finally:
+            try:
+                stdin.close()
+            except BrokenPipeError:
+                pass
+
+        return
+
+    def __find_decompressor(self):
+        """Finds an installed multi-threaded gzip decompressor
+
+        Returns:
+            list: Decompressor command, None if none is installed
+        """
+
+        for command in self.decompressors:
+            if shutil.which(command[0]):
+                return command
+
+        return None
+
+    @staticmethod
+    def __wait(pending: dict, return_when: str) -> None:
+        """Waits for queued writes and re-raises their errors
+
+        Args:
+            pending (dict): Write futures mapped to their payload size
+            return_when (str): concurrent.futures wait condition
+        """
+
+        done, _ = wait(pending, return_when=return_when)
+        for future in done:
+            del pending[future]
+            future.result()
+
+        return
+
+    @staticmethod
+    def __write(path: str, data: bytes, mode: int, mtime: float) -> None:
+        """Creates a file with its contents, mode and modification time
+
+        Args:
+            path (str): File path
+            data (bytes): File contents
+            mode (int): Permission bits
+            mtime (float): Modification time
+        """
+
+        if os.path.lexists(path) and not os.path.isfile(path):
+            os.remove(path)
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        except FileNotFoundError:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as out:
+            out.write(data)
+        os.chmod(path, mode)
+        os.utime(path, (mtime, mtime))
+
+        return
+
+
+class _ChainReader:
+    """File-like reader that replays already read bytes before a stream."""
+
+    def __init__(self, head: bytes, fileobj, owner: StreamExtractor):
+        """Initializes a _ChainReader object
+
+        Args:
+            head (bytes): Bytes already read from the stream
+            fileobj (file): Remaining stream
+            owner (StreamExtractor): Extractor counting consumed bytes
+        """
+
+        self.head = head
+        self.fileobj = fileobj
+        self.owner = owner
+
+    def read(self, size: int = -1) -> bytes:
+        """Reads up to size bytes
+
+        Args:
+            size (int, optional): Number of bytes to read. Defaults to -1.
+
+        Returns:
+            bytes: Data read
+        """
+
+        head, self.head = self.head, b""
+        if size >= 0:
+            size = max(size - len(head), 0)
+        data = self.fileobj.read(size)
+        self.owner.consumed += len(data)
+
+        return head + data
+
+
+class DigestReader:
+    """Reads several streams back to back while computing their SHA-256 digest."""
+
+    def __init__(self, *fileobjs):
+        """Initializes a DigestReader object
+
+        Args:
+            fileobjs (file): Streams read one after another
+        """
+
+        self.fileobjs = list(fileobjs)
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def read(self, size: int = -1) -> bytes:
+        """Reads up to size bytes from the current stream
+
+        Args:
+            size (int, optional): Number of bytes to read. Defaults to -1.
+
+        Returns:
+            bytes: Data read
+        """
+
+        data = b""
+        while self.fileobjs:
+            data = self.fileobjs[0].read(size)
+            if data:
+                break
+            self.fileobjs.pop(0)
+        self.sha256.update(data)
+        self.size += len(data)
+
+        return data
+
+    def hexdigest(self) -> str:
+        """Gets the digest of all data read so far
+
+        Returns:
+            str: Hexadecimal SHA-256 digest
+        """
+
+        return self.sha256.hexdigest()
+
+
+class HttpStream:
+    """Readable HTTP response body that resumes with range requests on failure.
+
+    Bytes read can optionally be teed to a file so a streamed download is
+    also kept on disk for later reuse.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        tee: str = None,
+        start: int = 0,
+        retries: int = 5,
+        timeout: float = 60,
+    ):
+        """Initializes a HttpStream object and opens the connection
+
+        Args:
+            url (str): URL to stream
+            tee (str, optional): File receiving a copy of the body. Defaults to None.
+            start (int, optional): Byte offset to start from, appended to tee. Defaults to 0.
+            retries (int, optional): Reconnection attempts after a failure. Defaults to 5.
+            timeout (float, optional): Socket timeout in seconds. Defaults to 60.
+        """
+
+        self.url = url
+        self.retries = retries
+        self.timeout = timeout
+        self.position = start
+        self.response = self.__open()
+        length = self.response.headers.get("Content-Length")
+        self.length = int(length) + start if length else None
+        self.tee = open(tee, "ab" if start else "wb") if tee else None
+
+    def read(self, size: int = -1) -> bytes:
+        """Reads up to size bytes, reconnecting where the last read stopped
+
+        Args:
+            size (int, optional): Number of bytes to read. Defaults to -1.
+
+        Returns:
+            bytes: Data read
+        """
+
+        attempt = 0
+        while True:
+            try:
+                data = self.response.read(size)
+                if not data and self.length and self.position < self.length:
+                    raise http.client.IncompleteRead(b"", self.length - self.position)
+                break
+            except (OSError, http.client.HTTPException) as e:
+                attempt += 1
+                if attempt > self.retries:
+                    raise
+                time.sleep(min(2**attempt, 30))
+                self.response.close()
+                try:
+                    self.response = self.__open()
+                except (OSError, http.client.HTTPException):
+                    continue
+        self.position += len(data)
+        if self.tee:
+            self.tee.write(data)
+
+        return data
+
+    def close(self) -> None:
+        """Closes the connection and the tee file"""
+
+        self.response.close()
+        if self.tee:
+            self.tee.close()
+
+        return
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def __open(self):
+        """Opens the URL from the current position
+
+        Returns:
+            http.client.HTTPResponse: Response positioned at self.position
+        """
+
+        request = urllib.request.Request(self.url)
+        if self.position:
+            request.add_header("Range", f"bytes={self.position}-")
+        response = urllib.request.urlopen(request, timeout=self.timeout)
+        if self.position and response.status != 206:
+            response.close()
+            raise http.client.HTTPException(
+                f"{self.url} does not support resuming downloads"
+            )
+
+        return response
+
+
+class ChunkedLog:
+    """Append-only log written as independently compressed gzip members.
+
+    Output is buffered and compressed a chunk at a time, always ending on a
+    line break. A flush writes the complete lines buffered for longer than
+    interval seconds as a short chunk, so the log on disk stays close behind
+    a command that is killed. Concatenated members are a valid gzip file, so the log still
+    reads with zcat. An index next to the log records the offset, length and
+    first line of every chunk, where each command's output starts and where
+    make first entered each directory, so a reader can start at any of them.
+    """
+
+    entering = re.compile(rb"Entering directory [`'](.*?)'")
+    interval = 2.0
+
+    def __init__(self, path: str, command: str = None, chunk_size: int = 2**20):
+        """Initializes a ChunkedLog object, appending to an existing log
+
+        Args:
+            path (str): Log file path
+            command (str, optional): Command whose output starts here. Defaults to None.
+            chunk_size (int, optional): Uncompressed bytes per chunk. Defaults to 1 MiB.
+        """
+
+        self.path = path
+        self.index_file = f"{path}.idx"
+        self.chunk_size = chunk_size
+        self.index = self.read_index(path)
+        chunks = self.index["chunks"]
+        self.lines = chunks[-1][2] + chunks[-1][3] if chunks else 0
+        self.closed = False
+        self.__buffer = bytearray()
+        self.__written = time.monotonic()
+        self.__file = open(path, "ab")
+        self.index["sections"].append(
+            {
+                "phase": PhaseOutput.phase.get(),
+                "command": command,
+                "chunk": len(chunks),
+                "line": self.lines,
+            }
+        )
+
+    def write(self, data: bytes) -> int:
+        """Buffers data and writes out every complete chunk
+
+        Args:
+            data (bytes): Output to log
+
+        Returns:
+            int: Number of bytes written
+        """
+
+        self.__buffer += data
+        while len(self.__buffer) >= self.chunk_size:
+            cut = self.__buffer.rfind(b"\n", 0, self.chunk_size) + 1 or len(self.__buffer)
+            self.__write_chunk(bytes(self.__buffer[:cut]))
+            del self.__buffer[:cut]
+
+        return len(data)
+
+    def flush(self) -> None:
+        """Writes the buffered complete lines once the last chunk is interval seconds old"""
+
+        if time.monotonic() - self.__written < self.interval:
+            return
+        cut = self.__buffer.rfind(b"\n") + 1
+        if cut:
+            self.__write_chunk(bytes(self.__buffer[:cut]))
+            del self.__buffer[:cut]
+
+        return
+
+    def close(self) -> None:
+        """Writes the last partial chunk and the index"""
+
+        if self.closed:
+            return
+        if self.__buffer:
+            self.__write_chunk(bytes(self.__buffer))
+            self.__buffer.clear()
+        self.__save_index()
+        self.__file.close()
+        self.closed = True
+
+        return
+
+    @staticmethod
+    def read_index(path: str) -> dict:
+        """Reads the index of a log
+
+        Args:
+            path (str): Log file path
+
+        Returns:
+            dict: Chunks, sections and directories, empty lists and mapping if there is no index
+        """
+
+        try:
+            with open(f"{path}.idx", "r", encoding="utf-8") as fl:
+                return json.load(fl)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {"chunks": [], "sections": [], "directories": {}}
+
+    @classmethod
+    def chunks(cls, path: str, start: int = 0):
+        """Decompresses the chunks of a log one at a time
+
+        Args:
+            path (str): Log file path
+            start (int, optional): Index of the first chunk read. Defaults to 0.
+
+        Yields:
+            tuple: Number of the chunk's first line and its decompressed data
+        """
+
+        with open(path, "rb") as fl:
+            for offset, length, first, _ in cls.read_index(path)["chunks"][start:]:
+                fl.seek(offset)
+                yield first, gzip.decompress(fl.read(length))
+
+        return
+
+    def __write_chunk(self, data: bytes) -> None:
+        """Compresses and appends one chunk and indexes it
+
+        Args:
+            data (bytes): Uncompressed chunk ending on a line break
+        """
+
+        compressed = gzip.compress(data, compresslevel=6, mtime=0)
+        offset = self.__file.tell()
+        self.__file.write(compressed)
+        self.__file.flush()
+
+        chunk = len(self.index["chunks"])
+        directories = self.index["directories"]
+        for match in self.entering.finditer(data):
+            directory = match.group(1).decode(errors="replace")
+            if directory not in directories:
+                line = self.lines + data.count(b"\n", 0, match.start())
+                directories[directory] = [chunk, line]
+        count = data.count(b"\n")
+        self.index["chunks"].append([offset, len(compressed), self.lines, count])
+        self.lines += count
+        self.__written = time.monotonic()
+        self.__save_index()
+
+        return
+
+    def __save_index(self) -> None:
+        """Atomically writes the index"""
+
+        with open(f"{self.index_file}.tmp", "w", encoding="utf-8") as fl:
+            json.dump(self.index, fl)
+        os.replace(f"{self.index_file}.tmp", self.index_file)
+
+        return
+
+
+class Supervisor:
+    """Runs commands and reacts to their output and exit as they happen.
+
+    Each command runs in its own process group. Its output pipes, and on
+    Linux a pidfd for the process itself, are registered with a selector, so
+    output is copied to the log files and counted the moment it arrives and an
+    exit is seen without polling. Each command is reaped with wait4, which
+    keeps the resource usage of that command and its descendants apart from
+    the installer's other work. Timeouts and interrupts stop the whole
+    process group, escalating to SIGKILL after a grace period.
+    """
+
+    active = set()
+
+    def __init__(self, timeout: float = None, grace: float = 10.0):
+        """Initializes a Supervisor object
+
+        Args:
+            timeout (float, optional): Seconds before the commands are stopped, None waits forever. Defaults to None.
+            grace (float, optional): Seconds a stopped command gets to exit before it is killed. Defaults to 10.0.
+        """
+
+        self.timeout = timeout
+        self.grace = grace
+        self.processes = {}
+        self.lines = {}
+        self.usage = {}
+        self.timed_out = False
+        self.__groups = {}
+        self.__parsers = {}
+        self.__pidfds = 0
+        self.__selector = selectors.DefaultSelector()
+
+    def start(
+        self,
+        key,
+        args,
+        output_file: str = None,
+        error_file: str = None,
+        on_output=None,
+        **kwargs,
+    ) -> subprocess.Popen:
+        """Starts a command
+
+        Output streams passed in kwargs are left alone, and a command whose
+        stdout is passed through stays in the installer's process group so
+        it can still read from the terminal. So does a sudo command, which may
+        prompt for a password on the terminal once its credentials expire. Logs ending in .gz are written
+        as a ChunkedLog, and stdout and stderr share one log when both paths
+        are the same, as with 2>&1.
+
+        Args:
+            key (hashable): Name the command is reported under
+            args (list): Command and arguments
+            output_file (str, optional): Log file receiving stdout. Defaults to None.
+            error_file (str, optional): Log file receiving stderr. Defaults to None.
+            on_output (callable, optional): Receives logged stdout data as it arrives. Defaults to None.
+
+        Returns:
+            subprocess.Popen: Started process
+        """
+
+        kwargs.pop("text", None)
+        logs, opened = {}, {}
+        for name, path in (("stdout", output_file), ("stderr", error_file)):
+            if path and name not in kwargs:
+                kwargs[name] = subprocess.PIPE
+                if path not in opened:
+                    opened[path] = (
+                        ChunkedLog(path, " ".join(str(arg) for arg in args))
+                        if path.endswith(".gz")
+                        else open(path, "ab")
+                    )
+                logs[name] = opened[path]
+        group = "stdout" in logs and os.path.basename(str(args[0])) != "sudo"
+        if group and sys.version_info >= (3, 11):
+            kwargs["process_group"] = 0
+        elif group:
+            kwargs["preexec_fn"] = os.setpgrp
+        process = subprocess.Popen(args, **kwargs)
+
+        for name, log in logs.items():
+            pipe = getattr(process, name)
+            os.set_blocking(pipe.fileno(), False)
+            self.__selector.register(pipe, selectors.EVENT_READ, (key, name, log))
+        try:
+            pidfd = os.pidfd_open(process.pid)
+            self.__selector.register(pidfd, selectors.EVENT_READ, (key, None, None))
+            self.__pidfds += 1
+        except (AttributeError, OSError):
+            pass
+        self.processes[key] = process
+        self.lines[key] = 0
+        self.__groups[key] = group
+        self.__parsers[key] = on_output
+        Supervisor.active.add(self)
+
+        return process
+
+    def wait(self, callback=None, interval: float = None) -> dict:
+        """Waits for all commands to exit, stopping them on timeout or interrupt
+
+        Args:
+            callback (callable, optional): Called after output, exits and interval ticks. Defaults to None.
+            interval (float, optional): Seconds between callbacks without events, None for events only. Defaults to None.
+
+        Returns:
+            dict: Return codes by command key
+        """
+
+        callback = callback or (lambda: None)
+        deadline = self.timeout and time.monotonic() + self.timeout
+        try:
+            while self.__running():
+                timeout = interval
+                if deadline:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.timed_out = True
+                        self.cancel(signal.SIGTERM)
+                        break
+                    timeout = min(timeout or remaining, remaining)
+
+                # Catches exits promptly where pidfds are not available
+                if not self.__pidfds:
+                    timeout = min(timeout or 0.5, 0.5)
+
+                # Wakes up to write logged output held back by a quiet command
+                timeout = min(timeout or ChunkedLog.interval, ChunkedLog.interval)
+                for selector_key, _ in self.__selector.select(timeout):
+                    self.__handle(selector_key)
+                for selector_key in list(self.__selector.get_map().values()):
+                    if selector_key.data[1]:
+                        selector_key.data[2].flush()
+                callback()
+        except KeyboardInterrupt:
+            self.cancel()
+            raise
+        finally:
+            self.close()
+        callback()
+
+        return {key: process.returncode for key, process in self.processes.items()}
+
+    def cancel(self, sig: int = signal.SIGINT) -> None:
+        """Signals every running command and kills those still running after the grace period
+
+        Args:
+            sig (int, optional): Signal sent first. Defaults to SIGINT.
+        """
+
+        for key in self.processes:
+            self.__signal(key, sig)
+        deadline = time.monotonic() + self.grace
+        for key, process in self.processes.items():
+            while not self.__reap(key) and time.monotonic() < deadline:
+                time.sleep(0.1)
+            if process.returncode is None:
+                self.__signal(key, signal.SIGKILL)
+                self.__reap(key, block=True)
+
+            # Kills group members left behind, such as jobs ignoring SIGINT
+            if self.__groups[key]:
+                try:
+                    os.killpg(process.pid, signal.SIGKILL)
+                except (ProcessLookupError, PermissionError):
+                    pass
+
+        return
+
+    @classmethod
+    def cancel_all(cls, sig: int = signal.SIGINT) -> None:
+        """Stops the commands of every supervisor that is still waiting
+
+        Args:
+            sig (int, optional): Signal sent first. Defaults to SIGINT.
+        """
+
+        for supervisor in list(cls.active):
+            supervisor.cancel(sig)
+
+        return
+
+    def close(self) -> None:
+        """Copies remaining buffered output and releases pipes and pidfds"""
+
+        Supervisor.active.discard(self)
+        for selector_key in list(self.__selector.get_map().values()):
+            if selector_key.data[1]:
+                try:
+                    while self.__handle(selector_key):
+                        pass
+                except BlockingIOError:
+                    pass
+            if selector_key.fd in self.__selector.get_map():
+                self.__unregister(selector_key)
+
+        return
+
+    def __running(self) -> bool:
+        """Checks whether any command has not exited
+
+        Returns:
+            bool: True while a command is running
+        """
+
+        return not all([self.__reap(key) for key in self.processes])
+
+    def __reap(self, key, block: bool = False) -> bool:
+        """Collects the exit status and resource usage of a command once it has exited
+
+        Args:
+            key (hashable): Command key
+            block (bool, optional): Waits for the command to exit. Defaults to False.
+
+        Returns:
+            bool: True if the command has exited
+        """
+
+        process = self.processes[key]
+        if process.returncode is not None:
+            return True
+        try:
+            pid, status, usage = os.wait4(process.pid, 0 if block else os.WNOHANG)
+        except ChildProcessError:
+            return process.poll() is not None
+        if not pid:
+            return False
+        process.returncode = (
+            -os.WTERMSIG(status) if os.WIFSIGNALED(status) else os.WEXITSTATUS(status)
+        )
+        self.usage[key] = usage
+
+        return True
+
+    def __handle(self, selector_key) -> bool:
+        """Handles a readable pipe or pidfd
+
+        Args:
+            selector_key (selectors.SelectorKey): Ready registration
+
+        Returns:
+            bool: True if output was copied
+        """
+
+        key, name, log = selector_key.data
+        if name is None:
+            self.__unregister(selector_key)
+            self.__reap(key, block=True)
+            return False
+
+        data = os.read(selector_key.fd, 2**16)
+        if not data:
+            self.__unregister(selector_key)
+            return False
+        log.write(data)
+        log.flush()
+        if name == "stdout":
+            self.lines[key] += data.count(b"\n")
+            if self.__parsers[key]:
+                self.__parsers[key](data)
+
+        return True
+
+    def __unregister(self, selector_key) -> None:
+        """Stops watching a pipe or pidfd and closes it
+
+        Args:
+            selector_key (selectors.SelectorKey): Registration to remove
+        """
+
+        self.__selector.unregister(selector_key.fileobj)
+        _, name, log = selector_key.data
+        if name:
+            selector_key.fileobj.close()
+            # Closes a log shared by stdout and stderr after both pipes
+            if not any(
+                other.data[2] is log for other in self.__selector.get_map().values()
+            ):
+                log.close()
+        else:
+            os.close(selector_key.fd)
+            self.__pidfds -= 1
+
+        return
+
+    def __signal(self, key, sig: int) -> None:
+        """Sends a signal to a command and, when it has one, its process group
+
+        Args:
+            key (hashable): Command key
+            sig (int): Signal number
+        """
+
+        process = self.processes[key]
+        if self.__reap(key):
+            return
+        try:
+            if self.__groups[key]:
+                os.killpg(process.pid, sig)
+            else:
+                process.send_signal(sig)
+        except ProcessLookupError:
+            pass
+
+        return
+
+
+class PhaseOutput:
+    """Keeps the terminal output of concurrently running phases apart.
+
+    While installed, sys.stdout and sys.stderr attribute each write to the
+    phase running in the current context. Only the phase that owns the
+    terminal writes to it. The output of the others is held, with progress
+    bar redraws collapsed to their last state, until they take over. Every
+    phase's output is also copied line by line to its own log file.
+    """
+
+    phase = contextvars.ContextVar("phase", default=None)
+
+    def __init__(self, directory: str):
+        """Initializes a PhaseOutput object
+
+        Args:
+            directory (str): Directory receiving the phase-<name>.log files
+        """
+
+        self.directory = directory
+        self.owner = None
+        self.__held = {}
+        self.__partial = {}
+        self.__logs = {}
+        self.__streams = None
+        self.__lock = threading.RLock()
+
+    def install(self) -> None:
+        """Replaces sys.stdout and sys.stderr with phase aware streams"""
+
+        self.__streams = (sys.stdout, sys.stderr)
+        sys.stdout = _PhaseStream(self, sys.stdout)
+        sys.stderr = _PhaseStream(self, sys.stderr)
+
+        return
+
+    def uninstall(self) -> None:
+        """Restores sys.stdout and sys.stderr and writes out held output"""
+
+        with self.__lock:
+            for name in list(self.__held):
+                self.__flush(name)
+            sys.stdout, sys.stderr = self.__streams
+            for log in self.__logs.values():
+                log.close()
+            self.__logs = {}
+
+        return
+
+    def claim(self, name: str) -> None:
+        """Gives the terminal to a phase if no other phase owns it
+
+        Args:
+            name (str): Phase name
+        """
+
+        with self.__lock:
+            if self.owner is None:
+                self.owner = name
+
+        return
+
+    def release(self, name: str, running: list) -> None:
+        """Hands the terminal on when the phase owning it finishes
+
+        Output held by phases that have finished is written first, then the
+        first of the running phases becomes the owner.
+
+        Args:
+            name (str): Finished phase name
+            running (list): Names of the phases still running, in phase order
+        """
+
+        with self.__lock:
+            if name != self.owner:
+                return
+            for held in list(self.__held):
+                if held not in running:
+                    self.__flush(held)
+            self.owner = running[0] if running else None
+            if self.owner:
+                self.__flush(self.owner)
+
+        return
+
+    def write(self, stream, text: str) -> int:
+        """Writes to the terminal or holds the text, and logs it by phase
+
+        Args:
+            stream (file): Terminal stream written to
+            text (str): Text to write
+
+        Returns:
+            int: Number of characters written
+        """
+
+        name = self.phase.get()
+        with self.__lock:
+            if name is None or self.owner in (None, name):
+                stream.write(text)
+            else:
+                held = self.__held.setdefault(name, [])
+                if held and held[-1][0] is stream:
+                    held[-1][1] = self.__collapse(held[-1][1] + text)
+                else:
+                    held.append([stream, self.__collapse(text)])
+            if name is not None:
+                self.__log(name, text)
+
+        return len(text)
+
+    def __flush(self, name: str) -> None:
+        """Writes the output held for a phase
+
+        Args:
+            name (str): Phase name
+        """
+
+        for stream, text in self.__held.pop(name, []):
+            stream.write(text)
+            stream.flush()
+
+        return
+
+    def __log(self, name: str, text: str) -> None:
+        """Appends the completed lines of a phase to its log
+
+        Args:
+            name (str): Phase name
+            text (str): Text written by the phase
+        """
+
+        lines = (self.__partial.get(name, "") + text).split("\n")
+        self.__partial[name] = lines.pop()
+        if not lines:
+            return
+        if name not in self.__logs:
+            self.__logs[name] = open(
+                os.path.join(self.directory, f"phase-{name}.log"), "a", encoding="utf-8"
+            )
+        log = self.__logs[name]
+        for line in lines:
+            log.write(line.split("\r")[-1] + "\n")
+        log.flush()
+
+        return
+
+    @staticmethod
+    def __collapse(text: str) -> str:
+        """Drops the parts of each line that a carriage return overwrites
+
+        Args:
+            text (str): Held text
+
+        Returns:
+            str: Text as it would look on the terminal
+        """
+
+        lines = []
+        for line in text.split("\n"):
+            parts = [part for part in line.split("\r") if part]
+            lines.append(f"\r{parts[-1]}" if "\r" in line and parts else line)
+
+        return "\n".join(lines)
+
+
+class _PhaseStream:
+    """Terminal stream wrapper routing writes through a PhaseOutput"""
+
+    def __init__(self, output: PhaseOutput, stream):
+        """Initializes a _PhaseStream object
+
+        Args:
+            output (PhaseOutput): Output router
+            stream (file): Wrapped terminal stream
+        """
+
+        self.output = output
+        self.stream = stream
+
+    def write(self, text: str) -> int:
+        """Writes text through the router
+
+        Args:
+            text (str): Text to write
+
+        Returns:
+            int: Number of characters written
+        """
+
+        return self.output.write(self.stream, text)
+
+    def flush(self) -> None:
+        """Flushes the wrapped stream"""
+
+        self.stream.flush()
+
+        return
+
+    def __getattr__(self, name: str):
+        return getattr(self.stream, name)
+
+
+class SegmentedDownloader:
+    """Downloads a file over several keep-alive HTTP connections.
+
+    The file is split into fixed-size segments fetched with range requests by
+    a pool of worker threads, each reusing one persistent connection. Segment
+    progress is saved next to the file so an interrupted download resumes
+    where every segment stopped. Servers without range support are read as a
+    single stream.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        path: str,
+        connections: int = 16,
+        segment_size: int = 8 * 2**20,
+        retries: int = 5,
+        timeout: float = 60,
+    ):
+        """Initializes a SegmentedDownloader object
+
+        Args:
+            url (str): URL to download
+            path (str): Destination file path
+            connections (int, optional): Number of parallel connections. Defaults to 16.
+            segment_size (int, optional): Bytes requested per range request. Defaults to 8 MiB.
+            retries (int, optional): Reconnection attempts per segment. Defaults to 5.
+            timeout (float, optional): Socket timeout in seconds. Defaults to 60.
+        """
+
+        self.url = url
+        self.path = path
+        self.state_file = f"{path}.segments"
+        self.connections = max(1, connections)
+        self.segment_size = segment_size
+        self.retries = retries
+        self.timeout = timeout
+        self.size = None
+        self.done = 0
+        self.__segments = []
+        self.__pending = []
+        self.__errors = []
+        self.__lock = threading.Lock()
+        self.__callback = None
+
+    def download(self, callback=None) -> int:
+        """Downloads the file
+
+        Args:
+            callback (callable, optional): Receives (bytes done, total bytes) on every write. Defaults to None.
+
+        Returns:
+            int: Size of the downloaded file in bytes
+        """
+
+        self.__callback = callback or (lambda done, total: None)
+        final_url, ranges = self.__probe()
+        if not ranges:
+            return self.__download_stream(final_url)
+
+        self.__load_state()
+        self.__pending = [segment for segment in self.__segments if not self.__finished(segment)]
+        self.__callback(self.done, self.size)
+
+        # Fetches segments in parallel, saving progress once a second
+        mode = os.O_WRONLY | os.O_CREAT
+        fd = os.open(self.path, mode, 0o644)
+        try:
+            os.ftruncate(fd, self.size)
+            workers = [
+                threading.Thread(
+                    target=contextvars.copy_context().run,
+                    args=(self.__worker, final_url, fd),
+                    daemon=True,
+                )
+                for _ in range(min(self.connections, len(self.__pending)))
+            ]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                while worker.is_alive():
+                    worker.join(1)
+                    self.__save_state()
+        finally:
+            os.close(fd)
+            self.__save_state()
+
+        if self.__errors:
+            raise self.__errors[0]
+        os.remove(self.state_file)
+
+        return self.size
+
+    def __probe(self) -> tuple:
+        """Resolves redirects and checks for range request support
+
+        Returns:
+            tuple: (final URL, True if the server honours range requests)
+        """
+
+        request = urllib.request.Request(self.url, headers={"Range": "bytes=0-0"})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            total = response.headers.get("Content-Range", "").rpartition("/")[2]
+            if response.status == 206 and total.isdigit():
+                self.size = int(total)
+                return response.geturl(), True
+            length = response.headers.get("Content-Length")
+            self.size = int(length) if length else None
+
+            return response.geturl(), False
+
+    def __download_stream(self, url: str) -> int:
+        """Downloads the file over a single connection
+
+        Args:
+            url (str): URL to download
+
+        Returns:
+            int: Size of the downloaded file in bytes
+        """
+
+        with HttpStream(url, tee=self.path, retries=self.retries, timeout=self.timeout) as stream:
+            while True:
+                data = stream.read(2**20)
+                if not data:
+                    break
+                self.done += len(data)
+                self.__callback(self.done, self.size)
+
+        return self.done
+
+    def __worker(self, url: str, fd: int) -> None:
+        """Fetches pending segments over one persistent connection
+
+        Args:
+            url (str): URL to download
+            fd (int): Destination file descriptor
+        """
+
+        parts = urllib.parse.urlsplit(url)
+        target = f"{parts.path or '/'}{'?' + parts.query if parts.query else ''}"
+        connection = None
+        while not self.__errors:
+            with self.__lock:
+                if not self.__pending:
+                    break
+                segment = self.__pending.pop(0)
+
+            # Retries the remainder of the segment on a fresh connection
+            attempt = 0
+            while not self.__finished(segment):
+                try:
+                    if connection is None:
+                        connection = self.__connect(parts)
+                    self.__fetch(connection, target, segment, fd)
+                except (OSError, http.client.HTTPException) as e:
+                    if connection is not None:
+                        connection.close()
+                    connection = None
+                    attempt += 1
+                    if attempt > self.retries:
+                        self.__errors.append(e)
+                        break
+                    time.sleep(min(2**attempt, 30))
+        if connection is not None:
+            connection.close()
+
+        return
+
+    def __fetch(self, connection, target: str, segment: list, fd: int) -> None:
+        """Requests the rest of a segment and writes it in place
+
+        Args:
+            connection (http.client.HTTPConnection): Open connection
+            target (str): Request target
+            segment (list): [start, end, bytes done] of the segment
+            fd (int): Destination file descriptor
+        """
+
+        start, end, _ = segment
+        connection.request(
+            "GET", target, headers={"Range": f"bytes={start + segment[2]}-{end}"}
+        )
+        response = connection.getresponse()
+        if response.status != 206:
+            # A full 200 reply would stream the whole file, so the connection
+            # is dropped rather than drained
+            connection.close()
+            raise http.client.HTTPException(f"Unexpected HTTP status {response.status}")
+
+        # Reads the response to its end so the connection can be reused
+        while not self.__finished(segment):
+            data = response.read(min(2**20, end - start + 1 - segment[2]))
+            if not data:
+                raise http.client.IncompleteRead(b"")
+            os.pwrite(fd, data, start + segment[2])
+            with self.__lock:
+                segment[2] += len(data)
+                self.done += len(data)
+                self.__callback(self.done, self.size)
+        response.read()
+
+        return
+
+    def __connect(self, parts):
+        """Opens a keep-alive connection to the server
+
+        Args:
+            parts (urllib.parse.SplitResult): Parsed URL
+
+        Returns:
+            http.client.HTTPConnection: Connection
+        """
+
+        if parts.scheme == "https":
+            return http.client.HTTPSConnection(
+                parts.hostname, parts.port, timeout=self.timeout
+            )
+
+        return http.client.HTTPConnection(parts.hostname, parts.port, timeout=self.timeout)
+
+    def __load_state(self) -> None:
+        """Loads saved segment progress or splits the file into new segments"""
+
+        try:
+            with open(self.state_file, "r", encoding="utf-8") as fl:
+                state = json.load(fl)
+            if state["size"] == self.size and os.path.getsize(self.path) == self.size:
+                self.__segments = state["segments"]
+                self.done = sum(segment[2] for segment in self.__segments)
+                return
+        except (OSError, ValueError, KeyError):
+            pass
+
+        self.__segments = [
+            [start, min(start + self.segment_size, self.size) - 1, 0]
+            for start in range(0, self.size, self.segment_size)
+        ]
+        self.done = 0
+
+        return
+
+    def __save_state(self) -> None:
+        """Saves segment progress for resuming"""
+
+        with self.__lock:
+            state = {"url": self.url, "size": self.size, "segments": self.__segments}
+            with open(f"{self.state_file}.tmp", "w", encoding="utf-8") as fl:
+                json.dump(state, fl)
+        os.replace(f"{self.state_file}.tmp", self.state_file)
+
+        return
+
+    @staticmethod
+    def __finished(segment: list) -> bool:
+        """Checks if a segment is complete
+
+        Args:
+            segment (list): [start, end, bytes done] of the segment
+
+        Returns:
+            bool: True if every byte of the segment was written
+        """
+
+        return segment[2] >= segment[1] - segment[0] + 1
+
+
+class ResourceMeter:
+    """Measures wall time, CPU time, peak RSS and block I/O of the installer and its children.
+
+    CPU time and I/O are taken from getrusage deltas of the installer and of
+    its reaped children. Peak RSS is the largest summed resident size of the
+    installer's process tree, sampled from /proc by a background thread where
+    available, and the rusage high-water mark elsewhere. A single command is
+    measured from the rusage wait4 returned for it instead, see command_usage.
+    """
+
+    def __init__(self, sample: bool = True, interval: float = 1.0):
+        """Initializes a ResourceMeter object
+
+        Args:
+            sample (bool, optional): Samples process tree RSS. Defaults to True.
+            interval (float, optional): Seconds between RSS samples. Defaults to 1.0.
+        """
+
+        self.sample = sample and os.path.isdir("/proc/self")
+        self.interval = interval
+        self.peak_rss = 0
+        self.__start = None
+        self.__usage = None
+        self.__stop = threading.Event()
+        self.__thread = None
+
+    def start(self):
+        """Takes the starting measurements
+
+        Returns:
+            ResourceMeter: self
+        """
+
+        self.__start = time.monotonic()
+        self.__usage = self.__rusage()
+        if self.sample:
+            self.__thread = threading.Thread(target=self.__sampler, daemon=True)
+            self.__thread.start()
+
+        return self
+
+    def stop(self) -> dict:
+        """Takes the final measurements
+
+        Returns:
+            dict: Wall and CPU seconds, peak RSS and bytes read and written
+        """
+
+        wall = time.monotonic() - self.__start
+        if self.__thread:
+            self.__stop.set()
+            self.__thread.join()
+        usage = [end - start for start, end in zip(self.__usage, self.__rusage())]
+        if not self.sample:
+            self.peak_rss = self.__maxrss()
+
+        return {
+            "wall": round(wall, 3),
+            "user_cpu": round(usage[0], 3),
+            "system_cpu": round(usage[1], 3),
+            "peak_rss": self.peak_rss,
+            "read_bytes": int(usage[2]) * 512,
+            "write_bytes": int(usage[3]) * 512,
+        }
+
+    def __sampler(self) -> None:
+        """Records the largest process tree RSS until stopped"""
+
+        while True:
+            self.peak_rss = max(self.peak_rss, self.__tree_rss())
+            if self.__stop.wait(self.interval):
+                break
+
+        return
+
+    @staticmethod
+    def __tree_rss() -> int:
+        """Sums the resident size of the installer and all its descendants
+
+        Returns:
+            int: Resident size in bytes
+        """
+
+        parents, rss = {}, {}
+        for entry in os.listdir("/proc"):
+            if not entry.isdigit():
+                continue
+            try:
+                with open(f"/proc/{entry}/stat", "rb") as fl:
+                    data = fl.read()
+            except OSError:
+                continue
+            fields = data[data.rfind(b")") + 2 :].split()
+            parents[int(entry)] = int(fields[1])
+            rss[int(entry)] = int(fields[21])
+
+        # Walks each process up its ancestry looking for the installer
+        root, tree = os.getpid(), 0
+        for pid in rss:
+            ancestor = pid
+            while ancestor not in (root, 0, 1) and ancestor in parents:
+                ancestor = parents[ancestor]
+            if ancestor == root:
+                tree += rss[pid]
+
+        return tree * os.sysconf("SC_PAGE_SIZE")
+
+    @staticmethod
+    def __rusage() -> list:
+        """Sums resource usage of the installer and its reaped children
+
+        Returns:
+            list: User seconds, system seconds, blocks read, blocks written
+        """
+
+        own = resource.getrusage(resource.RUSAGE_SELF)
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+        return [
+            own.ru_utime + children.ru_utime,
+            own.ru_stime + children.ru_stime,
+            own.ru_inblock + children.ru_inblock,
+            own.ru_oublock + children.ru_oublock,
+        ]
+
+    @staticmethod
+    def command_usage(usage) -> dict:
+        """Converts the rusage of one reaped command into measurements
+
+        On Linux the peak RSS also counts the installer memory the command
+        was forked from before it started its program.
+
+        Args:
+            usage (resource.struct_rusage): Usage returned by wait4, None if unknown
+
+        Returns:
+            dict: CPU seconds, peak RSS and bytes read and written
+        """
+
+        if usage is None:
+            return {
+                "user_cpu": 0.0,
+                "system_cpu": 0.0,
+                "peak_rss": 0,
+                "read_bytes": 0,
+                "write_bytes": 0,
+            }
+        peak = usage.ru_maxrss if sys.platform == "darwin" else usage.ru_maxrss * 1024
+
+        return {
+            "user_cpu": round(usage.ru_utime, 3),
+            "system_cpu": round(usage.ru_stime, 3),
+            "peak_rss": peak,
+            "read_bytes": usage.ru_inblock * 512,
+            "write_bytes": usage.ru_oublock * 512,
+        }
+
+    @staticmethod
+    def __maxrss() -> int:
+        """Gets the rusage RSS high-water mark of the installer and its children
+
+        Returns:
+            int: Resident size in bytes
+        """
+
+        peak = max(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+        )
+
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
 class Heainstall:
-    def __init__(self):
+    # Compiler, linker and make messages reported as the cause of a failed build
+    errors = re.compile(
+        rb"\berror:|\bError:|undefined reference to|collect2: error|ld: cannot find|"
+        rb"ld returned \d+ exit status|No rule to make target|\*\*\* \[.*\] Error \d+|"
+        rb"command not found"
+    )
+
+    def __init__(self, args: argparse.Namespace = None):
         """Initializes a HeaInstaller object with system and configuration details.
 
-        Attributes:
-            platform (str): The name of the operating system.
-            version (str): The version of the operating system.
-            architecture (str): The machine architecture.
-            script_dir (str): Directory from which heainstaller.py is run.
-            set_flags (list): Flags to be set during installation.
-            unset_flags (list): Flags to be unset during installation.
-            positive (list): Supported positive responses from the user.
-            negative (list): Supported negative responses from the user.
-            def_shell (str): The default shell used by the system.
-            shell_ext (str): The shell extension.
-            shell_config (list): The path to the shell configuration files.
-            shell_env (str): The command to configure the shell environment.
-            shell_alias (str): The alias command for the shell being used.
-            shell_src (str): The command to source a file.
-            initializer (list): The initial command for setting up the environment based on the platform.
-            compilers (list): A list of compilers required for heasoft installation.
-            pm (str): The package manager being used.
-            pm_update (list): The command to update the package manager.
-            pm_upgrade (list): The command to upgrade packages.
-            pm_packages (list): A list of necessary packages.
-            pm_incmd (list): The command to install packages using the package manager.
-            pm_link (str): The link modifier to send system metadata to heasoft server.
-            py_lib (list): The list of Python libraries required for installation.
-            py_incmd (list): The command to install Python libraries using the appropriate manager.
-            url (str): The URL template for downloading HEAsoft source code.
-            home_dir (str): The home directory of the user.
-            hea_dir (str): The directory where HEAsoft will be installed.
-            download (bool): A flag to indicate whether downloading is enabled (default is True).
-            total_size (int): The total size of the file to be downloaded (in bytes).
-            tcl_valid (int): The tclreadline installed flag.
-            hea_file (str): The name of the HEAsoft tarball file to be downloaded."""
+        Args:
+            args (argparse.Namespace, optional): Command line options. Defaults to None.
+
+        Attributes:
+            platform (str): The name of the operating system.
+            version (str): The version of the operating system.
+            architecture (str): The machine architecture.
+            script_dir (str): Directory from which heainstaller.py is run.
+            set_flags (list): Flags to be set during installation.
+            unset_flags (list): Flags to be unset during installation.
+            profile_flags (dict): Variables a build profile can set, mapped to the compiler flag deciding their compiler family.
+            cpu_flags (dict): Compiler options tuning for the host CPU by architecture.
+            configure_environment (list): Variables besides compilers and profile flags that configure results depend on.
+            tool_benchmark (dict): Table size, repeat count and commands of the post-install tool benchmark.
+            positive (list): Supported positive responses from the user.
+            negative (list): Supported negative responses from the user.
+            def_shell (str): The default shell used by the system.
+            shell_ext (str): The shell extension.
+            shell_config (list): The path to the shell configuration files.
+            shell_env (str): The command to configure the shell environment.
+            shell_alias (str): The alias command for the shell being used.
+            shell_src (str): The command to source a file.
+            initializer (list): The initial command for setting up the environment based on the platform.
+            compilers (list): A list of compilers required for heasoft installation.
+            profiles (dict): Build profiles of the platform, variables by compiler family.
+            pm (str): The package manager being used.
+            pm_update (list): The command to update the package manager.
+            pm_upgrade (list): The command to upgrade packages.
+            pm_packages (list): A list of necessary packages.
+            pm_incmd (list): The command to install packages using the package manager.
+            pm_link (str): The link modifier to send system metadata to heasoft server.
+            pm_query (dict): The command listing installed packages and the pattern extracting their names.
+            py_lib (list): The list of Python libraries required for installation.
+            py_incmd (list): The command to install Python libraries using the appropriate manager.
+            py_query (dict): The arguments listing installed Python libraries and the pattern extracting their names.
+            url (str): The URL template for downloading HEAsoft source code.
+            home_dir (str): The home directory of the user.
+            hea_dir (str): The directory where HEAsoft will be installed.
+            work_dir (str): The directory the source tree is extracted into and built in, hea_dir or a scratch directory.
+            scratch_file (str): Records the work directory of the last run and whether its source tree was consumed.
+            download (bool): A flag to indicate whether downloading is enabled (default is True).
+            extracted (bool): A flag set when the tarball was extracted while downloading.
+            validators (dict): Size, ETag and Last-Modified of the tarball from the last server response.
+            commands (dict): Resource usage of the subprocesses run by each running phase.
+            concurrent (set): Phases that ran alongside another phase.
+            total_size (int): The total size of the file to be downloaded (in bytes).
+            tcl_valid (int): The tclreadline installed flag.
+            hea_file (str): The name of the HEAsoft tarball file to be downloaded.
+            components (list): The selected HEASoft components.
+            source_dirs (dict): Lowercase source tree directory names mapped to their component.
+            configurations (dict): Build configuration names mapped to the components they build.
+            jobs (int): The maximum number of parallel make jobs.
+            max_load (float): The load average above which make starts no new jobs.
+            memory_per_job (int): The memory reserved for each make job (in bytes).
+            adaptive (bool): A flag to adapt the make job count to memory and load during the build.
+            timeout (float): The time after which a command is stopped (in seconds), None for no limit.
+            pipeline (bool): A flag to extract the tarball while it is being downloaded.
+            keep_tarball (bool): A flag to keep a copy of a pipelined download in the cache directory.
+            downloader (str): The download tool, aria2c or native.
+            connections (int): The number of parallel download connections.
+            cache_dir (str): The XDG cache directory used by the installer.
+            cache_flags (list): Compiler flags wrapped with the compiler cache.
+            ccache (str): The compiler cache executable, None if compiler caching is disabled.
+            ccache_dir (str): The compiler cache directory.
+            ccache_size (str): The compiler cache size limit.
+            hea_version (str): The HEASoft version the download cache is keyed on.
+            selection (str): The key identifying the HEASoft version and component selection.
+            tarball (str): The cache path of the tarball for the selected components.
+            history_file (str): The file recording progress totals and durations of past runs.
+            profile (str): The key identifying the host and build parallelism in the run history.
+            footprint (int): The expected size of the extracted, built and installed source tree (in bytes).
+            preflight (bool): A flag to check for enough free disk space before the run starts.
+            cleanup (bool): A flag to remove the cached tarball after extraction and build intermediates after installation.
+            build_profile (str): The name of the build profile setting compiler and linker flags.
+            build_flags (dict): The variables set by the build profile, empty for HEASoft's own flags.
+            benchmark (bool): A flag to time a few HEASoft tools after installation.
+            configure_cache (bool): A flag to share configure results between runs with the same compilers.
+            config_site (str): The CONFIG_SITE the installer was started with, loaded by its own site file.
+            config_sites (dict): The configure cache site file of each build configuration.
+            last_progress (tuple): The final progress count and duration of the last tracked subprocess.
+            cache_size (float): The maximum size of the tarball cache (in bytes).
+            cache_age (float): The maximum age of unused tarball cache entries (in seconds).
+            update_mode (str): The package update policy, full, metadata or skip.
+            freshness (float): The time after a refresh during which updates are skipped (in seconds).
+            build_logs (dict): Compressed log file names of the configure, compile and install steps."""
+
+        self.args = args or parse_args([])
+
+        # Loads system information
+        self.platform = platform.system().lower()
+        self.version = platform.release()
+        self.architecture = platform.machine()
+        self.script_dir = os.path.dirname(os.path.realpath(__file__))
+
+        # Reads installation configuration files
+        try:
+            with open(
+                os.path.join(self.script_dir, "config.json"), "r", encoding="utf-8"
+            ) as fl:
+                config = json.load(fl)
+        except FileNotFoundError as e:
+            print(f"config.json not found at {os.getcwd()}\nError: {e}")
+
+        # Sets configuration variables
+        if self.platform in config.keys():
+            self.set_flags = config["set_flags"]
+            self.cache_flags = config["cache_flags"]
+            self.unset_flags = config["unset_flags"]
+            self.profile_flags = config["profile_flags"]
+            self.cpu_flags = config["cpu_flags"]
+            self.configure_environment = config["configure_environment"]
+            self.tool_benchmark = config["tool_benchmark"]
+            self.positive = config["positive_resp"]
+            self.negative = config["negative_resp"]
+            pacman_counter = 0
+            shell = os.path.basename(os.environ.get("SHELL", ""))
+
+            # Checks for valid shell and sets shell configuration variables
+            if shell in config["shell"].keys():
+                self.def_shell = shell
+                self.shell_ext = config["shell"][shell]["extension"]
+                self.shell_config = config["shell"][shell]["config_file"]
+                self.shell_env = config["shell"][shell]["env_cmd"]
+                self.shell_alias = config["shell"][shell]["alias"]
+                self.shell_src = config["shell"][shell]["source"]
+            else:
+                print(
+                    "No supported shell found for running heasoft.\n"
+                    f"Supported shells: {config['shell'].keys()}\nHeasoft initialization"
+                    f"lines will not be present in {shell}. Please add them manually to"
+                    "a compatible shell"
+                )
+
+            # Gets necessary dependancy & package manager information
+            ops = config[self.platform]
+            self.compilers = ops["compilers"]
+            self.profiles = ops.get("profiles", {"portable": {}})
+
+            # Checks for valid a package manager
+            for pacman in ops["package_manager"].keys():
+                if shutil.which(pacman):
+                    self.pm = pacman
+                    pacman_counter += 1
+                    break
+            if not pacman_counter:
+                print(
+                    "No supported package managers found\n"
+                    f"Supported package managers: {ops['package-managers']}\nExiting..."
+                )
+                sys.exit()
+
+            # Sets package manager specific commands and dependency variables
+            pm = ops["package_manager"][self.pm]
+            self.initializer = pm.get("initializer")
+            self.pm_update = pm["update"].split()
+            self.pm_upgrade = pm["upgrade"].split()
+            self.pm_packages = pm["packages"]
+            self.pm_incmd = pm["install_cmd"].split()
+            self.pm_link = pm["link"]
+            self.pm_query = pm.get("query")
+
+            # Checks for an active python environment
+            if os.environ.get("CONDA_PREFIX"):
+                py_pm = ops["py_manager"]["conda"]
+            else:
+                py_pm = ops["py_manager"]["pip"]
+
+            # Loads python libraries and installation commands
+            self.py_lib = py_pm["libraries"]
+            self.py_incmd = py_pm["install_cmd"].split()
+            self.py_query = py_pm.get("query")
+        else:
+            print(f"Incompatible OS: {self.platform}\nExiting...")
+            sys.exit()
+
+        # Sets dwonload url
+        url = "https://heasarc.gsfc.nasa.gov/cgi-bin/Tools/tarit/tarit.pl?mode=download&arch=src&src_{}=Y&\
+        src_other_specify="
+        self.url = url.format(self.pm_link)
+
+        # Loads user configuration
+        with open(
+            os.path.join(self.script_dir, "user.json"), "r", encoding="utf-8"
+        ) as fl:
+            u_config = json.load(fl)
+
+        # Sets user configuration
+        self.components = []
+        for param in ("mission", "general", "xanadu", "xstar"):
+            keys = self.__get_keys(u_config[param], "yes")
+            if keys:
+                for key in keys:
+                    self.url += f"&{param}={config[param][key]}"
+                    self.components.append(config[param][key])
+
+        # Maps source tree directories to components
+        self.source_dirs = {}
+        for param in ("mission", "general", "xanadu", "xstar"):
+            for component in config[param].values():
+                for name in [component, *config["source_aliases"].get(component, [])]:
+                    self.source_dirs[name.lower()] = component
+
+        # Sets extra build configurations sharing the extracted source tree
+        self.configurations = u_config.get("configurations", {})
+
+        # Sets build parallelism, command line options take precedence over user.json
+        build = u_config.get("build", {})
+        self.memory_per_job = (
+            self.args.memory_per_job or int(build.get("memory_per_job", 1024))
+        ) * 2**20
+        jobs = str(self.args.jobs or build.get("jobs", "auto"))
+        if jobs == "auto":
+            memory = available_memory()
+            jobs = cpu_count()
+            if memory:
+                jobs = min(jobs, memory // self.memory_per_job)
+        self.jobs = max(1, int(jobs))
+        max_load = str(self.args.max_load or build.get("max_load", "auto"))
+        self.max_load = float(cpu_count() if max_load == "auto" else max_load)
+        self.adaptive = (
+            not self.args.no_adaptive and build.get("adaptive", "yes") == "yes"
+        )
+        timeout = self.args.timeout or float(build.get("timeout", 0))
+        self.timeout = timeout * 60 if timeout else None
+        self.preflight = (
+            not self.args.no_preflight and build.get("preflight", "yes") == "yes"
+        )
+        self.cleanup = self.args.cleanup or build.get("cleanup", "no") == "yes"
+        self.build_profile = self.args.profile or build.get("profile", "portable")
+        self.build_flags = {}
+        if self.build_profile not in self.profiles:
+            print(
+                f"Unknown build profile {self.build_profile}\n"
+                f"Supported build profiles: {', '.join(self.profiles)}\nExiting..."
+            )
+            sys.exit()
+        self.benchmark = (
+            not self.args.no_benchmark and build.get("benchmark", "yes") == "yes"
+        )
+        self.configure_cache = (
+            self.args.configure_cache or build.get("configure_cache", "no") == "yes"
+        )
+        self.config_site = os.environ.get("CONFIG_SITE")
+        self.config_sites = {}
+
+        # Sets download mode
+        download = u_config.get("download", {})
+        self.pipeline = self.args.pipeline or download.get("pipeline", "no") == "yes"
+        self.keep_tarball = (
+            not self.args.no_keep_tarball
+            and download.get("keep_tarball", "yes") == "yes"
+        )
+        self.downloader = self.args.downloader or download.get("downloader", "auto")
+        if self.downloader == "auto":
+            self.downloader = "aria2c" if shutil.which("aria2c") else "native"
+        self.connections = int(self.args.connections or download.get("connections", 16))
+
+        # Sets some other necessary variables
+        self.home_dir = os.path.expandvars("$HOME")
+        self.hea_dir = os.path.join(self.home_dir, ".local", "bin", "heasoft")
+        self.download_dir = os.path.join(self.home_dir, ".cache")
+        self.download = True
+        self.total_size = 4_333_973_837
+        self.hea_file = "heasoft.tar.gz"
+        self.extracted = False
+        self.validators = {}
+        self.commands = {}
+        self.concurrent = set()
+        self.cache_dir = os.path.join(
+            os.environ.get("XDG_CACHE_HOME") or self.download_dir, "heainstaller"
+        )
+
+        # Sets compiler cache, enabled automatically when ccache is installed
+        ccache = u_config.get("ccache", {})
+        enabled = "no" if self.args.no_ccache else ccache.get("enabled", "auto")
+        self.ccache = shutil.which("ccache") if enabled in ("auto", "yes") else None
+        if enabled == "yes" and not self.ccache:
+            print("ccache not found. Compiler caching disabled")
+        self.ccache_dir = os.path.expanduser(
+            ccache.get("dir") or os.path.join(self.cache_dir, "ccache")
+        )
+        self.ccache_size = self.args.ccache_size or ccache.get("max_size", "5G")
+
+        # Sets tarball cache keyed by HEASoft version and component selection
+        cache = u_config.get("cache", {})
+        self.hea_version = download.get("version", "latest")
+        self.selection = hashlib.sha256(
+            f"{self.hea_version}\n{self.url}".encode()
+        ).hexdigest()[:16]
+        self.tarball = os.path.join(
+            self.cache_dir, "tarballs", f"heasoft-{self.hea_version}-{self.selection}.tar.gz"
+        )
+
+        # Sets run history used to predict progress totals and durations
+        self.history_file = os.path.join(self.cache_dir, "history.json")
+        self.profile = (
+            f"{self.platform}-{self.architecture}-{cpu_count()}cpu-{self.jobs}j"
+        )
+        self.last_progress = (0, 0)
+        self.cache_size = float(cache.get("max_size", 20)) * 2**30
+        self.cache_age = float(cache.get("max_age", 30)) * 86_400
+
+        # Sets build directory, a scratch directory is used only if the build fits.
+        # Without history the footprint of a full build is scaled to the selection.
+        share = len(self.components) / max(1, len(set(self.source_dirs.values())))
+        self.footprint = self.__estimate("footprint", int(16 * 2**30 * (0.3 + 0.7 * share)))
+        scratch = str(self.args.scratch or build.get("scratch", "no"))
+        self.work_dir = self.hea_dir
+        if scratch == "auto":
+            self.work_dir = self.__find_scratch() or self.hea_dir
+            if self.work_dir == self.hea_dir:
+                print("No scratch directory with room for the build, building in place")
+        elif scratch != "no":
+            self.work_dir = os.path.join(
+                os.path.abspath(os.path.expanduser(scratch)), f"heainstaller-{os.getuid()}"
+            )
+        if self.work_dir != self.hea_dir:
+            os.makedirs(self.work_dir, exist_ok=True)
+            print(f"Building in scratch directory {self.work_dir}")
+
+        # Sets package update policy
+        update = u_config.get("update", {})
+        self.update_mode = self.args.update_mode or update.get("mode", "full")
+        freshness = self.args.freshness
+        self.freshness = float(
+            update.get("freshness", 24) if freshness is None else freshness
+        ) * 3_600
+
+        self.build_logs = {
+            "configure": "config.log.gz",
+            "compile": "build.log.gz",
+            "install": "install.log.gz",
+        }
+
+        # Makes heasoft installation directory if not present
+        os.makedirs(self.hea_dir, exist_ok=True)
+        os.chdir(self.hea_dir)
+
+        # Removes the scratch tree of an earlier run that built elsewhere
+        self.scratch_file = os.path.join(self.hea_dir, "scratch.json")
+        previous = self.__read_json(self.scratch_file).get("work_dir")
+        if previous != self.work_dir:
+            if previous and previous != self.hea_dir and os.path.isdir(previous):
+                shutil.rmtree(previous, ignore_errors=True)
+                print(f"Removed unused scratch directory {previous}")
+            self.__write_json(self.scratch_file, {"work_dir": self.work_dir, "consumed": False})
+
+        # Initializes log files
+        for file in ("installer.log", "error.log"):
+            with open(file, "w", encoding="utf-8") as f:
+                f.write("Initializing")
+        for file in self.build_logs.values():
+            for path in (file, f"{file}.idx"):
+                if os.path.exists(path):
+                    os.remove(path)
+
+        print(f"OS: {self.platform}")
+        print(f"Kernel version: {self.version}")
+        print(f"Architecture: {self.architecture}\n")
+
+    def update_packages(self) -> None:
+        """Updates package manager and system packages unless refreshed recently"""
+
+        steps = [(f"Updating {self.pm}", "update", self.pm_update)]
+        if self.update_mode == "full":
+            steps.append(("Updating system packages", "upgrade", self.pm_upgrade))
+        elif self.update_mode == "skip":
+            steps = []
+
+        # Skips steps refreshed within the freshness window
+        state_file = os.path.join(self.cache_dir, "refresh.json")
+        state = self.__read_json(state_file)
+        refreshed = state.setdefault(self.pm, {})
+        saved = 0
+        for message, step, cmd in steps:
+            last = refreshed.get(step, {})
+            age = time.time() - last.get("time", 0)
+            if age < self.freshness:
+                saved += last.get("duration", 0)
+                print(f"{message}: Skipped, refreshed {age / 3_600:.1f} h ago")
+                continue
+
+            start = time.time()
+            if self.__run_pipeloader("installer.log", message, *cmd) == 0:
+                refreshed[step] = {"time": time.time(), "duration": time.time() - start}
+                os.makedirs(self.cache_dir, exist_ok=True)
+                self.__write_json(state_file, state)
+        if saved:
+            print(f"Package updates: saved about {saved:.0f} s")
+
+        return
+
+    def install_dependencies(self) -> None:
+        """Installs dependencies"""
+
+        # Runs extra setup commands
+        if self.initializer:
+            self.__run_pipeloader(
+                "installer.log",
+                "Installing extra dependencies",
+                *self.initializer.split(),
+                stdout=sys.stdout,
+            )
+
+        # Installs missing system packages in a single transaction
+        installed = self.__installed_packages()
+        missing = [
+            package
+            for package in self.pm_packages
+            if "://" in package or package.split()[-1] not in installed
+        ]
+        print(
+            f"System packages: {len(self.pm_packages) - len(missing)} of "
+            f"{len(self.pm_packages)} already installed"
+        )
+        if missing:
+            args = []
+            for package in missing:
+                args += [arg for arg in package.split() if arg not in args]
+            returncode = self.__run_pipeloader(
+                "installer.log",
+                f"Installing {len(missing)} system packages",
+                *self.pm_incmd,
+                *args,
+            )
+
+            # Retries one package at a time so one unavailable package does not block the rest
+            if returncode != 0:
+                for package in missing:
+                    self.__run_pipeloader(
+                        "installer.log",
+                        f"Installing {package.split()[-1]}",
+                        *self.pm_incmd,
+                        *package.split(),
+                    )
+
+        # Install missing python library dependencies in one call
+        self.py_incmd = os.environ.get("PIP_CMD", " ".join(self.py_incmd))
+        installed = self.__py_installed_packages()
+        missing = [
+            py_lib
+            for py_lib in self.py_lib
+            if re.sub(r"[-_.]+", "-", py_lib.split()[0]).lower() not in installed
+        ]
+        if missing:
+            self.__run_pipeloader(
+                "installer.log",
+                f"Installing {', '.join(py_lib.split()[0] for py_lib in missing)}",
+                *self.py_incmd.split(),
+                *" ".join(missing).split(),
+            )
+        print("\nAll dependencies installed")
+
+        return
+
+    def config_environ(self) -> None:
+        """Sets environment variables required for installation"""
+
+        # Sets compiler flags
+        sys.stdout.write("Configuring environment")
+        for flag, compiler in zip(self.set_flags, self.compilers):
+            os.environ[flag] = shutil.which(compiler)
+            if not os.environ[flag]:
+                print(f"{compiler} compiler not found\nExiting")
+                sys.exit()
+
+        # Wraps compilers with the compiler cache
+        if self.ccache:
+            for flag in self.cache_flags:
+                os.environ[flag] = f"{self.ccache} {os.environ[flag]}"
+            os.makedirs(self.ccache_dir, exist_ok=True)
+            os.environ["CCACHE_DIR"] = self.ccache_dir
+            os.environ["CCACHE_MAXSIZE"] = self.ccache_size
+            os.environ["CCACHE_BASEDIR"] = self.work_dir
+            os.environ["CCACHE_SLOPPINESS"] = (
+                "include_file_ctime,include_file_mtime,time_macros"
+            )
+            self.__run_subprocess(self.ccache, "--zero-stats")
+
+        # Unsets library flags
+        for u_flag in self.unset_flags:
+            os.environ.pop(u_flag, None)
+
+        # Sets the build profile flags once the compilers accept them
+        self.build_flags = self.__profile_flags()
+        errors = self.__check_profile(self.build_flags)
+        if errors:
+            sys.stdout.write("\n")
+            for error in errors:
+                print(f"Build profile {self.build_profile}: {error}")
+                self.__write_errlog(error)
+            print("Using the portable profile with HEASoft's own flags instead")
+            self.build_profile, self.build_flags = "portable", {}
+        os.environ.update(self.build_flags)
+        path = os.path.expandvars("$PATH")
+
+        # Updates path
+        os.environ["PATH"] = f"/usr/bin:{path}"
+        sys.stdout.write("\rConfiguring environment: Completed successfully\n")
+        profile = f"Build profile: {self.build_profile}" + "".join(
+            f"\n  {var}={value}" for var, value in self.build_flags.items()
+        )
+        print(profile)
+        self.__write_outlog(profile)
+
+        return
+
+    def check_download(self) -> None:
+        """Checks if heasoft is already downloaded"""
+
+        # Checks for valid user response
+        while True:
+            response = (
+                input("\nDo you already have heasoft downloaded? [y/n]: ")
+                .strip()
+                .lower()
+            )
+            if response in self.positive:
+                self.download = False
+
+                # Checks for correct downloaded file path and copies file to heasoft installation directory if found
+                while True:
+                    file = input(
+                        "Enter absolute path to the download heasoft file: "
+                    ).strip()
+                    file = glob.glob(os.path.expanduser(os.path.expandvars(file)))[-1]
+                    if os.path.exists(file):
+                        self.hea_file = file
+                        break
+                    else:
+                        print("Invalid path. Please try again.\n")
+
+                break
+            elif response in self.negative:
+                break
+            else:
+                print("Invalid input. Please try again.\n")
+
+        return
+
+    def download_heasoft(self) -> int:
+        """Downloads heasoft tarball into the tarball cache, resuming partial downloads
+
+        Returns:
+            int: downloader return code
+        """
+
+        returncode = 0
+        if self.download:
+            if self.__cached_tarball():
+                print(f"Using cached heasoft tarball: {self.tarball}")
+                return returncode
+
+            # Resumes from a partial download of the same selection if present
+            os.makedirs(os.path.dirname(self.tarball), exist_ok=True)
+            part = f"{self.tarball}.part"
+
+            # Downloads file
+            print(
+                "Proceeding to download heasoft\nThis might take more than 2 hours..."
+            )
+            self.validators = self.__remote_validators()
+            total = self.validators.get("size") or self.__estimate("download", self.total_size)
+            start = time.monotonic()
+            if self.downloader == "native":
+                returncode = self.__download_native(part, total)
+            else:
+                returncode = self.__run_pipeline(
+                    total,
+                    "installer.log",
+                    part,
+                    "Downloading",
+                    1,
+                    "Download",
+                    "file_size",
+                    "B",
+                    "aria2c",
+                    "-d",
+                    os.path.dirname(self.tarball),
+                    "-q",
+                    "--log-level=error",
+                    "-x",
+                    str(min(self.connections, 16)),
+                    "-s",
+                    str(self.connections),
+                    "-c",
+                    self.url,
+                    "-o",
+                    os.path.basename(part),
+                )
+            if returncode == 0:
+                os.replace(part, self.tarball)
+                self.__record_tarball()
+                self.__learn(
+                    "download", os.path.getsize(self.tarball), time.monotonic() - start
+                )
+
+        return returncode
+
+    def stream_heasoft(self) -> None:
+        """Downloads heasoft tarball and extracts it while the download is in progress"""
+
+        if self.__cached_tarball():
+            print(f"Using cached heasoft tarball: {self.tarball}")
+            self.extract_targz(self.tarball)
+            return
+
+        os.makedirs(os.path.dirname(self.tarball), exist_ok=True)
+        part = f"{self.tarball}.part" if self.keep_tarball else None
+        start = os.path.getsize(part) if part and os.path.exists(part) else 0
+
+        print(
+            "Proceeding to download and extract heasoft\nThis might take more than 2 hours..."
+        )
+        try:
+            try:
+                stream = HttpStream(self.url, tee=part, start=start)
+            except (OSError, http.client.HTTPException):
+                if not start:
+                    raise
+                start = 0
+                stream = HttpStream(self.url, tee=part)
+
+            # Replays the partial download before the network stream. The tee
+            # only appends once the prefix has been read to its end.
+            self.validators = self.__validators(stream.response)
+            begin = time.monotonic()
+            total = stream.length or self.__estimate("download", self.total_size)
+            with stream, open(part if start else os.devnull, "rb") as prefix:
+                reader = DigestReader(prefix, stream)
+                self.__extract_stream(reader, total, part)
+        except (OSError, http.client.HTTPException, tarfile.TarError) as e:
+            print(f"\nDownload: Failed with error {e}")
+            self.__write_errlog(e)
+            sys.exit()
+
+        # Keeps completed download for later reuse. A digest that does not
+        # match an earlier download of the same tarball means the resumed part
+        # was corrupt, so the source tree is removed and streamed again.
+        if part:
+            os.replace(part, self.tarball)
+            if not self.__record_tarball(reader.hexdigest()):
+                self.__remove_source()
+                return self.stream_heasoft()
+        self.__learn("download", reader.size, time.monotonic() - begin)
+        print("\nDownload: Completed successfully.")
+
+        return
+
+    def extract_targz(self, file: str) -> None:
+        """Extracts tarball in a single streaming pass
+
+        Args:
+            file (str): file path
+        """
+
+        try:
+            print("Initializing extraction")
+            with open(file, "rb") as raw:
+                reader = DigestReader(raw)
+                self.__extract_stream(reader, os.path.getsize(file), file)
+        except (FileNotFoundError, tarfile.TarError) as e:
+            print(f"Error encountered while extracting files: {e}")
+            if file == self.tarball:
+                self.__remove_tarball(self.tarball)
+            sys.exit()
+
+        # Records or checks the digest computed while extracting. A corrupt
+        # cached tarball is downloaded again and replaces the extracted tree.
+        if file == self.tarball and not self.__record_tarball(reader.hexdigest()):
+            self.__remove_source()
+            if not self.download or self.download_heasoft():
+                sys.exit()
+            self.extract_targz(self.tarball)
+
+        return
+
+    def __remove_source(self) -> None:
+        """Removes an extracted source tree that came from a corrupt tarball"""
+
+        source = self.__source_dir(quiet=True)
+        if source:
+            shutil.rmtree(source)
+            print(f"Removed {source} extracted from the corrupt tarball")
+
+        return
+
+    def configure(self) -> int:
+        """Configures heasoft installation
+
+        Returns:
+            int: configure return code
+        """
+
+        # Changes file mode to read, write and execute
+        os.chmod("configure", stat.S_IRWXU)
+
+        # Runs configuration
+        print("Configuring\nThis will take a few minutes ...")
+        config_file = os.path.join(self.hea_dir, self.build_logs["configure"])
+        returncode = self.__run_pipeline(
+            self.__estimate("configure", 3_146),
+            config_file,
+            config_file,
+            "Configuring",
+            0.1,
+            "Configuration",
+            "line_number",
+            " ln",
+            "./configure",
+            "--without-lynx",
+        )
+        if returncode == 0:
+            self.__learn("configure", *self.last_progress)
+
+        return returncode
+
+    def compile(self) -> int:
+        """Compiles necessary files required for instaallation
+
+        Returns:
+            int: make return code
+        """
+
+        print("Compiling\nThis may take a few hours ...")
+        build_file = os.path.join(self.hea_dir, self.build_logs["compile"])
+        total = self.__estimate("compile", 78_975)
+        progress = self.__make_progress("compile", total)
+        returncode = self.__run_make(
+            total,
+            build_file,
+            "Compiling",
+            2,
+            "Compilation",
+            progress=progress,
+        )
+        if returncode == 0:
+            self.__learn("compile", *self.last_progress)
+            self.__learn_components("compile", progress)
+
+        return returncode
+
+    def install(self) -> int:
+        """Installs compiled file
+
+        Returns:
+            int: make install return code
+        """
+
+        print("Installing\nThis may take an hour ...")
+        ins_file = os.path.join(self.hea_dir, self.build_logs["install"])
+        total = self.__estimate("install", 64_075)
+        progress = self.__make_progress("install", total)
+        returncode = self.__run_make(
+            total,
+            ins_file,
+            "Installing",
+            0.5,
+            "Installation",
+            "install",
+            progress=progress,
+        )
+        if returncode == 0:
+            self.__learn("install", *self.last_progress)
+            self.__learn_components("install", progress)
+
+        return returncode
+
+    def configure_shell(self) -> None:
+        """Configures non-login/login shell to initialize with heainit command"""
+
+        installdir = os.getcwd()
+        config = 0
+
+        # Loops through each specified shell initialization file
+        for conf in self.shell_config:
+            path = os.path.expandvars(os.path.join(*conf.split()))
+
+            # Checks if shell configuration file is present and writes to file if present
+            if os.path.exists(path):
+                self.__write_script(path, installdir)
+                config += 1
+                break
+
+        # Creates login configuration file if not present and writes there
+        if not config:
+            path = os.path.expandvars(os.path.join(*self.shell_config[-1].split()))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self.__write_script(path, installdir)
+            print(
+                f"\n{path} was not found. "
+                f"{os.path.basename(path)} has been created and can be "
+                f"found at {os.path.dirname(path)}. Make sure that {os.path.basename(path)} "
+                f"is read by {self.def_shell} before execution"
+            )
+
+        return
+
+    def test_installation(self) -> None:
+        """Tests the successful installation of heasoft"""
+
+        # Gets installation directory
+        installdir = os.getcwd()
+        if not os.path.exists(
+            os.path.join(installdir, f"headas-init.{self.shell_ext}")
+        ):
+            print("Heasoft installation unsuccessful!")
+            sys.exit()
+
+        # Sets HEADAS environment variable
+        os.environ["HEADAS"] = f"{installdir}"
+
+        # Sets heasoft initialization file directory
+        script_dir = os.path.join("$HEADAS", f"headas-init.{self.shell_ext}")
+        readfl = self.shell_src.format(script_dir)
+
+        # Runs fversion
+        print("Heasoft version: ", end="", flush=True)
+        self.__run_subprocess(
+            f'$SHELL -i -c "{readfl} && fversion"', stdout=sys.stdout, shell=True
+        )
+
+        return
+
+    def export_artifact(self, file: str) -> None:
+        """Packs the installed heasoft tree into a relocatable artifact
+
+        The artifact is a gzip compressed tarball of the installation
+        directory, with paths relative to hea_dir. Its first member,
+        manifest.json, records the platform, C library, compiler versions,
+        build profile and component selection the tree was built with.
+
+        Args:
+            file (str): Artifact file path
+        """
+
+        installdir = self.__install_dir()
+        source = os.path.dirname(installdir)
+        manifest = {
+            "format": 1,
+            "root": self.hea_dir,
+            "install_dir": os.path.relpath(installdir, self.hea_dir),
+            "platform": self.platform,
+            "architecture": self.architecture,
+            "libc": list(platform.libc_ver()),
+            "compilers": self.__compiler_versions(),
+            "version": self.hea_version,
+            "selection": self.selection,
+            "components": self.components,
+            "build": self.__read_json(os.path.join(installdir, "build-profile.json")),
+            "created": time.time(),
+        }
+
+        # Includes files the installation links to elsewhere in the source tree
+        paths = [installdir]
+        for root, dirs, files in os.walk(installdir):
+            for name in dirs + files:
+                path = os.path.join(root, name)
+                if not os.path.islink(path):
+                    continue
+                target = os.path.realpath(path)
+                if (
+                    os.path.exists(target)
+                    and os.path.commonpath([target, source]) == source
+                    and not any(os.path.commonpath([target, p]) == p for p in paths)
+                ):
+                    paths.append(target)
+        total = sum(self.__tree_size(path) for path in paths)
+
+        print(f"Exporting {manifest['install_dir']} to {file}")
+        part = f"{file}.part"
+        pigz = shutil.which("pigz")
+        with open(part, "wb") as out, tqdm(
+            total=total, desc="Exporting", unit="B", unit_scale=True, leave=True
+        ) as pbar:
+
+            def progress(info):
+                pbar.update(info.size)
+                return info
+
+            process = None
+            if pigz:
+                process = subprocess.Popen([pigz, "-c"], stdin=subprocess.PIPE, stdout=out)
+                tar = tarfile.open(fileobj=process.stdin, mode="w|")
+            else:
+                tar = tarfile.open(fileobj=out, mode="w|gz")
+            with tar:
+                data = json.dumps(manifest, indent=4).encode()
+                info = tarfile.TarInfo("manifest.json")
+                info.size = len(data)
+                info.mtime = int(manifest["created"])
+                tar.addfile(info, io.BytesIO(data))
+                for path in paths:
+                    tar.add(path, os.path.relpath(path, self.hea_dir), filter=progress)
+            if process:
+                process.stdin.close()
+                if process.wait():
+                    os.remove(part)
+                    print(f"pigz failed with return code {process.returncode}\nExiting")
+                    sys.exit()
+        os.replace(part, file)
+        print(f"Artifact written: {file} ({os.path.getsize(file) / 2**20:.1f} MiB)")
+
+        return
+
+    def import_artifact(self, file: str) -> str:
+        """Unpacks a relocatable artifact into hea_dir
+
+        The manifest is checked against this host before anything is
+        unpacked. Text files and symbolic links that refer to the directory
+        the artifact was built in are rewritten to point at hea_dir.
+
+        Args:
+            file (str): Artifact file path
+
+        Returns:
+            str: Installation directory path
+        """
+
+        try:
+            with open(file, "rb") as fl, tarfile.open(fileobj=fl, mode="r|*") as tar:
+                member = tar.next()
+                if member is None or member.name != "manifest.json":
+                    raise tarfile.ReadError("manifest.json is not the first member")
+                manifest = json.load(tar.extractfile(member))
+        except (OSError, ValueError, tarfile.TarError) as e:
+            print(f"Invalid artifact {file}: {e}\nExiting")
+            sys.exit()
+        self.__check_artifact(manifest)
+
+        # Replaces an earlier installation of the same build
+        installdir = os.path.join(self.hea_dir, manifest["install_dir"])
+        if os.path.isdir(installdir):
+            print(f"Replacing existing installation at {installdir}")
+            shutil.rmtree(installdir)
+
+        print("Initializing extraction")
+        try:
+            with open(file, "rb") as fl:
+                extractor = StreamExtractor(self.hea_dir)
+                with tqdm(
+                    total=os.path.getsize(file),
+                    desc="Extracting",
+                    unit="B",
+                    unit_scale=True,
+                    leave=True,
+                ) as pbar:
+                    extractor.extract(fl, lambda consumed: pbar.update(consumed - pbar.n))
+                    pbar.update(pbar.total - pbar.n)
+        except (OSError, tarfile.TarError) as e:
+            print(f"Error encountered while extracting files: {e}")
+            sys.exit()
+        if manifest["root"] != self.hea_dir:
+            self.__relocate(installdir, manifest["root"], self.hea_dir)
+        os.replace(
+            os.path.join(self.hea_dir, "manifest.json"),
+            os.path.join(installdir, "artifact.json"),
+        )
+
+        return installdir
+
+    def deploy(self, file: str) -> None:
+        """Installs heasoft from a relocatable artifact without building it
+
+        Args:
+            file (str): Artifact file path
+        """
+
+        os.chdir(self.hea_dir)
+        self.update_packages()
+        self.install_dependencies()
+        installdir = self.import_artifact(file)
+        os.chdir(installdir)
+        self.configure_shell()
+        self.test_installation()
+
+        return
+
+    def run(self) -> None:
+        """Runs setup, resuming at the first phase that is invalid or failed
+
+        Each completed phase is recorded in phases.json with a digest of its
+        inputs and of the run of the phase it builds on. A phase is skipped
+        when that digest is unchanged, so a re-run resumes where the previous
+        one stopped and redoes everything downstream of a changed input.
+        Phases start as soon as the phases they need have finished, so the
+        download runs while system packages are being installed.
+        """
+
+        os.chdir(self.hea_dir)
+        state_file = os.path.join(self.hea_dir, "phases.json")
+        state = {} if self.args.restart else self.__read_json(state_file)
+
+        # Phase name, action, inputs, phase it builds on, completion check.
+        # Update has its own freshness window, environment and test are cheap
+        # and set up process state, so they run every time.
+        compilers = lambda: [
+            [os.environ.get(flag) for flag in self.set_flags],
+            self.configurations,
+            self.build_flags,
+        ]
+        phases = (
+            ("update", self.update_packages, None, None, None),
+            (
+                "dependencies",
+                self.install_dependencies,
+                lambda: [self.pm_packages, self.py_lib],
+                None,
+                None,
+            ),
+            ("environment", self.config_environ, None, None, None),
+            (
+                "download",
+                self.__phase_download,
+                lambda: [self.url, self.hea_version],
+                None,
+                None,
+            ),
+            (
+                "extract",
+                self.__phase_extract,
+                lambda: [self.__tarball_identity(), self.components, self.work_dir],
+                "download",
+                self.__extracted,
+            ),
+            ("configure", self.__phase_configure, compilers, "extract", None),
+            ("compile", self.__phase_compile, lambda: [], "configure", None),
+            ("install", self.__phase_install, lambda: [], "compile", self.__install_dir),
+            (
+                "shell",
+                self.__phase_shell,
+                lambda: [self.def_shell, self.shell_config],
+                "install",
+                None,
+            ),
+            ("test", self.__phase_test, None, None, None),
+            (
+                "benchmark",
+                self.__phase_benchmark,
+                lambda: [self.build_profile, self.tool_benchmark],
+                "install",
+                None,
+            ),
+        )
+        if not self.benchmark:
+            phases = phases[:-1]
+
+        # Phases that must finish first besides the one a phase builds on.
+        # The download does not depend on the package manager, so it runs
+        # alongside update, dependencies and environment.
+        requires = {
+            "dependencies": ["update"],
+            "environment": ["dependencies"],
+            "configure": ["environment"],
+            "test": ["shell"],
+            "benchmark": ["test"],
+        }
+
+        # Questions are asked before any phase starts so nothing blocks later
+        prompts = {"download": self.check_download}
+
+        report = []
+        try:
+            self.__run_phases(
+                phases,
+                requires,
+                prompts,
+                state,
+                state_file,
+                report,
+                self.check_space if self.preflight else None,
+            )
+        finally:
+            self.__write_report(report)
+
+        return
+
+    def check_space(self) -> None:
+        """Checks that the run fits on disk before it starts, exiting if it does not
+
+        Space is needed at two points: after extraction, for the tarball and
+        the source tree, and after installation, for the tarball unless it is
+        cleaned up, the built source tree and, when building in a scratch
+        directory, the copied installation. Sizes come from earlier runs of the
+        same selection, and space taken by an existing source tree is not
+        counted again.
+        """
+
+        peaks = ({}, {})
+
+        def need(moment: int, path: str, size: int) -> None:
+            while not os.path.exists(path):
+                path = os.path.dirname(path)
+            entry = peaks[moment].setdefault(os.stat(path).st_dev, [path, 0])
+            entry[1] += size
+
+        # Counts only a tarball that has yet to be written
+        tarball = 0
+        if self.download and (self.keep_tarball or not self.pipeline):
+            if not os.path.exists(self.tarball):
+                tarball = self.__estimate("download", self.total_size, quiet=True)
+        existing = sum(
+            self.__tree_size(path)
+            for path in [self.__source_dir(quiet=True)]
+            + [self.__build_root(name) for name in self.configurations]
+            if path and os.path.exists(path)
+        )
+        extracted = self.__estimate("extracted", self.footprint // 2, quiet=True)
+
+        need(0, self.cache_dir, tarball)
+        need(0, self.work_dir, max(0, extracted - existing))
+        need(1, self.cache_dir, 0 if self.cleanup else tarball)
+        need(1, self.work_dir, max(0, self.footprint - existing))
+        if self.work_dir != self.hea_dir:
+            need(1, self.hea_dir, self.__estimate("installed", self.footprint // 4, quiet=True))
+
+        short = []
+        for device in set(peaks[0]) | set(peaks[1]):
+            path = (peaks[0].get(device) or peaks[1][device])[0]
+            required = max(peaks[moment].get(device, [path, 0])[1] for moment in (0, 1))
+            free = shutil.disk_usage(path).free
+            if required > free:
+                short.append((path, required, free))
+        if not short:
+            return
+
+        print("Not enough disk space for this run:")
+        for path, required, free in short:
+            print(
+                f"  {path}: {tqdm.format_sizeof(required, 'B', 1024)} needed, "
+                f"{tqdm.format_sizeof(free, 'B', 1024)} free"
+            )
+        if tarball and not self.cleanup:
+            print("Pass --cleanup to remove the tarball once it has been extracted")
+        for candidate in ("/dev/shm", os.environ.get("XDG_RUNTIME_DIR"), "/tmp", "/var/tmp"):
+            if (
+                candidate
+                and os.access(candidate, os.W_OK)
+                and os.stat(candidate).st_dev != os.stat(self.work_dir).st_dev
+                and shutil.disk_usage(candidate).free >= self.footprint
+            ):
+                print(f"Pass --scratch {candidate} to build there instead")
+                break
+        print("Pass --no-preflight to run anyway\nExiting")
+        sys.exit()
+
+    def __run_phases(
+        self,
+        phases: tuple,
+        requires: dict,
+        prompts: dict,
+        state: dict,
+        state_file: str,
+        report: list,
+        preflight=None,
+    ) -> None:
+        """Runs phases that are not up to date, each as soon as its requirements finish
+
+        Every phase runs in its own thread. While several phases run, the
+        first of them in phase order owns the terminal and the output of the
+        others is held until they take over. A failed phase stops the others.
+
+        Args:
+            phases (tuple): Phase definitions
+            requires (dict): Phase names that must finish before a phase starts, by phase
+            prompts (dict): Questions asked up front for phases that will run, by phase
+            state (dict): Recorded phase state
+            state_file (str): Phase state file path
+            report (list): Receives one performance record per phase
+            preflight (callable, optional): Check run after the questions, before any phase starts. Defaults to None.
+        """
+
+        names = [phase[0] for phase in phases]
+        lock = threading.Lock()
+
+        def key(inputs, after: str) -> str:
+            return hashlib.sha256(
+                json.dumps([inputs(), state.get(after, {}).get("time")]).encode()
+            ).hexdigest()
+
+        def up_to_date(name: str, inputs, after: str, check) -> bool:
+            record = state.get(name, {})
+            return bool(
+                inputs
+                and record.get("status") == "done"
+                and record.get("key") == key(inputs, after)
+                and (check is None or check(quiet=True))
+            )
+
+        def run_phase(name: str, action, inputs, after: str, check) -> None:
+            PhaseOutput.phase.set(name)
+            if up_to_date(name, inputs, after, check):
+                self.__restore_phase(name, state[name].get("outputs", {}))
+                print(f"{name.capitalize()}: Skipped, unchanged since last run")
+                report.append({"phase": name, "status": "skipped"})
+                return
+
+            # Records the phase outcome, including failures that exit
+            with lock:
+                state[name] = {
+                    "key": key(inputs, after) if inputs else None,
+                    "status": "failed",
+                    "time": time.time(),
+                }
+            with lock:
+                running.add(name)
+                if len(running) > 1:
+                    self.concurrent.update(running)
+            meter = ResourceMeter().start()
+            returncode = 1
+            try:
+                returncode = action()
+            finally:
+                with lock:
+                    running.discard(name)
+                    self.__write_json(state_file, state)
+                usage = meter.stop()
+                commands = self.commands.pop(name, [])
+
+                # Process-wide figures would include the phases running alongside,
+                # so an overlapping phase only counts the commands it ran
+                if name in self.concurrent:
+                    for figure in ("user_cpu", "system_cpu", "read_bytes", "write_bytes"):
+                        usage[figure] = round(sum(c[figure] for c in commands), 3)
+                    usage["peak_rss"] = max((c["peak_rss"] for c in commands), default=0)
+                    usage["concurrent"] = True
+                report.append(
+                    {
+                        "phase": name,
+                        "status": "failed" if returncode else "done",
+                        **usage,
+                        "commands": commands,
+                    }
+                )
+            if returncode:
+                sys.exit()
+            with lock:
+                state[name].update(
+                    status="done", time=time.time(), outputs=self.__phase_outputs(name)
+                )
+                self.__write_json(state_file, state)
+
+        def worker(phase: tuple) -> None:
+            try:
+                run_phase(*phase)
+                finished.put((phase[0], None))
+            except BaseException as e:
+                finished.put((phase[0], e))
+
+        for name, _, inputs, after, check in phases:
+            if name in prompts and not up_to_date(name, inputs, after, check):
+                prompts[name]()
+        if preflight:
+            preflight()
+
+        def start_ready() -> None:
+            for phase in phases:
+                name, after = phase[0], phase[3]
+                needs = [after] if after else []
+                needs += requires.get(name, [])
+                if name not in started and all(need in done for need in needs):
+                    started.append(name)
+                    output.claim(name)
+                    threading.Thread(target=worker, args=(phase,), daemon=True).start()
+
+        output = PhaseOutput(self.hea_dir)
+        output.install()
+        finished = queue.Queue()
+        started, done, running = [], set(), set()
+        try:
+            start_ready()
+            while len(done) < len(phases):
+                name, error = finished.get()
+                done.add(name)
+                if error:
+                    raise error
+
+                # Starts the phases it unblocks before handing on the terminal
+                start_ready()
+                output.release(name, [n for n in names if n in started and n not in done])
+        except BaseException as e:
+            interrupted = isinstance(e, KeyboardInterrupt)
+            Supervisor.cancel_all(signal.SIGINT if interrupted else signal.SIGTERM)
+            raise
+        finally:
+            output.uninstall()
+            report.sort(key=lambda record: names.index(record["phase"]))
+
+        return
+
+    def __write_report(self, report: list) -> None:
+        """Writes the performance report to performance.json and prints a summary table
+
+        Args:
+            report (list): Performance records of each phase
+        """
+
+        data = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "host": {
+                "platform": self.platform,
+                "kernel": self.version,
+                "architecture": self.architecture,
+                "cpus": cpu_count(),
+                "memory": os.sysconf("SC_PHYS_PAGES") * os.sysconf("SC_PAGE_SIZE"),
+            },
+            "config": {
+                "jobs": self.jobs,
+                "adaptive": self.adaptive,
+                "downloader": self.downloader,
+                "pipeline": self.pipeline,
+                "ccache": bool(self.ccache),
+            },
+            "phases": report,
+        }
+        self.__write_json(os.path.join(self.hea_dir, "performance.json"), data)
+
+        # Prints human readable summary
+        print(
+            f"\n{'Phase':<14}{'Status':<9}{'Wall':>10}{'User':>10}{'System':>10}"
+            f"{'Peak RSS':>11}{'Read':>11}{'Written':>11}"
+        )
+        for phase in report:
+            if phase["status"] == "skipped":
+                print(f"{phase['phase']:<14}{'skipped':<9}")
+                continue
+            status = f"{phase['status']}*" if phase.get("concurrent") else phase["status"]
+            print(
+                f"{phase['phase']:<14}{status:<9}"
+                f"{self.__format_seconds(phase['wall']):>10}"
+                f"{self.__format_seconds(phase['user_cpu']):>10}"
+                f"{self.__format_seconds(phase['system_cpu']):>10}"
+                f"{tqdm.format_sizeof(phase['peak_rss'], 'B', 1024):>11}"
+                f"{tqdm.format_sizeof(phase['read_bytes'], 'B', 1024):>11}"
+                f"{tqdm.format_sizeof(phase['write_bytes'], 'B', 1024):>11}"
+            )
+        if any(phase.get("concurrent") for phase in report):
+            print("* ran alongside other phases, only its own commands are counted")
+        print(f"Performance report: {os.path.join(self.hea_dir, 'performance.json')}")
+
+        return
+
+    @staticmethod
+    def __format_seconds(seconds: float) -> str:
+        """Formats a duration as h:mm:ss
+
+        Args:
+            seconds (float): Duration in seconds
+
+        Returns:
+            str: Formatted duration
+        """
+
+        return tqdm.format_interval(seconds) if seconds >= 1 else f"{seconds:.2f}s"
+
+    def __record_command(self, args: tuple, start: float, supervisor: Supervisor) -> None:
+        """Records the resource usage of a finished subprocess
+
+        Args:
+            args (tuple): Command line
+            start (float): Monotonic time the subprocess was started at
+            supervisor (Supervisor): Supervisor that reaped the subprocess
+        """
+
+        self.commands.setdefault(PhaseOutput.phase.get(), []).append(
+            {
+                "command": " ".join(str(arg) for arg in args),
+                "returncode": supervisor.processes[None].returncode,
+                "wall": round(time.monotonic() - start, 3),
+                **ResourceMeter.command_usage(supervisor.usage.get(None)),
+            }
+        )
+
+        return
+
+    def __phase_download(self) -> int:
+        """Downloads heasoft unless an existing tarball was given
+
+        Returns:
+            int: download return code
+        """
+
+        self.extracted = False
+        if self.download and self.pipeline:
+            self.stream_heasoft()
+            self.extracted = True
+
+            return 0
+
+        return self.download_heasoft()
+
+    def __phase_extract(self) -> int:
+        """Extracts the downloaded or supplied tarball, removing it afterwards on cleanup
+
+        Returns:
+            int: download return code when the tarball had to be fetched again
+        """
+
+        self.__write_json(self.scratch_file, {"work_dir": self.work_dir, "consumed": False})
+        if not self.extracted:
+            # Fetches again a tarball removed by cleanup after an earlier extraction
+            if self.download and not os.path.exists(self.tarball):
+                returncode = self.download_heasoft()
+                if returncode:
+                    return returncode
+            self.extract_targz(self.tarball if self.download else self.hea_file)
+
+        # Only removes a cached tarball whose digest was checked or recorded.
+        # Its metadata is kept so the extraction stays up to date.
+        meta = self.__read_json(f"{self.tarball}.json")
+        if self.cleanup and self.download and meta.get("sha256") and os.path.exists(self.tarball):
+            size = os.path.getsize(self.tarball)
+            os.remove(self.tarball)
+            message = f"Cleanup: removed cached tarball, reclaimed {tqdm.format_sizeof(size, 'B', 1024)}"
+            print(message)
+            self.__write_outlog(message)
+
+        return 0
+
+    def __phase_configure(self) -> int:
+        """Configures heasoft in its build directory or directories
+
+        With the configure cache, a failure with cached results is retried
+        once with an empty cache in case a cached result has gone stale.
+
+        Returns:
+            int: configure return code
+        """
+
+        cache_dirs = self.__configure_cache() if self.configure_cache else []
+        warm = self.__cache_entries(cache_dirs) > 0
+        start = time.monotonic()
+        returncode = self.__build_steps("configure")
+        if returncode and warm:
+            print("Configure failed with cached results, retrying with an empty configure cache")
+            for directory in cache_dirs:
+                for file in glob.glob(os.path.join(directory, "*.cache")):
+                    os.remove(file)
+                self.__write_outlog(f"Configure cache: emptied {directory} after a failed configure")
+            warm = False
+            start = time.monotonic()
+            returncode = self.__build_steps("configure")
+
+        # Compares the time taken with a warm cache to earlier runs with an empty one
+        if returncode == 0 and cache_dirs:
+            duration = time.monotonic() - start
+            state = "warm" if warm else "cold"
+            self.__learn(f"configure-{state}", self.__cache_entries(cache_dirs), duration)
+            cold = (
+                self.__read_json(self.history_file)
+                .get(self.selection, {})
+                .get("configure-cold", {})
+                .get("durations", {})
+                .get(self.profile)
+            )
+            if warm and cold:
+                print(
+                    f"Configure cache: took {self.__format_seconds(duration)}, about "
+                    f"{self.__format_seconds(statistics.median(cold))} without cached results"
+                )
+
+        return returncode
+
+    def __configure_cache(self) -> list:
+        """Sets up the configure caches shared by runs with the same host and compilers
+
+        Every configure, including those HEASoft runs for its components,
+        reads a site file that points autoconf at a cache file kept in the
+        cache directory. Each configure script gets a cache file of its own,
+        named after its directory in the source tree, so scripts with
+        different checks and precious variables never share one. Each build
+        configuration gets its own directory of cache files and its own site
+        file, so configurations running concurrently never write the same
+        file.
+
+        The caches are keyed on the host, the compiler paths and versions and
+        the variables configure results depend on, so other compilers get
+        their own caches. They are emptied when the installed system packages
+        change, and caches of other compilers unused for cache_age are removed.
+
+        Returns:
+            list: Cache directory of each configuration
+        """
+
+        variables = self.set_flags + list(self.profile_flags) + self.configure_environment
+        key_data = {
+            "host": [platform.node(), self.platform, self.architecture],
+            "compilers": self.__compiler_versions(),
+            "environment": {var: os.environ.get(var) for var in variables},
+        }
+        key = hashlib.sha256(json.dumps(key_data, sort_keys=True).encode()).hexdigest()[:16]
+        root = os.path.join(self.cache_dir, "configure")
+        directory = os.path.join(root, key)
+        meta_file = os.path.join(directory, "meta.json")
+
+        # Cached results about libraries and headers go stale with the packages
+        packages = hashlib.sha256(
+            "\n".join(sorted(self.__installed_packages())).encode()
+        ).hexdigest()[:16]
+        meta = self.__read_json(meta_file)
+        stale = glob.glob(os.path.join(directory, "*", "*.cache"))
+        if stale and meta.get("packages") != packages:
+            for file in stale:
+                os.remove(file)
+            print("Configure cache: installed packages changed, starting an empty cache")
+
+        if os.path.isdir(root):
+            for entry in os.scandir(root):
+                if (
+                    entry.name != key
+                    and time.time() - entry.stat().st_mtime > self.cache_age
+                ):
+                    shutil.rmtree(entry.path, ignore_errors=True)
+                    self.__write_outlog(f"Configure cache: removed unused {entry.name}")
+
+        # Loads the site files autoconf would have read without CONFIG_SITE
+        if self.config_site:
+            sites = self.config_site
+        else:
+            sites = "$heainstaller_prefix/share/config.site $heainstaller_prefix/etc/config.site"
+
+        # Sets the cache where none was given or where a parent configure passed
+        # its own one down, naming it after the directory of the configure script
+        self.config_sites = {}
+        cache_dirs = []
+        for name in self.configurations or [None]:
+            if name:
+                tree = f"'{os.path.realpath(self.__build_root(name))}'/"
+            else:
+                tree = f"'{os.path.realpath(self.work_dir)}'/heasoft-*/"
+            cache_dir = os.path.join(directory, name or "default")
+            site_file = os.path.join(cache_dir, "config.site")
+            os.makedirs(cache_dir, exist_ok=True)
+            with open(site_file, "w", encoding="utf-8") as fl:
+                fl.write(
+                    "# Written by heainstaller to share configure results between runs\n"
+                    "case $cache_file in\n"
+                    f"  /dev/null|'{cache_dir}'/*)\n"
+                    '    heainstaller_dir=`cd "$srcdir" && pwd -P`\n'
+                    f"    heainstaller_dir=${{heainstaller_dir#{tree}}}\n"
+                    f"    cache_file='{cache_dir}'/`echo \"${{heainstaller_dir:-top}}\" | "
+                    "sed 's|[^A-Za-z0-9._-]|_|g'`.cache ;;\n"
+                    "esac\n"
+                    "heainstaller_prefix=$prefix\n"
+                    'test "x$heainstaller_prefix" = xNONE && heainstaller_prefix=$ac_default_prefix\n'
+                    f"for heainstaller_site in {sites}; do\n"
+                    '  if test -r "$heainstaller_site"; then . "$heainstaller_site"; fi\n'
+                    "done\n"
+                )
+            self.config_sites[name] = site_file
+            cache_dirs.append(cache_dir)
+        self.__write_json(
+            meta_file, {"key": key_data, "packages": packages, "last_used": time.time()}
+        )
+        if None in self.config_sites:
+            os.environ["CONFIG_SITE"] = self.config_sites[None]
+
+        entries = self.__cache_entries(cache_dirs)
+        message = (
+            f"Configure cache: {entries} cached results" if entries else "Configure cache: empty"
+        )
+        print(message)
+        self.__write_outlog(f"{message}, {directory}")
+
+        return cache_dirs
+
+    @staticmethod
+    def __cache_entries(cache_dirs: list) -> int:
+        """Counts the results in the configure cache files of some directories
+
+        Args:
+            cache_dirs (list): Cache directories
+
+        Returns:
+            int: Number of cached results, 0 if there is no cache
+        """
+
+        entries = 0
+        for directory in cache_dirs:
+            for file in glob.glob(os.path.join(directory, "*.cache")):
+                try:
+                    with open(file, "r", encoding="utf-8", errors="replace") as fl:
+                        entries += sum(1 for line in fl if re.match(r"^\w+=", line))
+                except OSError:
+                    continue
 
-        # Loads system information
-        self.platform = platform.system().lower()
-        self.version = platform.release()
-        self.architecture = platform.machine()
-        self.script_dir = os.path.dirname(os.path.realpath(__file__))
+        return entries
 
-        # Reads installation configuration files
+    def __phase_compile(self) -> int:
+        """Compiles heasoft in its build directory or directories
+
+        Returns:
+            int: make return code
+        """
+
+        return self.__build_steps("compile")
+
+    def __phase_install(self) -> int:
+        """Installs heasoft from its build directory or directories
+
+        Returns:
+            int: make install return code
+        """
+
+        returncode = self.__build_steps("install")
+        if returncode == 0:
+            # Records how the build was made next to it, so it travels with copies and artifacts
+            record = {
+                "profile": self.build_profile,
+                "flags": self.build_flags,
+                "compilers": self.__compiler_versions(),
+                "architecture": self.architecture,
+                "cpu": cpu_model(),
+                "time": time.time(),
+            }
+            for name in self.configurations or [None]:
+                installdir = self.__install_dir(configuration=name, root=self.work_dir)
+                self.__write_json(os.path.join(installdir, "build-profile.json"), record)
+            size = sum(
+                self.__tree_size(path)
+                for path in [self.__source_dir()]
+                + [self.__build_root(name) for name in self.configurations]
+            )
+            self.__learn("footprint", size)
+            installed = sum(
+                self.__tree_size(self.__install_dir(configuration=name, root=self.work_dir))
+                for name in self.configurations or [None]
+            )
+            self.__learn("installed", installed)
+            if self.work_dir != self.hea_dir:
+                self.__copy_installation()
+            elif self.cleanup:
+                self.__remove_intermediates()
+        for name in self.configurations:
+            print(f"{name}: {self.__install_dir(quiet=True, configuration=name)}")
+        self.__report_ccache()
+
+        return returncode
+
+    def __remove_intermediates(self) -> None:
+        """Removes object files and libraries left in the build trees after installation
+
+        Files the installation links to are kept.
+        """
+
+        installs = [
+            self.__install_dir(configuration=name) for name in self.configurations or [None]
+        ]
+        linked = set()
+        for installdir in installs:
+            for root, dirs, files in os.walk(installdir):
+                for name in dirs + files:
+                    path = os.path.join(root, name)
+                    if os.path.islink(path):
+                        linked.add(os.path.realpath(path))
+
+        files = size = 0
+        trees = [self.__build_root(name) for name in self.configurations]
+        for tree in trees or [self.__source_dir()]:
+            for root, dirs, names in os.walk(tree):
+                dirs[:] = [d for d in dirs if os.path.join(root, d) not in installs]
+                for name in names:
+                    path = os.path.join(root, name)
+                    if (
+                        not name.endswith((".o", ".lo", ".a", ".la"))
+                        or os.path.islink(path)
+                        or os.path.realpath(path) in linked
+                    ):
+                        continue
+                    size += os.lstat(path).st_size
+                    os.remove(path)
+                    files += 1
+        message = (
+            f"Cleanup: removed {files} build intermediates, "
+            f"reclaimed {tqdm.format_sizeof(size, 'B', 1024)}"
+        )
+        print(message)
+        self.__write_outlog(message)
+
+        return
+
+    def __build_steps(self, step: str) -> int:
+        """Runs a build step, repeating the build on disk if the scratch directory fills up
+
+        Args:
+            step (str): configure, compile or install
+
+        Returns:
+            int: Return code of the step
+        """
+
+        steps = ["configure", "compile", "install"]
+
+        # Extracts again a source tree removed after its installation was
+        # copied out of the scratch directory, and redoes the earlier steps
+        if not self.__source_dir(quiet=True):
+            self.extracted = False
+            returncode = self.__phase_extract()
+            for earlier in steps[: steps.index(step)]:
+                if returncode:
+                    return returncode
+                returncode = self.__build_step(earlier)
+            if returncode:
+                return returncode
+
+        returncode = self.__build_step(step)
+        if returncode and self.__scratch_full():
+            self.__leave_scratch()
+
+            # Paths written by configure point into the scratch directory
+            for earlier in steps[: steps.index(step) + 1]:
+                returncode = self.__build_step(earlier)
+                if returncode:
+                    break
+
+        return returncode
+
+    def __build_step(self, step: str) -> int:
+        """Runs a build step in the build directory or for every configuration
+
+        Args:
+            step (str): configure, compile or install
+
+        Returns:
+            int: Return code of the step
+        """
+
+        if self.configurations:
+            if step == "configure":
+                for name, components in self.configurations.items():
+                    self.__mirror_source(name, components)
+            return self.__run_configurations(step)
+
+        os.chdir(os.path.join(self.__source_dir(), "BUILD_DIR"))
+
+        return {
+            "configure": self.configure,
+            "compile": self.compile,
+            "install": self.install,
+        }[step]()
+
+    def __find_scratch(self) -> str:
+        """Finds a fast scratch directory with room for the build
+
+        Memory-backed file systems come first. Their pages are taken from
+        memory, so the expected footprint has to fit in available memory next
+        to the make jobs as well as in the file system.
+
+        Returns:
+            str: Scratch directory path, None if the build does not fit
+        """
+
+        if available_memory() < self.footprint + self.jobs * self.memory_per_job:
+            return None
+        for candidate in ("/dev/shm", os.environ.get("XDG_RUNTIME_DIR"), "/tmp"):
+            if not candidate or not os.access(candidate, os.W_OK):
+                continue
+            if os.stat(candidate).st_dev == os.stat(self.home_dir).st_dev:
+                continue
+            if shutil.disk_usage(candidate).free >= self.footprint:
+                return os.path.join(candidate, f"heainstaller-{os.getuid()}")
+
+        return None
+
+    def __scratch_full(self) -> bool:
+        """Checks if a failed build step ran out of space in the scratch directory
+
+        Returns:
+            bool: True if the scratch directory is in use and full
+        """
+
+        if self.work_dir == self.hea_dir:
+            return False
+        if shutil.disk_usage(self.work_dir).free < 256 * 2**20:
+            return True
+
+        # Looks for the error in the last chunk of each build log
+        roots = [self.hea_dir] + [self.__build_root(name) for name in self.configurations]
+        for root in roots:
+            for file in self.build_logs.values():
+                log = os.path.join(root, file)
+                last = len(ChunkedLog.read_index(log)["chunks"]) - 1
+                if last < 0:
+                    continue
+                for _, data in ChunkedLog.chunks(log, last):
+                    if b"No space left on device" in data:
+                        return True
+
+        return False
+
+    def __leave_scratch(self) -> None:
+        """Moves the source tree out of the full scratch directory into hea_dir"""
+
+        scratch = self.work_dir
+        message = f"Scratch directory {scratch} is full, continuing the build in {self.hea_dir}"
+        print(f"\n{message}")
+        self.__write_outlog(message)
+
+        # Keeps automatic selection from choosing a directory this small again
+        self.__learn("footprint", max(self.footprint, shutil.disk_usage(scratch).total))
+
+        source = self.__source_dir()
+        target = os.path.join(self.hea_dir, os.path.basename(source))
+        if os.path.isdir(target):
+            shutil.rmtree(target)
+        shutil.move(source, target)
+        shutil.rmtree(scratch, ignore_errors=True)
+        self.work_dir = self.hea_dir
+        self.__write_json(self.scratch_file, {"work_dir": self.work_dir, "consumed": False})
+        if self.ccache:
+            os.environ["CCACHE_BASEDIR"] = self.work_dir
+
+        return
+
+    def __copy_installation(self) -> None:
+        """Copies the installed tree out of the scratch directory into hea_dir
+
+        Files elsewhere in the build tree that the installation links to are
+        copied with it and the links are pointed at the copies. Remaining
+        references to the scratch directory are rewritten, then the scratch
+        directory is removed to give back its space. The source tree is
+        recorded as consumed so the extraction stays up to date, and is
+        extracted again only if a build step has to run once more.
+        """
+
+        for name in self.configurations or [None]:
+            installdir = self.__install_dir(configuration=name, root=self.work_dir)
+            target = os.path.join(self.hea_dir, os.path.relpath(installdir, self.work_dir))
+            print(f"Copying {os.path.basename(installdir)} to {os.path.dirname(target)}")
+            self.__copy_tree(installdir, target)
+
+            for root, dirs, files in os.walk(target):
+                for entry in dirs + files:
+                    link = os.path.join(root, entry)
+                    if not os.path.islink(link):
+                        continue
+                    origin = os.path.join(installdir, os.path.relpath(link, target))
+                    real = os.path.realpath(origin)
+                    if (
+                        os.path.commonpath([real, installdir]) == installdir
+                        or os.path.commonpath([real, self.work_dir]) != self.work_dir
+                        or not os.path.exists(real)
+                    ):
+                        continue
+                    copy = os.path.join(self.hea_dir, os.path.relpath(real, self.work_dir))
+                    if not os.path.lexists(copy):
+                        self.__copy_tree(real, copy)
+                    os.remove(link)
+                    os.symlink(copy, link)
+            self.__relocate(target, self.work_dir, self.hea_dir)
+        shutil.rmtree(self.work_dir)
+        self.__write_json(self.scratch_file, {"work_dir": self.work_dir, "consumed": True})
+
+        return
+
+    @staticmethod
+    def __copy_tree(source: str, target: str) -> None:
+        """Replaces a file or directory with a copy, keeping symbolic links
+
+        Args:
+            source (str): Path copied
+            target (str): Destination path
+        """
+
+        if os.path.isdir(target) and not os.path.islink(target):
+            shutil.rmtree(target)
+        elif os.path.lexists(target):
+            os.remove(target)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        if os.path.isdir(source) and not os.path.islink(source):
+            shutil.copytree(source, target, symlinks=True)
+        else:
+            shutil.copy2(source, target, follow_symlinks=False)
+
+        return
+
+    def __mirror_source(self, name: str, components: list) -> None:
+        """Creates a build tree for a configuration that links to the shared source tree
+
+        Directories are created for real so each configuration keeps its own
+        objects, logs and installation, while source files are symbolic links
+        into the extracted tree. Files configure may rewrite in place are
+        copied instead so the shared tree stays untouched: known configure
+        outputs, files generated from a .in template and executable scripts.
+        Directories of components the configuration does not build are left
+        out; unrecognised directories are core and always kept.
+
+        Args:
+            name (str): Configuration name
+            components (list): Components built by the configuration, or "all"
+        """
+
+        source = self.__source_dir()
+        root = self.__build_root(name)
+        if os.path.isdir(root):
+            shutil.rmtree(root)
+        os.makedirs(root)
+
+        missing = set(components) - set(self.components) if components != "all" else ()
+        if missing:
+            print(f"{name}: {', '.join(sorted(missing))} not in the downloaded selection")
+
+        for entry in os.scandir(source):
+            component = self.source_dirs.get(entry.name.lower())
+            if component and components != "all" and component not in components:
+                continue
+
+            # Links files and recreates directories below each kept entry
+            target = os.path.join(root, entry.name)
+            if not entry.is_dir(follow_symlinks=False):
+                self.__mirror_file(source, entry.name, root, {entry.name})
+                continue
+            for path, dirs, files in os.walk(entry.path):
+                mirror = os.path.join(target, os.path.relpath(path, entry.path))
+                os.makedirs(mirror, exist_ok=True)
+                links = [d for d in dirs if os.path.islink(os.path.join(path, d))]
+                for file in files:
+                    self.__mirror_file(path, file, mirror, set(files))
+                for link in links:
+                    os.symlink(os.path.join(path, link), os.path.join(mirror, link))
+
+        return
+
+    @staticmethod
+    def __mirror_file(path: str, file: str, mirror: str, siblings: set) -> None:
+        """Links a source file into a mirrored build tree, or copies it if configure may rewrite it
+
+        Args:
+            path (str): Source directory
+            file (str): File name
+            mirror (str): Mirrored directory
+            siblings (set): Names of the files in the source directory
+        """
+
+        source = os.path.join(path, file)
+        generated = ("configure", "config.status", "config.cache", "config.log", "Makefile", "libtool")
+        if (
+            file in generated
+            or f"{file}.in" in siblings
+            or (not os.path.islink(source) and os.access(source, os.X_OK))
+        ):
+            shutil.copy2(source, os.path.join(mirror, file), follow_symlinks=False)
+        else:
+            os.symlink(source, os.path.join(mirror, file))
+
+        return
+
+    def __run_configurations(self, step: str) -> int:
+        """Runs one build step for all configurations concurrently
+
+        make steps share one jobserver so the configurations together stay
+        within the configured job count. Without a jobserver, each make gets
+        an equal share of the jobs instead.
+
+        Args:
+            step (str): configure, compile or install
+
+        Returns:
+            int: Largest return code of the configurations
+        """
+
+        proc, default, command = {
+            "configure": ("Configuring", 3_146, ["./configure", "--without-lynx"]),
+            "compile": ("Compiling", 78_975, ["make"]),
+            "install": ("Installing", 64_075, ["make", "install"]),
+        }[step]
+        log_name = self.build_logs[step]
+        env = os.environ.copy()
+        jobserver = None
+        if command[0] == "make":
+            jobserver = JobServer(
+                self.jobs,
+                self.memory_per_job,
+                self.max_load,
+                adaptive=self.adaptive,
+                log=self.__write_outlog,
+            )
+            args = jobserver.make_args(env)
+            if not jobserver.fds:
+                share = max(1, self.jobs // len(self.configurations))
+                args = [f"-j{share}" if arg.startswith("-j") else arg for arg in args]
+            command = ["make", *args, *command[1:]]
+            jobserver.start()
+
+        print(f"{proc} {len(self.configurations)} configurations")
+        supervisor = Supervisor(self.timeout)
+        bars = {}
         try:
-            with open(
-                os.path.join(self.script_dir, "config.json"), "r", encoding="utf-8"
-            ) as fl:
-                config = json.load(fl)
-        except FileNotFoundError as e:
-            print(f"config.json not found at {os.getcwd()}\nError: {e}")
+            for position, name in enumerate(self.configurations):
+                root = self.__build_root(name)
+                build_dir = os.path.join(root, "BUILD_DIR")
+                site = self.config_sites.get(name) if step == "configure" else None
+                if step == "configure":
+                    os.chmod(os.path.join(build_dir, "configure"), stat.S_IRWXU)
+                supervisor.start(
+                    name,
+                    command,
+                    os.path.join(root, log_name),
+                    os.path.join(root, log_name),
+                    cwd=build_dir,
+                    env={**env, "CONFIG_SITE": site} if site else env,
+                    pass_fds=jobserver.fds if jobserver else (),
+                )
+                bars[name] = tqdm(
+                    total=self.__estimate(f"{step}:{name}", default),
+                    desc=f"{proc} {name}",
+                    unit=" ln",
+                    unit_scale=True,
+                    position=position,
+                    leave=True,
+                )
+
+            # Redraws the bars of configurations whose logs have grown
+            durations = {}
+
+            def update():
+                for name, pbar in bars.items():
+                    if supervisor.lines[name] != pbar.n:
+                        pbar.n = supervisor.lines[name]
+                        pbar.refresh()
+                    if supervisor.processes[name].returncode is not None:
+                        durations.setdefault(name, time.monotonic() - start)
+
+            start = time.monotonic()
+            supervisor.wait(update)
+        finally:
+            if jobserver:
+                jobserver.stop()
+
+        for name, pbar in bars.items():
+            pbar.n = pbar.total = supervisor.lines[name]
+            pbar.close()
+        for name, process in supervisor.processes.items():
+            if process.returncode == 0:
+                self.__learn(f"{step}:{name}", bars[name].n, durations[name])
+                state = "Completed successfully."
+            elif supervisor.timed_out:
+                state = f"Timed out after {self.__format_seconds(self.timeout)}."
+            else:
+                state = f"Failed with return code {process.returncode}."
+            print(f"{proc} {name}: {state}")
+            if process.returncode:
+                self.__report_first_error(os.path.join(self.__build_root(name), log_name))
+        returncodes = [process.returncode for process in supervisor.processes.values()]
+
+        return max(returncodes, default=0)
+
+    def __build_root(self, name: str, root: str = None) -> str:
+        """Gets the build tree of a configuration
+
+        Args:
+            name (str): Configuration name
+            root (str, optional): Directory holding the build trees. Defaults to work_dir.
+
+        Returns:
+            str: Build tree path
+        """
+
+        return os.path.join(root or self.work_dir, "builds", name)
+
+    def __phase_shell(self) -> None:
+        """Configures the shell from the installation directory"""
+
+        os.chdir(self.__install_dir())
+        self.configure_shell()
+
+        return
+
+    def __phase_test(self) -> None:
+        """Tests the installation from the installation directory"""
+
+        os.chdir(self.__install_dir())
+        self.test_installation()
+
+        return
+
+    def __phase_benchmark(self) -> None:
+        """Times a few HEASoft tools and compares them with other build profiles
+
+        Each tool runs on a generated table after the shell sources the
+        initialization script, and the time the shell takes to do that alone
+        is subtracted. The fastest of the repeated runs counts. Times are kept
+        in the run history by host and build profile, so a build with another
+        profile on the same host shows the speedup.
+        """
+
+        installdir = self.__install_dir()
+        settings = self.tool_benchmark
+        tools = {
+            tool: command
+            for tool, command in settings["tools"].items()
+            if os.path.exists(os.path.join(installdir, "bin", tool))
+        }
+        if not tools:
+            print("Benchmark: no HEASoft tools to time")
+            return
+
+        env = os.environ.copy()
+        env["HEADAS"] = installdir
+        init = self.shell_src.format(os.path.join("$HEADAS", f"headas-init.{self.shell_ext}"))
+
+        # Generates the input table and model script in a directory removed afterwards
+        with tempfile.TemporaryDirectory(prefix="heainstaller-benchmark-") as workdir:
+            with open(os.path.join(workdir, "columns.txt"), "w", encoding="utf-8") as fl:
+                fl.write("X D\nY D\nCOUNTS J\n")
+            with open(os.path.join(workdir, "rows.txt"), "w", encoding="utf-8") as fl:
+                for row in range(int(settings["rows"])):
+                    fl.write(
+                        f"{(row * 7919) % 10007 / 13.0} {(row * 104729) % 7001 / 7.0} {row % 97}\n"
+                    )
+            with open(os.path.join(workdir, "model.xcm"), "w", encoding="utf-8") as fl:
+                fl.write(
+                    "query yes\ndummyrsp 0.1 100 100000 log\n"
+                    "model phabs*powerlaw & 1 & 2 & 1\nflux 0.1 10\nexit\n"
+                )
+
+            def timed(command: str) -> float:
+                start = time.monotonic()
+                with open(
+                    os.path.join(self.hea_dir, "installer.log"), "a", encoding="utf-8"
+                ) as log:
+                    result = subprocess.run(
+                        [os.environ.get("SHELL") or "/bin/sh", "-c", f"{init} && {command}"],
+                        cwd=workdir,
+                        env=env,
+                        stdin=subprocess.DEVNULL,
+                        stdout=log,
+                        stderr=log,
+                        check=False,
+                    )
+                return time.monotonic() - start if result.returncode == 0 else None
+
+            repeat = int(settings["repeat"])
+            overhead = min(timed("true") or 0 for _ in range(repeat))
+            results = {}
+            for tool, command in tqdm(
+                tools.items(), desc="Benchmarking", unit="tool", leave=False
+            ):
+                times = [timed(command) for _ in range(repeat)]
+                if None in times:
+                    print(f"Benchmark: {tool} failed, see installer.log")
+                    continue
+                results[tool] = round(max(0.0, min(times) - overhead), 3)
+
+        # Records the times by host and profile and compares with the other
+        # profiles. The host is identified by its CPU, not by the job count.
+        history = self.__read_json(self.history_file)
+        entry = history.setdefault(self.selection, {}).setdefault("benchmark", {})
+        host = f"{self.platform}-{self.architecture}-{cpu_model()}"
+        profiles = entry.setdefault(host, {})
+        for tool, seconds in results.items():
+            runs = profiles.setdefault(self.build_profile, {}).setdefault(tool, [])
+            runs[:] = (runs + [seconds])[-5:]
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.__write_json(self.history_file, history)
+
+        others = [name for name in profiles if name != self.build_profile]
+        print(f"\n{'Tool':<12}{self.build_profile:>14}" + "".join(f"{name:>14}" for name in others))
+        for tool, seconds in results.items():
+            line = f"{tool:<12}{self.__format_seconds(seconds):>14}"
+            for name in others:
+                runs = profiles[name].get(tool)
+                speedup = statistics.median(runs) / seconds if runs and seconds else None
+                line += f"{f'{speedup:.2f}x' if speedup else '-':>14}"
+            print(line)
+        if others:
+            print(f"Speedup of {self.build_profile} over the other profiles built on this host")
+
+        # Keeps the times with the build record of the installation
+        record_file = os.path.join(installdir, "build-profile.json")
+        record = self.__read_json(record_file)
+        if record:
+            record["benchmark"] = results
+            self.__write_json(record_file, record)
+
+        return
+
+    def __phase_outputs(self, name: str) -> dict:
+        """Gets attributes set by a phase that later phases rely on
+
+        Args:
+            name (str): Phase name
+
+        Returns:
+            dict: Attribute values to restore when the phase is skipped
+        """
+
+        if name == "download":
+            return {"download": self.download, "hea_file": self.hea_file}
+
+        return {}
+
+    def __restore_phase(self, name: str, outputs: dict) -> None:
+        """Restores attributes recorded by a skipped phase
+
+        Args:
+            name (str): Phase name
+            outputs (dict): Recorded attribute values
+        """
+
+        for attr, value in outputs.items():
+            setattr(self, attr, value)
+
+        return
+
+    def __tarball_identity(self) -> list:
+        """Identifies the tarball to extract without reading it
+
+        Returns:
+            list: Path, size and modification time of the tarball
+        """
+
+        file = self.tarball if self.download else self.hea_file
+        try:
+            info = os.stat(file)
+        except FileNotFoundError:
+            # A tarball removed by cleanup keeps the identity it was recorded with
+            meta = self.__read_json(f"{file}.json") if self.download else {}
+            return [file, meta["size"], meta["mtime_ns"]] if "size" in meta else [file]
+
+        return [file, info.st_size, info.st_mtime_ns]
+
+    def __source_dir(self, quiet: bool = False, root: str = None) -> str:
+        """Finds the extracted heasoft source directory
+
+        Args:
+            quiet (bool, optional): Returns None instead of exiting if missing. Defaults to False.
+            root (str, optional): Directory holding the source tree. Defaults to work_dir.
+
+        Returns:
+            str: Source directory path
+        """
+
+        try:
+            base = [
+                name
+                for name in glob.glob(
+                    os.path.join(root or self.work_dir, "heasoft-[0-9].[0-9][0-9]*")
+                )
+                if os.path.isdir(name)
+            ][-1]
+        except IndexError:
+            if quiet:
+                return None
+            print("\nHeasoft folder not found\nExiting ...")
+            sys.exit()
+
+        return base
+
+    def __extracted(self, quiet: bool = False) -> bool:
+        """Checks for the extracted source tree, or one consumed once its installation left scratch
+
+        Args:
+            quiet (bool, optional): Returns False instead of exiting if missing. Defaults to False.
+
+        Returns:
+            bool: True if the extraction is still in place or was consumed
+        """
+
+        if self.__read_json(self.scratch_file).get("consumed"):
+            return True
+
+        return bool(self.__source_dir(quiet))
+
+    def __install_dir(
+        self, quiet: bool = False, configuration: str = None, root: str = None
+    ) -> str:
+        """Finds the heasoft installation directory
+
+        With build configurations, the first configuration is the one
+        initialized from the shell unless another is given.
+
+        Args:
+            quiet (bool, optional): Returns None instead of exiting if missing. Defaults to False.
+            configuration (str, optional): Build configuration name. Defaults to None.
+            root (str, optional): Directory the installation is in. Defaults to hea_dir.
+
+        Returns:
+            str: Installation directory path
+        """
+
+        root = root or self.hea_dir
+        if self.configurations:
+            name = configuration or next(iter(self.configurations))
+            source = self.__build_root(name, root)
+        else:
+            source = self.__source_dir(quiet, root)
+        installs = glob.glob(os.path.join(source, f"{self.architecture}-*")) if source else []
+        if not installs:
+            if quiet:
+                return None
+            print("\nHeasoft installation folder not found\nExiting ...")
+            sys.exit()
+
+        return installs[0]
+
+    def __compiler_versions(self) -> dict:
+        """Gets the versions of the compilers that produce object code
+
+        Returns:
+            dict: First line of --version output by compiler flag, None if not found
+        """
+
+        versions = {}
+        for flag, compiler in zip(self.set_flags, self.compilers):
+            if flag not in self.cache_flags:
+                continue
+            path = shutil.which(compiler)
+            versions[flag] = None
+            if path:
+                result = subprocess.run(
+                    [path, "--version"], capture_output=True, text=True, check=False
+                )
+                versions[flag] = (result.stdout.splitlines() or [""])[0]
+
+        return versions
+
+    def __profile_flags(self) -> dict:
+        """Resolves the build profile for the compilers that will build heasoft
+
+        Each variable is taken from the profile entry of the compiler family,
+        gcc or clang, of the compiler it is passed to.
+
+        Returns:
+            dict: Variables to set, empty for the portable profile
+        """
+
+        profile = self.profiles[self.build_profile]
+        families = {
+            flag: "clang" if "clang" in (version or "").lower() else "gcc"
+            for flag, version in self.__compiler_versions().items()
+        }
+        cpu = self.cpu_flags.get(self.architecture, "")
+
+        flags = {}
+        for var, flag in self.profile_flags.items():
+            value = profile.get(families.get(flag), {}).get(var)
+            if value:
+                flags[var] = " ".join(value.format(cpu=cpu).split())
+
+        return flags
+
+    def __check_profile(self, flags: dict) -> list:
+        """Checks that the compilers build and link a trivial program with the profile flags
+
+        Args:
+            flags (dict): Variables set by the build profile
+
+        Returns:
+            list: Problems found, empty if the profile can be used
+        """
+
+        if not flags:
+            return []
+
+        errors = []
+        if "{cpu}" in str(self.profiles[self.build_profile]) and not self.cpu_flags.get(
+            self.architecture
+        ):
+            errors.append(f"no CPU tuning options known for {self.architecture}")
+        for var in ("AR", "RANLIB", "NM"):
+            if var in flags and not shutil.which(flags[var]):
+                errors.append(f"{flags[var]} not found")
+
+        # Compiles and links a program in each language with its flags
+        probes = (
+            ("CC", "CFLAGS", "c", "int main(void) { return 0; }\n"),
+            ("CXX", "CXXFLAGS", "c++", "int main() { return 0; }\n"),
+            ("FC", "FFLAGS", "f95", "program probe\nend program probe\n"),
+        )
+        compilers = dict(zip(self.set_flags, self.compilers))
+        with tempfile.TemporaryDirectory() as tmp:
+            for flag, var, language, source in probes:
+                compiler = shutil.which(compilers.get(flag, ""))
+                if not compiler or var not in flags:
+                    continue
+                result = subprocess.run(
+                    [
+                        compiler,
+                        *flags[var].split(),
+                        *flags.get("LDFLAGS", "").split(),
+                        "-x",
+                        language,
+                        "-",
+                        "-o",
+                        os.path.join(tmp, "probe"),
+                    ],
+                    input=source,
+                    capture_output=True,
+                    text=True,
+                    check=False,
+                )
+                if result.returncode:
+                    lines = result.stderr.strip().splitlines() or ["failed"]
+                    message = next((line for line in lines if "error" in line), lines[-1])
+                    errors.append(f"{os.path.basename(compiler)} rejects {flags[var]}: {message}")
+
+        return errors
+
+    def __check_artifact(self, manifest: dict) -> None:
+        """Checks that an artifact can run on this host, exiting if not
 
-        # Sets configuration variables
-        if self.platform in config.keys():
-            self.set_flags = config["set_flags"]
-            self.unset_flags = config["unset_flags"]
-            self.positive = config["positive_resp"]
-            self.negative = config["negative_resp"]
-            pacman_counter = 0
-            shell = os.path.basename(os.environ.get("SHELL", ""))
+        Args:
+            manifest (dict): Artifact manifest
+        """
 
-            # Checks for valid shell and sets shell configuration variables
-            if shell in config["shell"].keys():
-                self.def_shell = shell
-                self.shell_ext = config["shell"][shell]["extension"]
-                self.shell_config = config["shell"][shell]["config_file"]
-                self.shell_env = config["shell"][shell]["env_cmd"]
-                self.shell_alias = config["shell"][shell]["alias"]
-                self.shell_src = config["shell"][shell]["source"]
-            else:
-                print(
-                    "No supported shell found for running heasoft.\n"
-                    f"Supported shells: {config['shell'].keys()}\nHeasoft initialization"
-                    f"lines will not be present in {shell}. Please add them manually to"
-                    "a compatible shell"
+        errors = []
+        if manifest.get("format") != 1:
+            errors.append(f"unsupported artifact format {manifest.get('format')}")
+        for key in ("platform", "architecture"):
+            if manifest.get(key) != getattr(self, key):
+                errors.append(
+                    f"built for {key} {manifest.get(key)}, this host is {getattr(self, key)}"
                 )
 
-            # Gets necessary dependancy & package manager information
-            ops = config[self.platform]
-            self.compilers = ops["compilers"]
+        # Binaries run on the C library they were linked against or a newer one
+        libc, version = manifest.get("libc", ["", ""])
+        host_libc, host_version = platform.libc_ver()
+        numbers = lambda text: [int(part) for part in re.findall(r"\d+", text or "")]
+        if libc and (libc != host_libc or numbers(host_version) < numbers(version)):
+            errors.append(
+                f"built against {libc} {version}, this host has "
+                f"{host_libc or 'an unknown C library'} {host_version}"
+            )
+        if errors:
+            print("Artifact is not compatible with this host:")
+            for error in errors:
+                print(f"  {error}")
+            print("Exiting")
+            sys.exit()
 
-            # Checks for valid a package manager
-            for pacman in ops["package_manager"].keys():
-                if shutil.which(pacman):
-                    self.pm = pacman
-                    pacman_counter += 1
-                    break
-            if not pacman_counter:
+        # Compiler runtime libraries usually follow the compiler version
+        host = self.__compiler_versions()
+        for flag, version in manifest.get("compilers", {}).items():
+            if version != host.get(flag):
                 print(
-                    "No supported package managers found\n"
-                    f"Supported package managers: {ops['package-managers']}\nExiting..."
+                    f"Warning: artifact built with {flag} {version}, "
+                    f"this host has {host.get(flag) or 'none'}"
                 )
-                sys.exit()
 
-            # Sets package manager specific commands and dependency variables
-            pm = ops["package_manager"][self.pm]
-            self.initializer = pm.get("initializer")
-            self.pm_update = pm["update"].split()
-            self.pm_upgrade = pm["upgrade"].split()
-            self.pm_packages = pm["packages"]
-            self.pm_incmd = pm["install_cmd"].split()
-            self.pm_link = pm["link"]
+        # Natively tuned code may use instructions this CPU does not have
+        build = manifest.get("build") or {}
+        if build.get("flags") and build.get("cpu") != cpu_model():
+            print(
+                f"Warning: artifact built with the {build.get('profile')} profile for "
+                f"{build.get('cpu')}, this host has {cpu_model()}. Tools may stop with "
+                "illegal instruction errors"
+            )
+        print(f"Artifact components: {', '.join(manifest.get('components', []))}")
 
-            # Checks for an active python environment
-            if os.environ.get("CONDA_PREFIX"):
-                py_pm = ops["py_manager"]["conda"]
-            else:
-                py_pm = ops["py_manager"]["pip"]
+        return
 
-            # Loads python libraries and installation commands
-            self.py_lib = py_pm["libraries"]
-            self.py_incmd = py_pm["install_cmd"].split()
-        else:
-            print(f"Incompatible OS: {self.platform}\nExiting...")
-            sys.exit()
+    def __relocate(self, installdir: str, old: str, new: str) -> None:
+        """Rewrites references to the build directory in an unpacked installation
 
-        # Sets dwonload url
-        url = "https://heasarc.gsfc.nasa.gov/cgi-bin/Tools/tarit/tarit.pl?mode=download&arch=src&src_{}=Y&\
-        src_other_specify="
-        self.url = url.format(self.pm_link)
+        Args:
+            installdir (str): Installation directory path
+            old (str): hea_dir the artifact was built in
+            new (str): hea_dir the artifact was unpacked in
+        """
 
-        # Loads user configuration
-        with open(
-            os.path.join(self.script_dir, "user.json"), "r", encoding="utf-8"
-        ) as fl:
-            u_config = json.load(fl)
+        files = links = 0
+        for root, dirs, names in os.walk(installdir):
+            for name in dirs + names:
+                path = os.path.join(root, name)
+                if os.path.islink(path):
+                    target = os.readlink(path)
+                    if target.startswith(old):
+                        os.remove(path)
+                        os.symlink(new + target[len(old) :], path)
+                        links += 1
+                    continue
+                if name in dirs or not os.path.isfile(path):
+                    continue
+
+                # Leaves compiled files alone, they locate HEASoft through HEADAS
+                with open(path, "rb") as fl:
+                    data = fl.read(8192)
+                    if b"\0" in data:
+                        continue
+                    data += fl.read()
+                if old.encode() not in data:
+                    continue
+                part = f"{path}.part"
+                with open(part, "wb") as fl:
+                    fl.write(data.replace(old.encode(), new.encode()))
+                shutil.copystat(path, part)
+                os.replace(part, path)
+                files += 1
+        print(f"Relocated {old} to {new}: {files} files and {links} links rewritten")
 
-        # Sets user configuration
-        for param in ("mission", "general", "xanadu", "xstar"):
-            keys = self.__get_keys(u_config[param], "yes")
-            if keys:
-                for key in keys:
-                    self.url += f"&{param}={config[param][key]}"
+        return
 
-        # Sets some other necessary variables
-        self.home_dir = os.path.expandvars("$HOME")
-        self.hea_dir = os.path.join(self.home_dir, ".local", "bin", "heasoft")
-        self.download_dir = os.path.join(self.home_dir, ".cache")
-        self.download = True
-        self.total_size = 4_333_973_837
-        self.hea_file = "heasoft.tar.gz"
+    @staticmethod
+    def __tree_size(path: str) -> int:
+        """Gets the size of the regular files under a path
 
-        # Makes heasoft installation directory if not present
-        os.makedirs(self.hea_dir, exist_ok=True)
-        os.chdir(self.hea_dir)
+        Args:
+            path (str): File or directory path
 
-        # Initializes log files
-        for file in (
-            "installer.log",
-            "error.log",
-            "config.log",
-            "build.log",
-            "config.log",
-        ):
-            with open(file, "w", encoding="utf-8") as f:
-                f.write("Initializing")
+        Returns:
+            int: Size in bytes
+        """
 
-        print(f"OS: {self.platform}")
-        print(f"Kernel version: {self.version}")
-        print(f"Architecture: {self.architecture}\n")
+        if not os.path.isdir(path):
+            return os.path.getsize(path)
+        size = 0
+        for root, _, files in os.walk(path):
+            for name in files:
+                info = os.lstat(os.path.join(root, name))
+                if stat.S_ISREG(info.st_mode):
+                    size += info.st_size
 
-    def update_packages(self) -> None:
-        """Updates package manager and system packages"""
+        return size
 
-        # Updates package manager
+    def __get_keys(self, _dict: dict, val: str) -> list:
+        """Gets dictionaty keys containing a particular value
 
-        self.__run_pipeloader(
-            "installer.log",
-            f"Updating {self.pm}",
-            *self.pm_update,
-        )
+        Args:
+            _dict (dict): Dictionary to be checked
+            val (str): value to be checked for
 
-        # Updates system packages
-        self.__run_pipeloader(
-            "installer.log",
-            "Updating system packages",
-            *self.pm_upgrade,
-        )
+        Returns:
+            list: Keys containing value
+        """
+        keys = [key for key, value in _dict.items() if value == val]
 
-        return
+        return keys
 
-    def install_dependencies(self) -> None:
-        """Installs dependencies"""
+    def __write_script(self, file: str, ins_dir: str) -> None:
+        """Writes configuration information to non-login/login shell configuration file
 
-        # Runs extra setup commands
-        if self.initializer:
-            self.__run_pipeloader(
-                "installer.log",
-                "Installing extra dependencies",
-                *self.initializer.split(),
-                stdout=sys.stdout,
-            )
+        Args:
+            file (str): file path
+            ins_dir (str): heasoft installation path containing headas-init script
+        """
 
-        # Installs system package dependencies
-        for package in self.pm_packages:
-            self.__run_pipeloader(
-                "installer.log",
-                f"Installing {package.split()[-1]}",
-                *self.pm_incmd,
-                *package.split(),
-            )
+        script_dir = os.path.join("$HEADAS", f"headas-init.{self.shell_ext}")
 
-        # Install python library dependencies
-        self.py_incmd = os.environ.get("PIP_CMD", " ".join(self.py_incmd))
-        for py_lib in self.py_lib:
-            self.__run_pipeloader(
-                "installer.log",
-                f"Installing {py_lib.split()[0]}",
-                *self.py_incmd.split(),
-                *py_lib.split(),
-            )
-        print("\nAll dependencies installed")
+        # headas-init file read command
+        readfl = self.shell_src.format(script_dir)
+
+        # Set heainit command
+        cmd = self.shell_alias.format(readfl)
+
+        # Configures shell if file is found
+        try:
+            with open(file, "a", encoding="utf-8") as script:
+                script.write("\n\n#heasoft initialization\n")
+                script.write(f"{self.shell_env}\n".format(ins_dir))
+                script.write(f"{cmd}\n")
+        except FileNotFoundError as e:
+            print(f"Unable to find {file}:\n{e}")
 
         return
 
-    def config_environ(self) -> None:
-        """Sets environment variables required for installation"""
+    def __download_native(self, file: str, total: int) -> int:
+        """Downloads heasoft tarball with the built-in segmented downloader
 
-        # Sets compiler flags
-        sys.stdout.write("Configuring environment")
-        for flag, compiler in zip(self.set_flags, self.compilers):
-            os.environ[flag] = shutil.which(compiler)
-            if not os.environ[flag]:
-                print(f"{compiler} compiler not found\nExiting")
-                sys.exit()
+        Args:
+            file (str): Destination file path
+            total (int): Expected size in bytes
 
-        # Unsets library flags
-        for u_flag in self.unset_flags:
-            os.environ.pop(u_flag, None)
-        path = os.path.expandvars("$PATH")
+        Returns:
+            int: 0 on success, 1 on failure
+        """
 
-        # Updates path
-        os.environ["PATH"] = f"/usr/bin:{path}"
-        sys.stdout.write("\rConfiguring environment: Completed successfully\n")
+        downloader = SegmentedDownloader(self.url, file, connections=self.connections)
+        with tqdm(
+            total=total,
+            desc="Downloading",
+            unit="B",
+            leave=True,
+            unit_scale=True,
+        ) as pbar:
 
-        return
+            def progress(done: int, total: int) -> None:
+                if total and pbar.total != total:
+                    pbar.total = total
+                pbar.update(done - pbar.n)
 
-    def check_download(self) -> None:
-        """Checks if heasoft is already downloaded"""
+            try:
+                downloader.download(progress)
+            except (OSError, http.client.HTTPException) as e:
+                print(f"\nDownload: Failed with error {e}")
+                self.__write_errlog(e)
+                return 1
+        print("\nDownload: Completed successfully.")
 
-        # Checks for valid user response
-        while True:
-            response = (
-                input("\nDo you already have heasoft downloaded? [y/n]: ")
-                .strip()
-                .lower()
+        return 0
+
+    def __estimate(self, phase: str, default: int, quiet: bool = False) -> int:
+        """Predicts the progress total of a phase from earlier runs of the same selection
+
+        Args:
+            phase (str): Phase name
+            default (int): Total used when there is no history
+            quiet (bool, optional): Does not print the expected duration. Defaults to False.
+
+        Returns:
+            int: Predicted total
+        """
+
+        history = self.__read_json(self.history_file)
+        entry = history.get(self.selection, {}).get(phase, {})
+        durations = entry.get("durations", {}).get(self.profile)
+        if durations and not quiet:
+            print(
+                "Previous runs on this host took about "
+                f"{tqdm.format_interval(statistics.median(durations))}"
             )
-            if response in self.positive:
-                self.download = False
+        totals = entry.get("totals")
 
-                # Checks for correct downloaded file path and copies file to heasoft installation directory if found
-                while True:
-                    file = input(
-                        "Enter absolute path to the download heasoft file: "
-                    ).strip()
-                    file = glob.glob(os.path.expanduser(os.path.expandvars(file)))[-1]
-                    if os.path.exists(file):
-                        self.hea_file = file
-                        break
-                    else:
-                        print("Invalid path. Please try again.\n")
+        return int(statistics.median(totals)) if totals else default
 
-                break
-            elif response in self.negative:
-                break
-            else:
-                print("Invalid input. Please try again.\n")
+    def __learn(self, phase: str, total: int, duration: float = None) -> None:
+        """Records the progress total and duration of a successful phase
+
+        Totals depend only on the component selection, durations also on the
+        host profile. Durations of a phase that ran alongside others are not
+        recorded, since sharing the machine slowed it down.
+
+        Args:
+            phase (str): Phase name
+            total (int): Final progress count
+            duration (float, optional): Duration in seconds, None to record only the total. Defaults to None.
+        """
+
+        history = self.__read_json(self.history_file)
+        entry = history.setdefault(self.selection, {}).setdefault(phase, {})
+        entry["totals"] = (entry.get("totals", []) + [int(total)])[-5:]
+        if duration is not None and PhaseOutput.phase.get() not in self.concurrent:
+            durations = entry.setdefault("durations", {})
+            durations[self.profile] = (
+                durations.get(self.profile, []) + [round(duration, 1)]
+            )[-5:]
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.__write_json(self.history_file, history)
 
         return
 
-    def download_heasoft(self) -> None:
-        """Downloads heasoft tarball"""
+    def __make_progress(self, phase: str, total: int) -> MakeProgress:
+        """Sets up component progress for a make step
 
-        if self.download:
-            os.makedirs(self.download_dir, exist_ok=True)
-            
-            # Checks if file already exists
-            file = self.hea_file
-            if os.path.exists(os.path.join(self.download_dir, file)):
-                os.remove(os.path.join(self.download_dir, file))
+        Expected lines per component come from the last runs of the same
+        selection. Without history, the expected total is shared out by the
+        number of source files in each component.
 
-            # Downloads file
+        Args:
+            phase (str): compile or install
+            total (int): Expected lines of the whole step
+
+        Returns:
+            MakeProgress: Progress parser for the step
+        """
+
+        source = self.__source_dir()
+        history = self.__read_json(self.history_file).get(self.selection, {})
+        prefix = f"{phase}/"
+        expected = {
+            key[len(prefix) :]: int(statistics.median(entry["totals"]))
+            for key, entry in history.items()
+            if key.startswith(prefix) and entry.get("totals")
+        }
+        if not expected:
+            files = MakeProgress.count_sources(source)
+            count = sum(files.values()) or 1
+            expected = {name: total * n // count for name, n in files.items() if n}
+
+        return MakeProgress(source, expected)
+
+    def __learn_components(self, phase: str, progress: MakeProgress) -> None:
+        """Records lines written per component and prints the slowest components
+
+        Args:
+            phase (str): compile or install
+            progress (MakeProgress): Progress of the finished step
+        """
+
+        for component, lines in progress.lines.items():
+            self.__learn(f"{phase}/{component}", lines)
+
+        slowest = progress.slowest(5)
+        if slowest:
             print(
-                "Proceeding to download heasoft\nThis might take more than 2 hours..."
+                "Slowest components: "
+                + ", ".join(
+                    f"{component} {self.__format_seconds(seconds)}"
+                    for component, seconds in slowest
+                )
             )
-            self.__run_pipeline(
-                self.total_size,
-                "installer.log",
-                os.path.join(self.download_dir, file),
-                "Downloading",
-                1,
-                "Download",
-                "file_size",
-                "B",
-                "aria2c",
-                "-d",
-                self.download_dir,
-                "-q",
-                "--log-level=error",
-                "-x",
-                "16",
-                "-s",
-                "16",
-                "-c",
-                self.url,
-                "-o",
-                file,
+        for component, seconds in progress.slowest(len(progress.elapsed)):
+            self.__write_outlog(
+                f"{phase} {component}: {self.__format_seconds(seconds)}, "
+                f"{progress.lines[component]} lines, {progress.compiled[component]} files compiled"
             )
 
         return
 
-    def extract_targz(self, file: str) -> None:
-        """Extracts tarball
+    def __remote_validators(self) -> dict:
+        """Asks the server for the size, ETag and Last-Modified of the tarball
 
-        Args:
-            file (str): file path
+        Returns:
+            dict: Validators sent by the server, empty if it cannot be reached
         """
 
+        request = urllib.request.Request(self.url, headers={"Range": "bytes=0-0"})
         try:
-            print("Initializing extraction")
-            with tarfile.open(file) as f:
-                members = f.getmembers()
-                total = len(members)
+            with urllib.request.urlopen(request, timeout=30) as response:
+                return self.__validators(response)
+        except (OSError, http.client.HTTPException, ValueError):
+            return {}
 
-                # Progress bar
-                with tqdm(
-                    total=total, desc="Extracting", unit=" files", leave=True
-                ) as pbar:
-                    for member in members:
-                        try:
-                            f.extract(member, filter="fully_trusted")
-                        except TypeError:
-                            f.extract(member)
-                        pbar.update(1)
-        except FileNotFoundError as e:
-            print(f"Error encountered while extracting files: {e}")
-            sys.exit()
+    @staticmethod
+    def __validators(response) -> dict:
+        """Reads the size, ETag and Last-Modified of the tarball from a response
 
-        return
+        Args:
+            response (http.client.HTTPResponse): Response to a request for the tarball
+
+        Returns:
+            dict: Validators sent by the server
+        """
 
-    def configure(self) -> None:
-        """Configures heasoft installation"""
+        total = response.headers.get("Content-Range", "").rpartition("/")[2]
+        length = response.headers.get("Content-Length")
+        if response.status == 206 and total.isdigit():
+            size = int(total)
+        else:
+            size = int(length) if response.status == 200 and length else None
 
-        # Changes file mode to read, write and execute
-        os.chmod("configure", stat.S_IRWXU)
+        return {
+            "size": size,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+        }
+
+    def __cached_tarball(self) -> bool:
+        """Checks for a complete cached tarball of the selected components
+
+        The file is trusted when its size and modification time still match
+        the values recorded with its digest, so it is never re-read. The
+        latest release is also revalidated against the server's ETag,
+        Last-Modified and size.
+
+        Returns:
+            bool: True if the cached tarball can be used
+        """
 
-        # Runs configuration
-        print("Configuring\nThis will take a few minutes ...")
-        config_file = os.path.join(self.hea_dir, "config.log")
-        self.__run_pipeline(
-            3_146,
-            config_file,
-            config_file,
-            "Configuring",
-            0.1,
-            "Configuration",
-            "line_number",
-            " ln",
-            "./configure",
-            "--without-lynx",
-        )
+        meta = self.__read_json(f"{self.tarball}.json")
+        try:
+            info = os.stat(self.tarball)
+        except FileNotFoundError:
+            return False
+        if (meta.get("size"), meta.get("mtime_ns")) != (info.st_size, info.st_mtime_ns):
+            print("Cached heasoft tarball changed since it was recorded. Downloading again")
+            self.__remove_tarball(self.tarball)
+            return False
+
+        # The latest release is published under a fixed URL, so the server
+        # decides whether the cached copy is still current
+        if self.hea_version == "latest":
+            remote = self.__remote_validators()
+            if not remote:
+                print("Server unreachable. Using cached heasoft tarball without revalidation")
+            elif any(
+                remote.get(key) not in (None, meta.get("validators", {}).get(key))
+                for key in ("size", "etag", "last_modified")
+            ):
+                print("A newer heasoft release is available. Downloading again")
+                self.__remove_tarball(self.tarball)
+                return False
+            self.validators = remote
+
+        meta["last_used"] = time.time()
+        self.__write_json(f"{self.tarball}.json", meta)
+
+        return True
+
+    def __record_tarball(self, digest: str = None) -> bool:
+        """Records a cached tarball, verifying its digest if one is already known
+
+        The server validators kept are those of the response the tarball was
+        downloaded or revalidated with, so no further request is made.
 
-        return
+        Args:
+            digest (str, optional): SHA-256 digest computed while streaming. Defaults to None.
 
-    def compile(self) -> None:
-        """Compiles necessary files required for instaallation"""
+        Returns:
+            bool: False if the tarball was corrupt and has been removed
+        """
 
-        print("Compiling\nThis may take a few hours ...")
-        build_file = os.path.join(self.hea_dir, "build.log")
-        self.__run_pipeline(
-            78_975,
-            build_file,
-            build_file,
-            "Compiling",
-            2,
-            "Compilation",
-            "line_number",
-            " ln",
-            "make",
+        meta = self.__read_json(f"{self.tarball}.json")
+        if digest and meta.get("sha256") not in (None, digest):
+            print("Cached heasoft tarball is corrupt and has been removed")
+            self.__remove_tarball(self.tarball)
+            return False
+
+        info = os.stat(self.tarball)
+        meta.update(
+            url=self.url,
+            version=self.hea_version,
+            size=info.st_size,
+            mtime_ns=info.st_mtime_ns,
+            sha256=digest or meta.get("sha256"),
+            validators=(
+                self.validators or meta.get("validators", {})
+                if self.hea_version == "latest"
+                else {}
+            ),
+            created=meta.get("created", time.time()),
+            last_used=time.time(),
         )
+        self.__write_json(f"{self.tarball}.json", meta)
+        self.__evict_tarballs()
 
-        return
+        return True
 
-    def install(self) -> None:
-        """Installs compiled file"""
+    def __evict_tarballs(self) -> None:
+        """Removes cached tarballs unused for too long, then the least recently used ones above the size limit"""
 
-        print("Installing\nThis may take an hour ...")
-        ins_file = os.path.join(self.hea_dir, "install.log")
-        self.__run_pipeline(
-            64_075,
-            ins_file,
-            ins_file,
-            "Installing",
-            0.5,
-            "Installation",
-            "line_number",
-            " ln",
-            "make",
-            "install",
-        )
+        entries = []
+        for meta_file in glob.glob(os.path.join(os.path.dirname(self.tarball), "*.json")):
+            tarball = meta_file[: -len(".json")]
+            size = sum(
+                os.path.getsize(path)
+                for path in glob.glob(f"{glob.escape(tarball)}*")
+                if os.path.isfile(path)
+            )
+            last_used = self.__read_json(meta_file).get("last_used", 0)
+            entries.append((last_used, size, tarball))
+
+        # Keeps the current selection and removes the oldest entries first
+        total = sum(size for _, size, _ in entries)
+        freed = 0
+        for last_used, size, tarball in sorted(entries):
+            if tarball == self.tarball:
+                continue
+            if time.time() - last_used > self.cache_age or total > self.cache_size:
+                self.__remove_tarball(tarball)
+                total -= size
+                freed += size
+        if freed:
+            self.__write_outlog(f"Tarball cache: evicted {freed / 2**30:.2f} GiB")
 
         return
 
-    def configure_shell(self) -> None:
-        """Configures non-login/login shell to initialize with heainit command"""
+    def __remove_tarball(self, tarball: str) -> None:
+        """Removes a cached tarball with its partial download and metadata
 
-        installdir = os.getcwd()
-        config = 0
+        Args:
+            tarball (str): Cached tarball path
+        """
 
-        # Loops through each specified shell initialization file
-        for conf in self.shell_config:
-            path = os.path.expandvars(os.path.join(*conf.split()))
+        for path in glob.glob(f"{glob.escape(tarball)}*"):
+            os.remove(path)
 
-            # Checks if shell configuration file is present and writes to file if present
-            if os.path.exists(path):
-                self.__write_script(path, installdir)
-                config += 1
-                break
+        return
 
-        # Creates login configuration file if not present and writes there
-        if not config:
-            path = os.path.expandvars(os.path.join(*self.shell_config[-1].split()))
-            os.makedirs(os.path.dirname(path), exist_ok=True)
-            self.__write_script(path, installdir)
-            print(
-                f"\n{path} was not found. "
-                f"{os.path.basename(path)} has been created and can be "
-                f"found at {os.path.dirname(path)}. Make sure that {os.path.basename(path)} "
-                f"is read by {self.def_shell} before execution"
-            )
+    @staticmethod
+    def __read_json(file: str) -> dict:
+        """Reads a JSON state file
 
-        return
+        Args:
+            file (str): file path
 
-    def test_installation(self) -> None:
-        """Tests the successful installation of heasoft"""
+        Returns:
+            dict: File contents, empty if missing or unreadable
+        """
 
-        # Gets installation directory
-        installdir = os.getcwd()
-        if not os.path.exists(
-            os.path.join(installdir, f"headas-init.{self.shell_ext}")
-        ):
-            print("Heasoft installation unsuccessful!")
-            sys.exit()
+        try:
+            with open(file, "r", encoding="utf-8") as fl:
+                return json.load(fl)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
 
-        # Sets HEADAS environment variable
-        os.environ["HEADAS"] = f"{installdir}"
+    @staticmethod
+    def __write_json(file: str, data: dict) -> None:
+        """Atomically writes a JSON state file
 
-        # Sets heasoft initialization file directory
-        script_dir = os.path.join("$HEADAS", f"headas-init.{self.shell_ext}")
-        readfl = self.shell_src.format(script_dir)
+        Args:
+            file (str): file path
+            data (dict): Data to write
+        """
 
-        # Runs fversion
-        print("Heasoft version: ", end="", flush=True)
-        self.__run_subprocess(
-            f'$SHELL -i -c "{readfl} && fversion"', stdout=sys.stdout, shell=True
-        )
+        with open(f"{file}.tmp", "w", encoding="utf-8") as fl:
+            json.dump(data, fl, indent=2)
+        os.replace(f"{file}.tmp", file)
 
         return
 
-    def run(self) -> None:
-        """Runs setup"""
-            
-        os.chdir(self.hea_dir)
+    def __installed_packages(self) -> set:
+        """Asks the package manager once for the names of installed packages
 
-        # Runs instructions
-        self.update_packages()
-        self.install_dependencies()
-        self.config_environ()
-        self.check_download()
-        self.download_heasoft()
-        download_file = os.path.join(self.home_dir, ".cache", self.hea_file)
-        if not self.download:
-            download_file = os.path.join(self.hea_file)
-            
-        self.extract_targz(download_file)
+        Virtual package names and aliases provided by installed packages are
+        included when the package manager can list them.
 
-        # Checks for heasoft download directory
-        try:
-            base = [
-                name
-                for name in glob.glob("heasoft-[0-9].[0-9][0-9]*")
-                if os.path.isdir(name)
-            ][-1]
-        except IndexError:
-            print("\nHeasoft folder not found\nExiting ...")
-            sys.exit()
+        Returns:
+            set: Installed package names, empty if the package manager cannot be queried
+        """
 
-        # Changes to heasoft build directory
-        os.chdir(os.path.join(base, "BUILD_DIR"))
-        self.configure()
-        self.compile()
-        self.install()
+        if not self.pm_query:
+            return set()
 
-        # Changes to heasoft installation directory
-        os.chdir(os.path.dirname(os.getcwd()))
-        (install_dir,) = glob.glob(f"{self.architecture}-*")
-        os.chdir(install_dir)
-        self.configure_shell()
-        self.test_installation()
+        installed = set(self.__query_names(self.pm_query["cmd"], self.pm_query["pattern"]))
+        provides = self.pm_query.get("provides")
+        if provides:
+            for value in self.__query_names(provides["cmd"], provides["pattern"]):
+                installed.update(
+                    name for name in re.split(r"[\s,\"\[\]=<>()]+", value) if name
+                )
 
-        return
+        return installed
 
-    def __get_keys(self, _dict: dict, val: str) -> list:
-        """Gets dictionaty keys containing a particular value
+    def __py_installed_packages(self) -> set:
+        """Asks the target python environment for the names of installed libraries
 
-        Args:
-            _dict (dict): Dictionary to be checked
-            val (str): value to be checked for
+        The listing command is derived from the install command, so an
+        interpreter or environment selected through PIP_CMD is the one queried.
 
         Returns:
-            list: Keys containing value
+            set: Normalized distribution names, empty if the environment cannot be queried
         """
-        keys = [key for key, value in _dict.items() if value == val]
 
-        return keys
+        if not self.py_query:
+            return set()
 
-    def __write_script(self, file: str, ins_dir: str) -> None:
-        """Writes configuration information to non-login/login shell configuration file
+        words = self.py_incmd.split()
+        if words[:1] == ["sudo"]:
+            words = words[1:]
+        if "install" in words:
+            words = words[: words.index("install")]
+        names = self.__query_names(
+            " ".join(words + self.py_query["args"].split()), self.py_query["pattern"]
+        )
+
+        return {re.sub(r"[-_.]+", "-", name).lower() for name in names}
+
+    @staticmethod
+    def __query_names(cmd: str, pattern: str) -> list:
+        """Runs a listing command and collects the first group of each match
 
         Args:
-            file (str): file path
-            ins_dir (str): heasoft installation path containing headas-init script
+            cmd (str): Command to run
+            pattern (str): Regular expression matched against each line
+
+        Returns:
+            list: Matched values, empty if the command cannot be run
         """
 
-        script_dir = os.path.join("$HEADAS", f"headas-init.{self.shell_ext}")
+        try:
+            result = subprocess.run(
+                cmd.split(), capture_output=True, text=True, check=False
+            )
+        except OSError:
+            return []
 
-        # headas-init file read command
-        readfl = self.shell_src.format(script_dir)
+        return [
+            match.group(1)
+            for match in re.finditer(pattern, result.stdout, re.MULTILINE)
+        ]
 
-        # Set heainit command
-        cmd = self.shell_alias.format(readfl)
+    def __report_ccache(self) -> None:
+        """Prints compiler cache hit and miss statistics for this run"""
+
+        if not self.ccache:
+            return
 
-        # Configures shell if file is found
         try:
-            with open(file, "a", encoding="utf-8") as script:
-                script.write("\n\n#heasoft initialization\n")
-                script.write(f"{self.shell_env}\n".format(ins_dir))
-                script.write(f"{cmd}\n")
-        except FileNotFoundError as e:
-            print(f"Unable to find {file}:\n{e}")
+            result = subprocess.run(
+                [self.ccache, "--print-stats"], capture_output=True, text=True, check=True
+            )
+        except (OSError, subprocess.CalledProcessError):
+            # Prints human readable statistics on ccache < 3.7
+            self.__run_subprocess(self.ccache, "--show-stats", stdout=sys.stdout)
+            return
+
+        stats = dict(
+            line.split("\t", 1) for line in result.stdout.splitlines() if "\t" in line
+        )
+        # Counter names are cache_hit_direct and cache_hit_preprocessed on ccache 3.x
+        hits = sum(
+            int(stats.get(key, 0))
+            for key in (
+                "direct_cache_hit",
+                "preprocessed_cache_hit",
+                "cache_hit_direct",
+                "cache_hit_preprocessed",
+            )
+        )
+        misses = int(stats.get("cache_miss", 0))
+        rate = 100 * hits / (hits + misses) if hits + misses else 0
+        summary = (
+            f"Compiler cache: {hits} hits, {misses} misses ({rate:.1f}% hit rate), "
+            f"{int(stats.get('cache_size_kibibyte', 0)) / 2**20:.2f} GiB of "
+            f"{self.ccache_size} used at {self.ccache_dir}"
+        )
+        print(summary)
+        self.__write_outlog(summary)
 
         return
 
     def __run_subprocess(self, *args, **kwargs) -> None:
         """Runs a subprocess with exception handelling and logging"""
 
+        start = time.monotonic()
         try:
-            with open("installer.log", "a", encoding="utf-8") as outfile:
-                with open("error.log", "a", encoding="utf-8") as errfile:
+            with open(
+                os.path.join(self.hea_dir, "installer.log"), "a", encoding="utf-8"
+            ) as outfile:
+                with open(
+                    os.path.join(self.hea_dir, "error.log"), "a", encoding="utf-8"
+                ) as errfile:
                     kwargs.setdefault("stdout", outfile)
                     kwargs.setdefault("stderr", errfile)
-                    kwargs.setdefault("text", True)
-                    result = subprocess.run(args, **kwargs, check=True)
-            if not result.returncode == 0:
-                print(f"Error executing {args}: {result.stderr}")
-                sys.exit()
+                    supervisor = Supervisor(self.timeout)
+                    process = supervisor.start(None, args, **kwargs)
+                    supervisor.wait()
+            self.__record_command(args, start, supervisor)
+            if process.returncode != 0:
+                raise subprocess.CalledProcessError(process.returncode, args)
         except Exception as e:
             print(f"An error occurred: {e}")
             self.__write_errlog(e)
@@ -615,7 +5140,7 @@ class Heainstall:
         unit: str,
         *args,
         **kwargs,
-    ) -> None:
+    ) -> int:
         """Runs a subprocess with progress bar
 
         Args:
@@ -625,47 +5150,185 @@ class Heainstall:
             proc (str): Process description
             update_diff (float): Progress bar update interval
             message (str): Success message
-            loader (str): Progress bar configuraton. Can be line_number/file_size
+            loader (str): Progress bar configuraton. Can be line_number/file_size/make
             unit (str): Progress unit
+            progress (MakeProgress, optional): Parses make output for the make loader. Defaults to None.
 
         Returns:
-            None: None
+            int: Process return code
         """
 
         processes = {
             "line_number": self.__track_lines,
             "file_size": self.__track_download,
+            "make": self.__track_make,
         }
+        progress = kwargs.pop("progress", None)
+        output_file = os.path.join(self.hea_dir, output_file)
         error_file = os.path.join(self.hea_dir, "error.log")
 
-        # Runs process with logging
-        with open(output_file, "a", encoding="utf-8") as out_file:
-            with open(error_file, "a", encoding="utf-8") as err_file:
-                kwargs.setdefault("stdout", out_file)
-                kwargs.setdefault("stderr", err_file)
-                kwargs.setdefault("text", True)
-                process = subprocess.Popen(args, **kwargs)
-
-        # Runs progress bar while process runs
+        # Compressed build logs keep stderr in order with stdout
+        if output_file.endswith(".gz"):
+            error_file = output_file
+
+        # Runs process with logging, waking on output and exit
+        begin = time.monotonic()
+        supervisor = Supervisor(self.timeout)
+        process = supervisor.start(
+            None,
+            args,
+            output_file,
+            error_file,
+            on_output=progress and progress.feed,
+            **kwargs,
+        )
+        start = time.monotonic()
+        status = tqdm(bar_format="{desc}", position=1, leave=False) if progress else None
         with tqdm(
             total=total, desc=proc, unit=unit, leave=True, unit_scale=True
         ) as pbar:
-            while process.poll() is None:
-                processes.get(loader)(file, pbar)
-                time.sleep(update_diff)
-            processes.get(loader)(file, pbar, finished=True)
-
-        process.communicate()
+            track = lambda **kw: processes.get(loader)(
+                file,
+                pbar,
+                lines=supervisor.lines[None],
+                progress=progress,
+                status=status,
+                **kw,
+            )
+            supervisor.wait(track, update_diff if loader != "line_number" else None)
+            track(finished=True)
+        if status is not None:
+            status.close()
+        self.last_progress = (pbar.n, time.monotonic() - start)
+        self.__record_command(args, begin, supervisor)
 
         # Checks for process success
         if process.returncode == 0:
             print(f"\n{message}: Completed successfully.")
+        elif supervisor.timed_out:
+            print(f"\n{message}: Timed out after {self.__format_seconds(self.timeout)}.")
         else:
             print(f"\n{message}: Failed with return code {process.returncode}.")
+        if process.returncode and error_file == output_file:
+            self.__report_first_error(output_file)
+
+        return process.returncode
+
+    def __report_first_error(self, log: str, context: int = 5) -> None:
+        """Prints the first compiler, linker or make error of the last command in a build log
+
+        Only the chunks written by the last command are decompressed, one
+        at a time, and only chunks containing an error are split into lines.
+
+        Args:
+            log (str): ChunkedLog file path
+            context (int, optional): Lines printed before and after the error. Defaults to 5.
+        """
+
+        sections = ChunkedLog.read_index(log)["sections"]
+        start = sections[-1]["chunk"] if sections else 0
+        before = collections.deque(maxlen=context)
+        after, found, directory = [], None, None
+        try:
+            for first, data in ChunkedLog.chunks(log, start):
+                if found is None and not self.errors.search(data):
+                    before.extend(data.rstrip(b"\n").rsplit(b"\n", context)[-context:])
+                    entered = list(ChunkedLog.entering.finditer(data))
+                    directory = entered[-1].group(1) if entered else directory
+                    continue
+                for number, line in enumerate(data.splitlines(), first + 1):
+                    if found is not None:
+                        after.append(line)
+                        if len(after) == context:
+                            break
+                    elif self.errors.search(line):
+                        found = number, line
+                    else:
+                        before.append(line)
+                        entered = ChunkedLog.entering.search(line)
+                        directory = entered.group(1) if entered else directory
+                if len(after) == context:
+                    break
+        except OSError:
+            return
+        if found is None:
+            return
+
+        number, line = found
+        where = f" in {directory.decode(errors='replace')}" if directory else ""
+        print(f"First error at {os.path.basename(log)} line {number}{where}:")
+        for text, marker in (
+            *((text, " ") for text in before),
+            (line, ">"),
+            *((text, " ") for text in after),
+        ):
+            print(f"{marker} {text.decode(errors='replace')}")
+        print(f"Full log: zless {log}")
 
         return
 
-    def __run_pipeloader(self, output_file: str, message: str, *args, **kwargs) -> None:
+    def __run_make(
+        self,
+        total: int,
+        output_file: str,
+        proc: str,
+        update_diff: float,
+        message: str,
+        *targets,
+        progress: MakeProgress = None,
+    ) -> int:
+        """Runs make in parallel with a progress bar
+
+        Args:
+            total (int): Expected number of log lines
+            output_file (str): Path to log file
+            proc (str): Process description
+            update_diff (float): Progress bar update interval
+            message (str): Success message
+            progress (MakeProgress, optional): Follows progress by component. Defaults to None.
+
+        Returns:
+            int: make return code
+        """
+
+        env = os.environ.copy()
+        jobserver = JobServer(
+            self.jobs,
+            self.memory_per_job,
+            self.max_load,
+            adaptive=self.adaptive,
+            log=self.__write_outlog,
+        )
+        make_args = jobserver.make_args(env)
+        mode = "adaptive" if jobserver.adaptive else "fixed"
+        info = f"{message}: {self.jobs} parallel jobs ({mode}, max load {self.max_load:g})"
+        print(info)
+        self.__write_outlog(info)
+
+        jobserver.start()
+        try:
+            returncode = self.__run_pipeline(
+                total,
+                output_file,
+                output_file,
+                proc,
+                update_diff,
+                message,
+                "make" if progress else "line_number",
+                " ln",
+                "make",
+                *make_args,
+                *targets,
+                env=env,
+                pass_fds=jobserver.fds,
+                progress=progress,
+            )
+        finally:
+            jobserver.stop()
+
+        return returncode
+
+    def __run_pipeloader(self, output_file: str, message: str, *args, **kwargs) -> int:
         """Runs subprocess with loading animation
 
         Args:
@@ -673,41 +5336,136 @@ class Heainstall:
             message (str): Process description
 
         Returns:
-            None: None
+            int: Process return code
         """
 
-        # Loading animation glyphs
+        # Loading animation glyphs, advanced on output and once a second
         glyphs = ["⠋", "⠙", "⠹", "⠸", "⠼", "⠴", "⠦", "⠧", "⠇", "⠏"]
+        output_file = os.path.join(self.hea_dir, output_file)
         error_file = os.path.join(self.hea_dir, "error.log")
+        frames = itertools.cycle(glyphs)
+
+        def spin():
+            sys.stdout.write(f"\r{message} {next(frames)}")
+            sys.stdout.flush()
 
         # Runs subprocess with logging
-        with open(output_file, "a", encoding="utf-8") as out_file:
-            with open(error_file, "a", encoding="utf-8") as err_file:
-                kwargs.setdefault("stdout", out_file)
-                kwargs.setdefault("stderr", err_file)
-                kwargs.setdefault("text", True)
-                process = subprocess.Popen(args, **kwargs)
-
-            # Runs loading animation while process runs
-            while process.poll() is None:
-                for glyph in glyphs:
-                    sys.stdout.write(f"\r{message} {glyph}")
-                    sys.stdout.flush()
-                    time.sleep(0.1)
-                time.sleep(0.1)
+        start = time.monotonic()
+        supervisor = Supervisor(self.timeout)
+        process = supervisor.start(None, args, output_file, error_file, **kwargs)
+        supervisor.wait(spin, 1)
+        self.__record_command(args, start, supervisor)
+
+        # Checks for process success
+        if process.returncode == 0:
+            sys.stdout.write(f"\r{message}: Completed successfully.\n")
+        elif supervisor.timed_out:
+            sys.stdout.write(
+                f"\r{message}: Timed out after {self.__format_seconds(self.timeout)}.\n"
+            )
+        else:
+            sys.stdout.write(
+                f"\r{message}: Failed with return code {process.returncode}.\n"
+            )
 
-            process.communicate()
+        return process.returncode
 
-            # Checks for process success
-            if process.returncode == 0:
-                sys.stdout.write(f"\r{message}: Completed successfully.\n")
-            else:
-                sys.stdout.write(
-                    f"\r{message}: Failed with return code {process.returncode}.\n"
-                )
+    def __extract_stream(self, fileobj, total: int, file: str = None) -> None:
+        """Extracts tar members as they are decompressed from a stream
+
+        Args:
+            fileobj (file): Compressed tarball opened for binary reading
+            total (int): Compressed size of the tarball in bytes
+            file (str, optional): Tarball written by the stream, read again for missing hard link targets. Defaults to None.
+        """
+
+        extractor = StreamExtractor(self.work_dir, select=self.__selected_member)
+        with tqdm(
+            total=total,
+            desc="Extracting",
+            unit="B",
+            unit_scale=True,
+            leave=True,
+        ) as pbar:
+            extractor.extract(fileobj, lambda consumed: pbar.update(consumed - pbar.n))
+            pbar.update(total - pbar.n)
+        self.__write_outlog(
+            f"Extraction: {extractor.decompressor or 'zlib'} decompression, "
+            f"{extractor.workers} writer threads"
+        )
+        self.__learn("extracted", extractor.written)
+        if extractor.skipped_files:
+            summary = (
+                f"Extraction: skipped {extractor.skipped_files} files "
+                f"({tqdm.format_sizeof(extractor.skipped_bytes, 'B', 1024)}) "
+                "of components that are not selected"
+            )
+            print(summary)
+            self.__write_outlog(summary)
+        if extractor.missing_links:
+            self.__extract_links(extractor.missing_links, file)
+
+        # Removes components left behind by an earlier, larger selection
+        source = self.__source_dir(quiet=True)
+        for entry in os.scandir(source) if source else ():
+            if entry.is_dir(follow_symlinks=False) and not self.__selected_member(
+                os.path.relpath(entry.path, self.work_dir)
+            ):
+                shutil.rmtree(entry.path)
+                self.__write_outlog(f"Extraction: removed unselected {entry.name}")
+
+        return
+
+    def __extract_links(self, links: dict, file: str = None) -> None:
+        """Extracts selected hard links whose targets belong to unselected components
+
+        The targets are extracted next to the links in a second pass over the
+        tarball. Their unselected components are removed afterwards, leaving
+        the links as regular files.
+
+        Args:
+            links (dict): Hard link member names mapped to their target names
+            file (str, optional): Tarball to read again. Defaults to None.
+        """
+
+        if not file or not os.path.exists(file):
+            summary = "\n".join(
+                [
+                    "Extraction: missing hard links to files of unselected components",
+                    *(f"  {link} -> {target}" for link, target in links.items()),
+                ]
+            )
+            print(f"Warning: {summary}")
+            self.__write_outlog(summary)
+            return
+
+        wanted = set(links) | set(links.values())
+        with open(file, "rb") as raw:
+            StreamExtractor(self.work_dir, select=wanted.__contains__).extract(raw)
+        self.__write_outlog(
+            f"Extraction: extracted {len(links)} hard links to files of unselected components"
+        )
 
         return
 
+    def __selected_member(self, name: str) -> bool:
+        """Checks if a tarball member belongs to the core or a selected component
+
+        Top-level directories of the source tree that map to a component are
+        kept only when the component is selected; anything else is core.
+
+        Args:
+            name (str): Member path inside the tarball
+
+        Returns:
+            bool: True if the member is extracted
+        """
+
+        parts = os.path.normpath(name).split(os.sep)
+        component = self.source_dirs.get(parts[1].lower()) if len(parts) > 1 else None
+
+        return component is None or component in self.components
+
     def __install_tclreadline(self, tcl):
         """Install tclreadline using suplied package
 
@@ -724,19 +5482,22 @@ class Heainstall:
                 f"{package}",
             )
 
-        # Runs configuration commands
-        os.chdir(os.path.join(self.script_dir, "tclreadline-2.1.0"))
+        # Runs configuration commands in the tclreadline source directory
+        source = os.path.join(self.script_dir, "tclreadline-2.1.0")
         _ = [
-            self.__run_pipeloader("installer.log", f"Executing {' '.join(cmd)}", *cmd)
+            self.__run_pipeloader(
+                "installer.log", f"Executing {' '.join(cmd)}", *cmd, cwd=source
+            )
             for cmd in tcl["config_cmd"]
         ]
 
         # Installs tclreadline
         _ = [
-            self.__run_pipeloader("installer.log", f"Executing {' '.join(cmd)}", *cmd)
+            self.__run_pipeloader(
+                "installer.log", f"Executing {' '.join(cmd)}", *cmd, cwd=source
+            )
             for cmd in tcl["install_cmd"]
         ]
-        os.chdir(self.script_dir)
 
         return
 
@@ -747,7 +5508,9 @@ class Heainstall:
             out (any): Output
         """
 
-        with open("installer.log", "a", encoding="utf-8") as log:
+        with open(
+            os.path.join(self.hea_dir, "installer.log"), "a", encoding="utf-8"
+        ) as log:
             log.write(f"{out}\n")
 
         return
@@ -759,7 +5522,7 @@ class Heainstall:
             err (any): Error
         """
 
-        with open("error.log", "a", encoding="utf-8") as log:
+        with open(os.path.join(self.hea_dir, "error.log"), "a", encoding="utf-8") as log:
             log.write(f"{err}\n")
 
         return
@@ -767,29 +5530,59 @@ class Heainstall:
     def __track_lines(
         self, file: str, pbar: tqdm, finished: bool = False, **kwargs
     ) -> None:
-        """Counts number of lines written to file to track progress
+        """Tracks progress by the number of lines written to the log
 
         Args:
             file (str): File path
             pbar (tqdm): tqdm progressbar object
             finished (bool, optional): Checks if process has finished. Defaults to False.
+            lines (int): Lines the process has written so far.
         """
 
-        try:
+        # Redraws only when the count has changed
+        lines = kwargs["lines"]
+        if lines == pbar.n and not finished:
+            return
 
-            # Counts number of lines
-            with open(file, "r", encoding="utf-8") as log:
-                lines = sum(1 for _ in log)
+        # Sets progress bar iteration count
+        pbar.n = lines
 
-            # Sets progress bar iteration count
-            pbar.n = lines
+        # Resets total count
+        if finished:
+            pbar.total = lines
+        pbar.refresh()
 
-            # Resets total count
-            if finished:
-                pbar.total = lines
+        return
+
+    def __track_make(
+        self, file: str, pbar: tqdm, finished: bool = False, **kwargs
+    ) -> None:
+        """Tracks weighted progress of the components make is building
+
+        Args:
+            file (str): File path
+            pbar (tqdm): tqdm progressbar object
+            finished (bool, optional): Checks if process has finished. Defaults to False.
+            lines (int): Lines the process has written so far.
+            progress (MakeProgress): Parsed make progress.
+            status (tqdm): Status line showing running and slowest components.
+        """
+
+        progress, status = kwargs["progress"], kwargs["status"]
+        if finished:
+            pbar.n = pbar.total = kwargs["lines"]
             pbar.refresh()
-        except FileNotFoundError:
-            pass
+            return
+
+        # Redraws only when progress or the status line has changed
+        done, total = progress.overall()
+        text = progress.status()
+        if (done, total) != (pbar.n, pbar.total):
+            pbar.total = max(total, done, 1)
+            pbar.n = done
+            pbar.refresh()
+        if text != status.desc:
+            status.set_description_str(text)
 
         return
 
@@ -807,6 +5600,8 @@ class Heainstall:
         try:
             # Gets file size and sets progress bar iteration count
             size = os.path.getsize(file)
+            if size == pbar.n and not finished:
+                return
             pbar.n = round(size, 2)
 
             # Resets total count
@@ -819,7 +5614,145 @@ class Heainstall:
         return
 
 
+def parse_args(argv: list = None) -> argparse.Namespace:
+    """Parses command line options
+
+    Args:
+        argv (list, optional): Arguments to parse. Defaults to sys.argv[1:].
+
+    Returns:
+        argparse.Namespace: Parsed options
+    """
+
+    parser = argparse.ArgumentParser(
+        description="Downloads and installs HEASoft for the current user"
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        help="maximum parallel make jobs, an integer or 'auto' (overrides user.json)",
+    )
+    parser.add_argument(
+        "--max-load",
+        help="load average above which make starts no new jobs, a number or 'auto'",
+    )
+    parser.add_argument(
+        "--memory-per-job",
+        type=int,
+        help="memory in MiB reserved for each make job (default: 1024)",
+    )
+    parser.add_argument(
+        "--no-adaptive",
+        action="store_true",
+        help="keep the make job count fixed during the build",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        help="minutes after which a single command is stopped (default: no limit)",
+    )
+    parser.add_argument(
+        "--scratch",
+        metavar="DIR",
+        help="build in DIR and copy only the installation back, 'auto' picks a memory-backed "
+        "directory if the build fits, 'no' builds in place (overrides user.json)",
+    )
+    parser.add_argument(
+        "--no-preflight",
+        action="store_true",
+        help="start even if the disk space check finds too little free space",
+    )
+    parser.add_argument(
+        "--cleanup",
+        action="store_true",
+        help="remove the cached tarball after extraction and build intermediates after installation",
+    )
+    parser.add_argument(
+        "--profile",
+        help="build profile setting compiler and linker flags, e.g. portable, native or "
+        "native-lto (overrides user.json)",
+    )
+    parser.add_argument(
+        "--no-benchmark",
+        action="store_true",
+        help="do not time HEASoft tools after installation",
+    )
+    parser.add_argument(
+        "--configure-cache",
+        action="store_true",
+        help="reuse configure results cached by earlier runs with the same compilers",
+    )
+    parser.add_argument(
+        "--no-ccache",
+        action="store_true",
+        help="do not wrap the compilers with ccache",
+    )
+    parser.add_argument(
+        "--ccache-size",
+        help="compiler cache size limit, e.g. 5G (overrides user.json)",
+    )
+    parser.add_argument(
+        "--restart",
+        action="store_true",
+        help="ignore phases completed by earlier runs and start from the beginning",
+    )
+    parser.add_argument(
+        "--update-mode",
+        choices=("full", "metadata", "skip"),
+        help="full refreshes metadata and upgrades the system, metadata only refreshes",
+    )
+    parser.add_argument(
+        "--freshness",
+        type=float,
+        help="hours after a refresh during which package updates are skipped (default: 24)",
+    )
+    parser.add_argument(
+        "--downloader",
+        choices=("auto", "aria2c", "native"),
+        help="download tool, native uses the built-in segmented downloader",
+    )
+    parser.add_argument(
+        "--connections",
+        type=int,
+        help="parallel connections used by the native downloader (default: 16)",
+    )
+    parser.add_argument(
+        "--pipeline",
+        action="store_true",
+        help="extract the source tarball while it is being downloaded",
+    )
+    parser.add_argument(
+        "--no-keep-tarball",
+        action="store_true",
+        help="do not keep a cached copy of a pipelined download",
+    )
+    artifact = parser.add_mutually_exclusive_group()
+    artifact.add_argument(
+        "--export",
+        metavar="FILE",
+        help="pack the existing installation into a relocatable artifact and exit",
+    )
+    artifact.add_argument(
+        "--import",
+        dest="import_artifact",
+        metavar="FILE",
+        help="install from an artifact made with --export instead of building",
+    )
+
+    return parser.parse_args(argv)
+
+
 if __name__ == "__main__":
+    args = parse_args()
     subprocess.run(["sudo", "echo", "Initializing"], check=True)
-    hea = Heainstall()
-    hea.run()
+
+    # Resolves artifact paths before the installer changes directory
+    artifact = args.export or args.import_artifact
+    artifact = artifact and os.path.abspath(artifact)
+    hea = Heainstall(args)
+    if args.export:
+        hea.export_artifact(artifact)
+    elif args.import_artifact:
+        hea.deploy(artifact)
+    else:
+        hea.run()